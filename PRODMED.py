@@ -1,10 +1,23 @@
+import os
 import streamlit as st
 import pandas as pd
 from PIL import Image
 import requests
 from io import BytesIO
 from datetime import datetime
-from fpdf import FPDF
+from doctor_registry import DoctorRegistry
+from procedure_catalog import ProcedureCatalog
+from prodmed_data import (
+    CSV_URL, LOGO_URL, XLSX_URL, month_names,
+    doctor_month_report, doctor_month_summary, prepare_exams, prepare_multipliers
+)
+from prodmed_payments import PaymentStore
+from prodmed_report import build_doctor_report, report_file_name
+from job_queue import CANCELLED, DONE, FAILED, FINISHED, JobQueue
+from job_worker import ensure_workers
+from table_styles import style_rules, value_rule
+from prodmed_snapshots import SNAPSHOT_COLUMNS, freeze_month, list_snapshots, load_history
+from prodmed_simulator import MultiplierSimulator
 
 # -----------------------------
 # Your existing data loading/caching functions
@@ -24,16 +37,6 @@ def load_csv_data(csv_url):
     response = requests.get(csv_url)
     return pd.read_csv(BytesIO(response.content))
 
-def assign_period(hour):
-    if 0 <= hour < 7:
-        return 'Madrugada'
-    elif 7 <= hour < 13:
-        return 'Manhã'
-    elif 13 <= hour < 20:
-        return 'Tarde'
-    else:
-        return 'Noite'
-
 period_colors = {
     'Madrugada': '#555555',
     'Manhã': '#4682b4',
@@ -41,43 +44,81 @@ period_colors = {
     'Noite': '#c0392b'
 }
 
-day_translations = {
-    'Monday': 'Segunda-feira',
-    'Tuesday': 'Terça-feira',
-    'Wednesday': 'Quarta-feira',
-    'Thursday': 'Quinta-feira',
-    'Friday': 'Sexta-feira',
-    'Saturday': 'Sábado',
-    'Sunday': 'Domingo'
-}
+period_target_rules = [
+    value_rule(
+        'PERIOD',
+        {period: f'background-color: {color}; color: white' for period, color in period_colors.items()},
+        default='background-color: white; color: white'
+    ),
+    value_rule(
+        'TARGET_FLAG',
+        {
+            'OUT OF TARGET': 'background-color: red; color: white',
+            'ON TARGET': 'background-color: green; color: white',
+            'BONUS': 'background-color: yellow; color: black',
+        },
+        target=['TARGET_FLAG']
+    ),
+]
+
+@st.cache_resource
+def load_doctor_registry():
+    """
+    One DOCTOR_ID per person, shared by every session.
+    Names from the exams base and from pagamento.xlsx are resolved against it,
+    so joins below use integer IDs instead of raw name strings.
+    """
+    return DoctorRegistry()
 
-hospital_name_mapping = {
-    "HSC": "Hospital Santa Catarina",
-    "CSSJ": "Casa de Saúde São José",
-    "HNSC": "Hospital Nossa Senhora da Conceição"
-}
+@st.cache_resource
+def load_procedure_catalog():
+    """
+    multipliers.csv as an integer-coded catalog; descriptions seen in the exams base
+    are matched to it once (exact, then fuzzy) and the mapping is saved for review.
+    """
+    return ProcedureCatalog(prepare_multipliers(load_csv_data(CSV_URL)))
 
-def merge_hospital_names(df, column_name):
-    return df.replace({column_name: hospital_name_mapping})
+@st.cache_resource(ttl=600)
+def load_payment_store():
+    """
+    Every month of pagamento.xlsx from the local Parquet store; the workbook is
+    fetched and parsed again only when it changes (checked at most every 10 minutes).
+    """
+    return PaymentStore(load_doctor_registry())
 
-def normalize_name(name: str) -> str:
+@st.cache_data
+def load_prepared_exams(xlsx_url):
     """
-    Helper function to normalize doctor names
-    so they match between excel_df and payment_data.
+    baseslaM.xlsx after prepare_exams, computed once instead of on every rerun.
     """
-    return (
-        str(name)
-        .replace("Dr. ", "")
-        .replace("Dra. ", "")
-        .replace("Dra.","")
-        .strip()
-        .upper()
-    )
+    return prepare_exams(load_excel_data(xlsx_url), load_doctor_registry(), load_procedure_catalog())
+
+@st.cache_resource
+def load_job_queue():
+    """
+    Background jobs (job_queue.py), shared by every session; long exports run in
+    job_worker.py processes instead of inside a rerun.
+    """
+    return JobQueue()
+
+@st.cache_resource(ttl=3600, max_entries=8)
+def load_simulator(months, _excel_df, _procedure_catalog, _payment_store, _doctor_registry):
+    """
+    Count matrix for the (year, month) pairs in `months`, built once and reused
+    by every multiplier edit (only `months` is part of the cache key).
+    """
+    approved_df = _excel_df[
+        _excel_df['STATUS_APROVADO'].notna() &
+        pd.MultiIndex.from_frame(_excel_df[['YEAR', 'MONTH']]).isin(months)
+    ]
+    payments = _payment_store.payments
+    payment_df = payments[pd.MultiIndex.from_frame(payments[['YEAR', 'MONTH']]).isin(months)]
+    return MultiplierSimulator(approved_df, _procedure_catalog, payment_df, _doctor_registry)
 
 # -----------------------------
 # Load and display logo
 # -----------------------------
-logo_url = 'https://raw.githubusercontent.com/haguenka/SLA/main/logo.jpg'
+logo_url = LOGO_URL
 logo = load_image(logo_url)
 st.sidebar.image(logo, use_container_width=True)
 
@@ -86,39 +127,15 @@ st.title('Medical Production Report')
 # -----------------------------
 # Load data
 # -----------------------------
-xlsx_url = 'https://raw.githubusercontent.com/haguenka/SLA/main/baseslaM.xlsx'
-csv_url = 'https://raw.githubusercontent.com/haguenka/SLA/main/multipliers.csv'
-
-excel_df = load_excel_data(xlsx_url)
-csv_df = load_csv_data(csv_url)
-csv_df.columns = csv_df.columns.str.strip()
-excel_df = merge_hospital_names(excel_df, "UNIDADE")
-
-payment_file_url = 'https://raw.githubusercontent.com/haguenka/SLA/main/pagamento.xlsx'
-payment_excel = pd.ExcelFile(payment_file_url)
-available_sheets = payment_excel.sheet_names
-
-# Convert to uppercase **once** so that merges are consistent
-excel_df['DESCRICAO_PROCEDIMENTO'] = excel_df['DESCRICAO_PROCEDIMENTO'].astype(str).str.upper()
-csv_df['DESCRICAO_PROCEDIMENTO'] = csv_df['DESCRICAO_PROCEDIMENTO'].astype(str).str.upper()
+doctor_registry = load_doctor_registry()
+procedure_catalog = load_procedure_catalog()
 
 try:
     # -----------------------------
-    # Pre-process excel_df
+    # Pre-processed excel_df (cached)
     # -----------------------------
-    excel_df['STATUS_APROVADO'] = pd.to_datetime(excel_df['STATUS_APROVADO'], format='%d-%m-%Y %H:%M', errors='coerce')
-    excel_df['STATUS_PRELIMINAR'] = pd.to_datetime(excel_df['STATUS_PRELIMINAR'], format='%d-%m-%Y %H:%M', errors='coerce')
-
-    # Extract month and year
-    excel_df['MONTH'] = excel_df['STATUS_APROVADO'].dt.month
-    excel_df['YEAR'] = excel_df['STATUS_APROVADO'].dt.year
+    excel_df = load_prepared_exams(XLSX_URL)
 
-    # Define month names in uppercase
-    month_names = [
-        "JANUARY", "FEBRUARY", "MARCH", "APRIL", "MAY", "JUNE",
-        "JULY", "AUGUST", "SEPTEMBER", "OCTOBER", "NOVEMBER", "DECEMBER"
-    ]
-    
     # Unique years
     unique_years = sorted(excel_df['YEAR'].dropna().unique())
     
@@ -140,44 +157,69 @@ try:
         (excel_df['YEAR'] == selected_year)
     ]
 
-    # -------------
-    # Attempt to match sheet name in pagamento.xlsx
-    # -------------
-    formatted_sheet_name = f"{month_names[selected_month - 1].capitalize()} {selected_year}"
-    matched_sheet_name = next(
-        (sheet for sheet in available_sheets if formatted_sheet_name.lower() in sheet.lower()), 
-        None
-    )
-    if not matched_sheet_name:
-        raise ValueError(f"Sheet matching '{formatted_sheet_name}' not found in {payment_file_url}")
-    
-    # Load payment_data for selected month
-    payment_data = pd.read_excel(payment_excel, sheet_name=matched_sheet_name)
-    payment_data['DATE'] = pd.to_datetime(payment_data['DATE'], errors='coerce')
-    payment_data = payment_data[payment_data['DATE'].dt.month == selected_month]
+    # Payment rows for the selected month (one partition of the payment store)
+    try:
+        payment_store = load_payment_store()
+        if payment_store.skipped_sheets:
+            st.sidebar.warning(
+                "Payment sheets skipped (could not be read): " + ", ".join(sorted(payment_store.skipped_sheets))
+            )
+        payment_data = payment_store.month(selected_month, selected_year)
+        if payment_data.empty:
+            st.warning(f"pagamento.xlsx has no payments for {selected_month_str}/{selected_year}: payment figures show as zero.")
+    except Exception as e:
+        # Without payments the exam views still work; payment figures show as zero
+        st.warning(f"Payments could not be loaded: {e}")
+        payment_store = None
+        payment_data = pd.DataFrame({
+            'DOCTOR_ID': pd.Series(dtype='Int64'), 'DATE': pd.Series(dtype='datetime64[ns]'),
+            'MEDICO': pd.Series(dtype=object), 'PAYMENT': pd.Series(dtype=float)
+        })
+
+    # Per-doctor month summary (approved exams only); closed months with payments are frozen as snapshots
+    month_df = filtered_df.dropna(subset=['STATUS_APROVADO'])
+    month_summary = doctor_month_summary(month_df, payment_data, doctor_registry)
+    if freeze_month(month_summary, selected_year, selected_month, payment_data):
+        st.sidebar.success(f"{selected_month_str}/{selected_year} frozen in the production history.")
 
 except Exception as e:
+    # Only the exams base is required: without it no tab has anything to show
     st.error(f"An error occurred during data preparation: {e}")
+    st.stop()
+
+# Spellings folded into an existing doctor by fuzzy matching, for review
+fuzzy_merges = doctor_registry.fuzzy_merges()
+if not fuzzy_merges.empty:
+    with st.sidebar.expander(f"Doctor name merges to review ({len(fuzzy_merges)})"):
+        st.dataframe(fuzzy_merges, hide_index=True)
 
 # -----------------------------
 # Create TABS for the two pages
+# Only the month selection above reruns the whole page. Widgets inside a tab live in
+# an st.fragment whose inputs are its arguments, so they rerun that tab alone.
 # -----------------------------
-tab1, tab2, tab3 = st.tabs(["Individual Doctor View", "Worst/Best Doctors", "Resumo de Exames por Modalidade"])
+tab1, tab2, tab3, tab4, tab5 = st.tabs([
+    "Individual Doctor View", "Worst/Best Doctors", "Resumo de Exames por Modalidade",
+    "Production History", "Multiplier Simulator"
+])
 
 # ------------------------------------------------------------------------------
 # TAB 1: Single-Doctor Analysis, but aggregated across all hospitals
 # ------------------------------------------------------------------------------
-with tab1:
+@st.fragment
+def doctor_view(filtered_df, payment_data, selected_month_str, selected_year):
     try:
         # 1. HOSPITAL FILTER for selecting doctors (but not filtering final data)
         #    We add an 'All Hospitals' option if you prefer. Otherwise, keep it as-is.
+        #    (Shown in the tab, not the sidebar: fragments cannot write to the sidebar.)
+        hospital_col, doctor_col = st.columns(2)
         hospital_list = sorted(filtered_df['UNIDADE'].dropna().unique())
-        selected_hospital = st.sidebar.selectbox(
+        selected_hospital = hospital_col.selectbox(
             'Filter Hospital for Doctor List',
             ['All Hospitals'] + hospital_list
         )
 
-        # 2. If user chooses a specific hospital from the sidebar, restrict
+        # 2. If user chooses a specific hospital, restrict
         #    the doctor list to those that appear in that hospital. If user chooses
         #    "All Hospitals", allow all doctors in the entire filtered_df.
         if selected_hospital == 'All Hospitals':
@@ -187,32 +229,25 @@ with tab1:
 
         # 3. Doctor Filter (based on the possible_docs_df)
         doctor_list = sorted(possible_docs_df['MEDICO_LAUDO_DEFINITIVO'].dropna().unique())
-        selected_doctor = st.sidebar.selectbox('Select Doctor', doctor_list)
+        selected_doctor = doctor_col.selectbox('Select Doctor', doctor_list)
 
         # 4. Now gather ALL data for the selected doctor (across all hospitals)
         doctor_df = filtered_df[filtered_df['MEDICO_LAUDO_DEFINITIVO'] == selected_doctor]
 
         # 5. Payment for selected doctor
-        payment_data['NORMALIZED_MEDICO'] = payment_data['MEDICO'].apply(normalize_name)
-        normalized_doctor_name = normalize_name(selected_doctor)
-        doctor_payment = payment_data[payment_data['NORMALIZED_MEDICO'] == normalized_doctor_name]
+        selected_doctor_id = doctor_registry.resolve_one(selected_doctor)
+        doctor_payment = payment_data[payment_data['DOCTOR_ID'] == selected_doctor_id]
         if not doctor_payment.empty:
             total_payment = doctor_payment['PAYMENT'].sum()
         else:
             total_payment = 0.0
 
-        st.sidebar.markdown(f"### Payment: R$ {total_payment:,.2f}")
         st.markdown(f"<h1 style='color:red;'>{selected_doctor}</h1>", unsafe_allow_html=True)
 
-        # 6. Separate PRELIMINAR and APROVADO for this doctor (across all hospitals)
-        preliminar_df = doctor_df[
-            (doctor_df['STATUS_PRELIMINAR'].notna()) &
-            (doctor_df['MEDICO_LAUDOO_PRELIMINAR'] == selected_doctor)
-        ]
-        aprovado_df = doctor_df[
-            (doctor_df['STATUS_APROVADO'].notna()) &
-            (doctor_df['MEDICO_LAUDO_DEFINITIVO'] == selected_doctor)
-        ]
+        # 6. Month figures for this doctor (across all hospitals), shared with the PDF exporter
+        doctor_report = doctor_month_report(doctor_df, selected_doctor, total_payment)
+        preliminar_df = doctor_report['preliminar_df']
+        aprovado_df = doctor_report['aprovado_df']
 
         total_preliminar_events = len(preliminar_df)
         total_aprovado_events = len(aprovado_df)
@@ -248,20 +283,9 @@ with tab1:
         st.dataframe(doctor_all_events[filtered_columns], width=1200, height=400)
 
         # 8. Points calculation for the selected doctor (ALL hospitals)
-        merged_df = pd.merge(aprovado_df, csv_df, on='DESCRICAO_PROCEDIMENTO', how='left')
-        merged_df['MULTIPLIER'] = pd.to_numeric(merged_df['MULTIPLIER'], errors='coerce').fillna(0)
-        merged_df['POINTS'] = (merged_df['STATUS_APROVADO'].notna().astype(int) * merged_df['MULTIPLIER']).round(1)
-
-        # Group and calculate point values
-        doctor_grouped = merged_df.groupby(['UNIDADE', 'GRUPO', 'DESCRICAO_PROCEDIMENTO']).agg({
-            'MULTIPLIER': 'first',
-            'STATUS_APROVADO': 'count'
-        }).rename(columns={'STATUS_APROVADO': 'COUNT'}).reset_index()
-
-        doctor_grouped['POINTS'] = doctor_grouped['COUNT'] * doctor_grouped['MULTIPLIER']
-        total_points_sum = doctor_grouped['POINTS'].sum()
-        unitary_point_value = total_payment / total_points_sum if total_points_sum > 0 else 0.0
-        doctor_grouped['POINT_VALUE'] = doctor_grouped['POINTS'] * unitary_point_value
+        doctor_grouped = doctor_report['doctor_grouped']
+        total_points_sum = doctor_report['total_points_sum']
+        unitary_point_value = doctor_report['unitary_point_value']
 
         total_count_sum = doctor_grouped['COUNT'].sum()
         total_point_value_sum = doctor_grouped['POINT_VALUE'].sum()
@@ -299,136 +323,11 @@ with tab1:
         # Adding TARGET_FLAG and color-coding it
         # --------------------------------------------------------------------
 
-        valid_groups = ['GRUPO TOMOGRAFIA', 'GRUPO RESSONÂNCIA MAGNÉTICA']
-
-        preliminar_filtered = doctor_df[
-            (doctor_df['GRUPO'].isin(valid_groups)) &
-            (doctor_df['STATUS_PRELIMINAR'].notna()) &
-            (doctor_df['MEDICO_LAUDOO_PRELIMINAR'] == selected_doctor)
-        ].copy()
-
-        aprovado_filtered = doctor_df[
-            (doctor_df['GRUPO'].isin(valid_groups)) &
-            (doctor_df['STATUS_APROVADO'].notna()) &
-            (doctor_df['MEDICO_LAUDO_DEFINITIVO'] == selected_doctor)
-        ].copy()
-
-        # --- PRELIMINAR grouping ---
-        if not preliminar_filtered.empty:
-            preliminar_filtered['DAY_OF_WEEK'] = preliminar_filtered['STATUS_PRELIMINAR'].dt.day_name().map(day_translations)
-            preliminar_filtered['DATE'] = preliminar_filtered['STATUS_PRELIMINAR'].dt.date.astype(str)
-            preliminar_filtered['PERIOD'] = preliminar_filtered['STATUS_PRELIMINAR'].dt.hour.apply(assign_period)
-            
-            preliminar_days_grouped = (
-                preliminar_filtered
-                .groupby(['MEDICO_LAUDOO_PRELIMINAR', 'DATE', 'DAY_OF_WEEK', 'PERIOD'], dropna=False)
-                .size()
-                .reset_index(name='PRELIMINAR_COUNT')
-                .rename(columns={'MEDICO_LAUDOO_PRELIMINAR': 'MEDICO'})
-            )
-        else:
-            preliminar_days_grouped = pd.DataFrame(columns=['MEDICO','DATE','DAY_OF_WEEK','PERIOD','PRELIMINAR_COUNT'])
-
-        # --- APROVADO grouping (counts) ---
-        if not aprovado_filtered.empty:
-            aprovado_filtered['DAY_OF_WEEK'] = aprovado_filtered['STATUS_APROVADO'].dt.day_name().map(day_translations)
-            aprovado_filtered['DATE'] = aprovado_filtered['STATUS_APROVADO'].dt.date.astype(str)
-            aprovado_filtered['PERIOD'] = aprovado_filtered['STATUS_APROVADO'].dt.hour.apply(assign_period)
-            
-            aprovado_days_grouped = (
-                aprovado_filtered
-                .groupby(['MEDICO_LAUDO_DEFINITIVO', 'DATE', 'DAY_OF_WEEK', 'PERIOD'], dropna=False)
-                .size()
-                .reset_index(name='APROVADO_COUNT')
-                .rename(columns={'MEDICO_LAUDO_DEFINITIVO': 'MEDICO'})
-            )
-        else:
-            aprovado_days_grouped = pd.DataFrame(columns=['MEDICO','DATE','DAY_OF_WEEK','PERIOD','APROVADO_COUNT'])
-
-        # --- APROVADO grouping (points) ---
-        if not aprovado_filtered.empty:
-            aprovado_points_merged = pd.merge(
-                aprovado_filtered, 
-                csv_df, 
-                on='DESCRICAO_PROCEDIMENTO', 
-                how='left'
-            )
-            aprovado_points_merged['MULTIPLIER'] = pd.to_numeric(aprovado_points_merged['MULTIPLIER'], errors='coerce').fillna(0)
-            aprovado_points_grouped = (
-                aprovado_points_merged
-                .groupby(['MEDICO_LAUDO_DEFINITIVO', 'DATE', 'DAY_OF_WEEK', 'PERIOD'], dropna=False)['MULTIPLIER']
-                .sum()
-                .reset_index(name='APROVADO_POINTS')
-                .rename(columns={'MEDICO_LAUDO_DEFINITIVO': 'MEDICO'})
-            )
-        else:
-            aprovado_points_grouped = pd.DataFrame(columns=['MEDICO','DATE','DAY_OF_WEEK','PERIOD','APROVADO_POINTS'])
-
-        # --- Merge preliminar_counts + aprovado_counts + aprovado_points ---
-        days_merged = (
-            pd.merge(
-                preliminar_days_grouped,
-                aprovado_days_grouped,
-                on=['MEDICO','DATE','DAY_OF_WEEK','PERIOD'],
-                how='outer'
-            )
-            .merge(
-                aprovado_points_grouped,
-                on=['MEDICO','DATE','DAY_OF_WEEK','PERIOD'],
-                how='outer'
-            )
-            .fillna(0)
-        )
+        days_merged = doctor_report['days_merged']
 
-        # Convert numeric columns
-        days_merged['PRELIMINAR_COUNT'] = days_merged['PRELIMINAR_COUNT'].astype(int)
-        days_merged['APROVADO_COUNT']   = days_merged['APROVADO_COUNT'].astype(int)
-        days_merged['APROVADO_POINTS']  = days_merged['APROVADO_POINTS'].astype(float)
-
-        # 1) Create TARGET_FLAG column
-        def assign_target_flag(points):
-            # target range: 22 to 24
-            if points < 22:
-                return "OUT OF TARGET"
-            elif points <= 24:
-                return "ON TARGET"
-            else:
-                return "BONUS"
-
-        days_merged['TARGET_FLAG'] = days_merged['APROVADO_POINTS'].apply(assign_target_flag)
-
-        # 2) Keep your custom ordering by PERIOD
-        period_order = ['Manhã', 'Tarde', 'Noite', 'Madrugada']
-        days_merged['PERIOD'] = pd.Categorical(days_merged['PERIOD'], categories=period_order, ordered=True)
-        days_merged = days_merged.sort_values(['DATE', 'PERIOD'])
-
-        # 3) Single row-level style function
-        def style_period_and_target(row):
-            """Color the entire row by PERIOD, except the TARGET_FLAG cell is color-coded by target status."""
-            # By default, color each cell using the PERIOD color
-            row_styles = [
-                f'background-color: {period_colors.get(row["PERIOD"], "white")}; color: white'
-                for _ in row.index
-            ]
-            # Then override the 'TARGET_FLAG' cell color
-            # find the index of the 'TARGET_FLAG' column
-            if 'TARGET_FLAG' in row.index:
-                col_idx = row.index.get_loc('TARGET_FLAG')
-                status = row['TARGET_FLAG']
-                if status == 'OUT OF TARGET':
-                    row_styles[col_idx] = 'background-color: red; color: white'
-                elif status == 'ON TARGET':
-                    row_styles[col_idx] = 'background-color: green; color: white'
-                elif status == 'BONUS':
-                    row_styles[col_idx] = 'background-color: yellow; color: black'
-            
-            return row_styles
-
-        # 4) Build styled dataframe:
+        # Rows colored by PERIOD; the TARGET_FLAG cell is color-coded by target status
         styled_df = (
-            days_merged
-            .style
-            .apply(style_period_and_target, axis=1)            # Apply row-level style
+            style_rules(days_merged, period_target_rules)
             .format({'APROVADO_POINTS': '{:.2f}'})             # Keep 2 decimals for points
         )
 
@@ -437,6 +336,26 @@ with tab1:
 
     except Exception as e:
         st.error(f"An error occurred in Tab 1: {e}")
+        return
+
+    # -------------------------------------------------------------------------
+    # EXPORT SUMMARY AND DOCTORS DATAFRAMES AS A COMBINED PDF REPORT
+    # -------------------------------------------------------------------------
+    if st.button('Export Summary and Doctors Dataframes as PDF'):
+        try:
+            pdf_bytes = build_doctor_report(doctor_report, selected_month_str, selected_year)
+            st.success('Combined report exported successfully! You can download the file from the link below:')
+            st.download_button(
+                label='Download Combined PDF',
+                data=pdf_bytes,
+                file_name=report_file_name(selected_doctor, selected_month_str, selected_year),
+                mime='application/pdf'
+            )
+        except Exception as e:
+            st.error(f'An error occurred while exporting the PDF: {e}')
+
+with tab1:
+    doctor_view(filtered_df, payment_data, selected_month_str, selected_year)
 
 
 # ------------------------------------------------------------------------------
@@ -445,69 +364,20 @@ with tab1:
 with tab2:
     st.subheader("Worst & Best Doctors by Value per Approved Exam (and Value per Point)")
     try:
-        # 1) Focar no dataset completo para o mês/ano selecionado 
-        #    (apenas linhas com 'STATUS_APROVADO')
-        month_df = excel_df[
-            (excel_df['MONTH'] == selected_month) & 
-            (excel_df['YEAR'] == selected_year)
-        ].dropna(subset=['STATUS_APROVADO']).copy()
-
-        # 2) Fazer merge com csv_df para obter MULTIPLIER e calcular os pontos
-        points_merged = pd.merge(month_df, csv_df, on="DESCRICAO_PROCEDIMENTO", how="left")
-        points_merged['MULTIPLIER'] = pd.to_numeric(points_merged['MULTIPLIER'], errors='coerce').fillna(0)
-        points_merged['POINTS'] = points_merged['MULTIPLIER']  # cada exame => "MULTIPLIER" pontos
-
-        # 3) Somar os pontos totais por médico
-        points_sum = (
-            points_merged
-            .groupby("MEDICO_LAUDO_DEFINITIVO")['POINTS']
-            .sum()
-            .reset_index(name="TOTAL_POINTS")
-        )
-        points_sum["NORMALIZED_MEDICO"] = points_sum["MEDICO_LAUDO_DEFINITIVO"].apply(normalize_name)
-
-        # 4) Contar quantos exames aprovados cada médico possui
-        approved_counts = (
-            month_df
-            .groupby("MEDICO_LAUDO_DEFINITIVO")
-            .size()
-            .reset_index(name="APPROVED_COUNT")
-        )
-        approved_counts["NORMALIZED_MEDICO"] = approved_counts["MEDICO_LAUDO_DEFINITIVO"].apply(normalize_name)
-
-        # 5) Somar os pagamentos totais para o mesmo mês em payment_data
-        pay_month = payment_data.copy()  # já está filtrado pelo mês
-        pay_month["NORMALIZED_MEDICO"] = pay_month["MEDICO"].apply(normalize_name)
-        pay_sums = (
-            pay_month
-            .groupby("NORMALIZED_MEDICO")["PAYMENT"]
-            .sum()
-            .reset_index(name="TOTAL_PAYMENT")
-        )
-
-        # 6) Fazer merge para obter: APPROVED_COUNT, TOTAL_POINTS, TOTAL_PAYMENT
-        merged_doctors = pd.merge(approved_counts, points_sum, on="NORMALIZED_MEDICO", how="inner")
-        merged_doctors = pd.merge(merged_doctors, pay_sums, on="NORMALIZED_MEDICO", how="inner")
+        # 1) Contagens, pontos e pagamento por DOCTOR_ID do mês/ano selecionado,
+        #    com VALUE_PER_UNIT e VALUE_PER_POINT (calculado na preparação dos dados)
+        merged_doctors = month_summary
 
-        # 7) Filtrar apenas médicos com pagamento > 0 e exames aprovados > 0
-        merged_doctors = merged_doctors[
-            (merged_doctors["TOTAL_PAYMENT"] > 0) & 
-            (merged_doctors["APPROVED_COUNT"] > 0)
-        ]
-        
-        # Excluir os médicos específicos
+        # 2) Excluir os médicos específicos
         exclude_doctors = ["HENRIQUE ARUME GUENKA", "AUGUSTO GUIMARAES ALTOE", "MATHEUS WAITMAN"]
-        merged_doctors = merged_doctors[~merged_doctors["NORMALIZED_MEDICO"].isin(exclude_doctors)]
-        
-        # 8) Calcular os indicadores VALUE_PER_UNIT e VALUE_PER_POINT
-        merged_doctors["VALUE_PER_UNIT"] = merged_doctors["TOTAL_PAYMENT"] / merged_doctors["APPROVED_COUNT"]
-        merged_doctors["VALUE_PER_POINT"] = merged_doctors["TOTAL_PAYMENT"] / merged_doctors["TOTAL_POINTS"]
+        exclude_ids = doctor_registry.lookup(pd.Series(exclude_doctors)).dropna()
+        merged_doctors = merged_doctors[~merged_doctors["DOCTOR_ID"].isin(exclude_ids)]
 
-        # 9) Ordenar para obter os 10 piores (maior VALUE_PER_UNIT) e 10 melhores (menor VALUE_PER_UNIT)
+        # 3) Ordenar para obter os 10 piores (maior VALUE_PER_UNIT) e 10 melhores (menor VALUE_PER_UNIT)
         worst_10 = merged_doctors.nlargest(10, "VALUE_PER_UNIT")
         best_10 = merged_doctors.nsmallest(10, "VALUE_PER_UNIT")
 
-        # 10) Exibir os resultados dos Top 10
+        # 4) Exibir os resultados dos Top 10
         st.markdown("### Worst 10 Doctors by Value per Approved Exam")
         st.dataframe(
             worst_10[[
@@ -542,7 +412,7 @@ with tab2:
             })
         )
         
-        # 11) Exibir a lista com todos os médicos que têm pagamento (já excluindo os específicos)
+        # 5) Exibir a lista com todos os médicos que têm pagamento (já excluindo os específicos)
         st.markdown("### All Doctors with Payment (Excluding Specific Doctors)")
         st.dataframe(
             merged_doctors.sort_values("NORMALIZED_MEDICO")[
@@ -575,11 +445,9 @@ with tab3:
         # Filtrar o dataframe para o período selecionado com exames aprovados
         period_exams_df = filtered_df[filtered_df['STATUS_ALAUDAR'].notna()].copy()
         
-        # Fazer o merge com a tabela de multiplicadores (multipliers.csv)
-        merged_exams = pd.merge(period_exams_df, csv_df, on='DESCRICAO_PROCEDIMENTO', how='left')
-        merged_exams['MULTIPLIER'] = pd.to_numeric(merged_exams['MULTIPLIER'], errors='coerce').fillna(0)
-        
         # Para cada exame aprovado, os pontos são definidos pelo valor do MULTIPLIER
+        # (já resolvido pelo catálogo de procedimentos na preparação dos dados)
+        merged_exams = period_exams_df
         merged_exams['POINTS'] = merged_exams['MULTIPLIER']
         
         # Agrupar por UNIDADE e GRUPO (modalidade) e calcular:
@@ -598,159 +466,201 @@ with tab3:
         st.dataframe(resumo, width=800, height=400)
         st.markdown(f"**Total de exames no período:** {total_exames_geral}")
         st.markdown(f"**Total de pontos no período:** {total_pontos_geral:.2f}")
+
+        # Procedimentos sem correspondência no multipliers.csv (valem 0 pontos)
+        unmatched_df = procedure_catalog.unmatched(filtered_df)
+        with st.expander(f"Procedimentos sem multiplicador no período: {len(unmatched_df)}"):
+            st.dataframe(unmatched_df, width=800)
+            st.download_button(
+                label="Baixar mapeamento de procedimentos (revisão)",
+                data=procedure_catalog.mapping_table().to_csv(index=False).encode("utf-8"),
+                file_name="procedure_mapping.csv",
+                mime="text/csv"
+            )
         
     except Exception as e:
         st.error(f"Ocorreu um erro ao gerar o resumo por modalidade e unidade: {e}")
 
 
-# -----------------------------------------------------------------------------
-# EXPORT SUMMARY AND DOCTORS DATAFRAMES AS A COMBINED PDF REPORT
-# -----------------------------------------------------------------------------
-if st.button('Export Summary and Doctors Dataframes as PDF'):
+# -------------------------------------------------------------------------------
+# TAB 4: Multi-month trend from the frozen monthly snapshots
+# -------------------------------------------------------------------------------
+@st.fragment
+def production_history():
+    st.subheader("Production and Payment History (closed months)")
     try:
-        pdf = FPDF(orientation='L', unit='mm', format='A4')
-        pdf.set_auto_page_break(auto=True, margin=15)
-        pdf.set_margins(left=5, top=5, right=5)
-
-        # Create title sheet
-        pdf.add_page()
-        pdf.image(logo_url, x=80, y=30, w=120)
-        pdf.set_font('Arial', 'B', 24)
-        pdf.ln(100)
-        pdf.cell(0, 10, 'Relatório de produção', ln=True, align='C')
-        pdf.ln(10)
-        pdf.set_font('Arial', '', 18)
-        pdf.cell(0, 10, f'Mês de {selected_month_name} {selected_year}', 0, 1, 'C')
-        pdf.ln(20)
-        # Add doctor's name in uppercase, big and blue
-        pdf.set_font('Arial', 'B', 24)
-        pdf.set_text_color(0, 0, 255)
-        pdf.cell(0, 10, selected_doctor.upper(), ln=True, align='C')
-        pdf.set_text_color(0, 0, 0)
-        pdf.ln(20)
-        
-        # Add summary sheet
-        pdf.add_page()
-        pdf.set_font('Arial', 'B', 16)
-        pdf.cell(0, 10, 'RELATÓRIO DE PRODUÇÃO MÉDICA', ln=True, align='C')
-        pdf.ln(10)
-        pdf.set_font('Arial', '', 16)
-        pdf.cell(0, 10, f'Total de Pontos por Exames Aprovados: {total_points_sum:.1f}', ln=True)
-        pdf.cell(0, 10, f'Total de Exames Aprovados: {total_aprovado_events}', ln=True)
-        pdf.cell(0, 10, f'Pagamento Recebido: R$ {total_payment:,.2f}', ln=True)
-        if total_aprovado_events > 0:
-            unitary_value_pdf = total_payment / total_aprovado_events
-        else:
-            unitary_value_pdf = 0.0
-        pdf.cell(0, 10, f'Valor Unitário por Evento: R$ {unitary_value_pdf:,.2f}', ln=True)
-        pdf.ln(10)
-        
-        # -----------------------------------------------------------------------------
-        # Add "Days Each Doctor Has Events" in table format (using days_merged)
-        # -----------------------------------------------------------------------------
-        pdf.add_page()
-        pdf.set_font('Arial', 'B', 16)
-        pdf.cell(0, 10, 'PERÍODOS/PLANTÃO COM EVENTOS REALIZADOS', ln=True, align='C')
-        pdf.ln(10)
-
-        if not days_merged.empty:
-            # Table header
-            pdf.set_font('Arial', 'B', 10)
-            pdf.cell(80, 10, 'MÉDICO', 1, 0, 'C')
-            pdf.cell(30, 10, 'DATA', 1, 0, 'C')
-            pdf.cell(30, 10, 'DIA DA SEMANA', 1, 0, 'C')
-            pdf.cell(30, 10, 'PERÍODO', 1, 0, 'C')
-            pdf.cell(30, 10, 'PRELIMINAR', 1, 0, 'C')
-            pdf.cell(30, 10, 'APROVADO', 1, 1, 'C')
-
-            pdf.set_font('Arial', '', 10)
-            for _, row in days_merged.iterrows():
-                pdf.cell(80, 10, str(row['MEDICO']), 1, 0, 'L')
-                pdf.cell(30, 10, str(row['DATE']), 1, 0, 'C')
-                pdf.cell(30, 10, str(row['DAY_OF_WEEK']), 1, 0, 'C')
-                pdf.cell(30, 10, str(row['PERIOD']), 1, 0, 'C')
-                pdf.cell(30, 10, str(row['PRELIMINAR_COUNT']), 1, 0, 'C')
-                pdf.cell(30, 10, str(row['APROVADO_COUNT']), 1, 1, 'C')
-
-                # Page break if we exceed the height
-                if pdf.get_y() > 180:
-                    pdf.add_page()
-                    pdf.set_font('Arial', 'B', 10)
-                    pdf.cell(80, 10, 'MÉDICO', 1, 0, 'C')
-                    pdf.cell(30, 10, 'DATA', 1, 0, 'C')
-                    pdf.cell(30, 10, 'DIA DA SEMANA', 1, 0, 'C')
-                    pdf.cell(30, 10, 'PERÍODO', 1, 0, 'C')
-                    pdf.cell(30, 10, 'PRELIMINAR', 1, 0, 'C')
-                    pdf.cell(30, 10, 'APROVADO', 1, 1, 'C')
+        history = load_history()
+        if history.empty:
+            st.info("No closed month has been frozen yet. Select a past month to freeze it.")
         else:
-            pdf.set_font('Arial', 'I', 12)
-            pdf.cell(0, 10, 'No events found in the selected date range/modality.', ln=True, align='C')
+            metric = st.selectbox(
+                "Metric",
+                ["VALUE_PER_POINT", "VALUE_PER_UNIT", "TOTAL_PAYMENT", "TOTAL_POINTS", "APPROVED_COUNT"]
+            )
+            doctor_names = sorted(history["NORMALIZED_MEDICO"].dropna().unique())
+            selected_history_doctors = st.multiselect("Doctors", doctor_names, default=doctor_names[:5])
+            doctor_history = history[history["NORMALIZED_MEDICO"].isin(selected_history_doctors)]
+
+            trend = doctor_history.pivot_table(index="PERIOD", columns="NORMALIZED_MEDICO", values=metric, aggfunc="sum")
+            st.line_chart(trend)
+            st.dataframe(
+                doctor_history.sort_values(["NORMALIZED_MEDICO", "PERIOD"])[
+                    ["NORMALIZED_MEDICO", "YEAR", "MONTH"] + SNAPSHOT_COLUMNS[4:]
+                ].style.format({
+                    "TOTAL_POINTS": "{:.2f}",
+                    "TOTAL_PAYMENT": "R$ {:.2f}",
+                    "VALUE_PER_UNIT": "R$ {:.2f}",
+                    "VALUE_PER_POINT": "R$ {:.2f}"
+                })
+            )
+            st.caption(f"{len(list_snapshots())} frozen month(s).")
+    except Exception as e:
+        st.error(f"An error occurred while loading the production history: {e}")
 
-        pdf.ln(10)
-        
-        # -----------------------------------------------------------------------------
-        # Add hospital and modality dataframes to subsequent pages in table format
-        # -----------------------------------------------------------------------------
-        for hospital in doctor_grouped['UNIDADE'].unique():
-            pdf.add_page()
-            pdf.set_font('Arial', 'B', 24)
-            pdf.set_text_color(0, 0, 255)
-            pdf.cell(0, 10, f'Hospital: {hospital}', ln=True, align='C')
-            pdf.set_text_color(0, 0, 0)
-            pdf.ln(10)
-            hospital_df = doctor_grouped[doctor_grouped['UNIDADE'] == hospital]
-            for grupo in hospital_df['GRUPO'].unique():
-                pdf.set_font('Arial', 'B', 12)
-                pdf.cell(0, 10, f'Modality: {grupo}', ln=True)
-                pdf.ln(10)
-                grupo_df = hospital_df[hospital_df['GRUPO'] == grupo].copy()
-                grupo_df['POINTS'] = grupo_df['COUNT'] * grupo_df['MULTIPLIER']
-
-                # Create table header
-                pdf.set_font('Arial', 'B', 10)
-                pdf.cell(80, 10, 'Procedure', 1, 0, 'C')
-                pdf.cell(30, 10, 'Count', 1, 0, 'C')
-                pdf.cell(30, 10, 'Multiplier', 1, 0, 'C')
-                pdf.cell(30, 10, 'Points', 1, 1, 'C')
-
-                # Add rows to the table
-                pdf.set_font('Arial', '', 10)
-                for _, row in grupo_df.iterrows():
-                    procedure_text = row['DESCRICAO_PROCEDIMENTO']
-                    # Truncate if too long
-                    if len(procedure_text) > 30:
-                        procedure_text = procedure_text[:30] + '...'
-                    pdf.cell(80, 10, procedure_text, 1, 0, 'L')
-                    pdf.cell(30, 10, str(row['COUNT']), 1, 0, 'C')
-                    pdf.cell(30, 10, f"{row['MULTIPLIER']:.1f}", 1, 0, 'C')
-                    pdf.cell(30, 10, f"{row['POINTS']:.1f}", 1, 1, 'C')
-
-                    # Check if we need a page break
-                    if pdf.get_y() > 180:  
-                        pdf.add_page()
-                        pdf.set_font('Arial', 'B', 10)
-                        pdf.cell(80, 10, 'Procedure', 1, 0, 'C')
-                        pdf.cell(30, 10, 'Count', 1, 0, 'C')
-                        pdf.cell(30, 10, 'Multiplier', 1, 0, 'C')
-                        pdf.cell(30, 10, 'Points', 1, 1, 'C')
-                
-                # Summary for the modality
-                total_points = grupo_df['POINTS'].sum()
-                total_exams = grupo_df['COUNT'].sum()
-                pdf.ln(5)
-                pdf.set_font('Arial', 'B', 10)
-                pdf.cell(0, 10, f'Total Points for {grupo}: {total_points}', ln=True)
-                pdf.cell(0, 10, f'Total Number of Exams for {grupo}: {total_exams}', ln=True)
-                pdf.ln(10)
-        
-        pdf_file_path = 'Medical_Analysis_Combined_Report.pdf'
-        pdf.output(pdf_file_path)
-        st.success('Combined report exported successfully! You can download the file from the link below:')
-        with open(pdf_file_path, 'rb') as file:
+with tab4:
+    production_history()
+
+
+# -------------------------------------------------------------------------------
+# TAB 5: What-if on multipliers.csv (sparse count matrix x edited multipliers)
+# -------------------------------------------------------------------------------
+@st.fragment
+def multiplier_simulator(excel_df, payment_store, selected_year, selected_month):
+    st.subheader("Multiplier What-If Simulator")
+    try:
+        available_months = sorted(
+            (int(year), int(month))
+            for year, month in excel_df[['YEAR', 'MONTH']].dropna().drop_duplicates().itertuples(index=False)
+        )
+        simulated_months = st.multiselect(
+            "Months",
+            available_months,
+            default=[(selected_year, selected_month)] if (selected_year, selected_month) in available_months else None,
+            format_func=lambda ym: f"{month_names[ym[1] - 1]}/{ym[0]}"
+        )
+        if not simulated_months:
+            st.info("Select at least one month to simulate.")
+        else:
+            simulator = load_simulator(tuple(sorted(simulated_months)), excel_df, procedure_catalog, payment_store, doctor_registry)
+
+            st.markdown("Edit the **MULTIPLIER** column; every doctor's points are recomputed instantly.")
+            edited_multipliers = st.data_editor(
+                simulator.multipliers_table(),
+                disabled=["DESCRICAO_PROCEDIMENTO", "COUNT"],
+                hide_index=True,
+                height=400,
+                key=f"multiplier_editor_{'_'.join(f'{y}{m:02d}' for y, m in sorted(simulated_months))}"
+            )
+            simulation = simulator.simulate(edited_multipliers)
+
+            total_before = simulation["POINTS_BEFORE"].sum()
+            total_after = simulation["POINTS_AFTER"].sum()
+            col1, col2 = st.columns(2)
+            col1.metric("Total Points", f"{total_after:,.1f}", f"{total_after - total_before:+,.1f}")
+            col2.metric("Doctors Affected", int((simulation["POINTS_DELTA"].abs() > 1e-9).sum()))
+
+            simulation["PERIOD"] = [f"{month_names[m - 1]}/{y}" for y, m in zip(simulation["YEAR"], simulation["MONTH"])]
+            st.dataframe(
+                simulation.sort_values("VALUE_PER_POINT_DELTA", key=lambda s: s.abs(), ascending=False)[[
+                    "PERIOD", "NORMALIZED_MEDICO", "APPROVED_COUNT", "TOTAL_PAYMENT",
+                    "POINTS_BEFORE", "POINTS_AFTER", "POINTS_DELTA",
+                    "VALUE_PER_POINT_BEFORE", "VALUE_PER_POINT_AFTER", "VALUE_PER_POINT_DELTA",
+                ]].style.format({
+                    "TOTAL_PAYMENT": "R$ {:.2f}",
+                    "POINTS_BEFORE": "{:.2f}",
+                    "POINTS_AFTER": "{:.2f}",
+                    "POINTS_DELTA": "{:+.2f}",
+                    "VALUE_PER_POINT_BEFORE": "R$ {:.2f}",
+                    "VALUE_PER_POINT_AFTER": "R$ {:.2f}",
+                    "VALUE_PER_POINT_DELTA": "R$ {:+.2f}"
+                }, na_rep="-"),
+                width=1200, height=400
+            )
             st.download_button(
-                label='Download Combined PDF',
-                data=file,
-                file_name='Medical_Analysis_Combined_Report.pdf'
+                label="Download Edited multipliers.csv",
+                data=simulator.multipliers_csv(edited_multipliers),
+                file_name="multipliers_simulated.csv",
+                mime="text/csv"
             )
     except Exception as e:
-        st.error(f'An error occurred while exporting the PDF: {e}')
+        st.error(f"An error occurred in the multiplier simulator: {e}")
+
+with tab5:
+    multiplier_simulator(excel_df, payment_store, selected_year, selected_month)
+
+
+# -----------------------------------------------------------------------------
+# MONTH-END BATCH: EVERY DOCTOR'S REPORT IN ONE ZIP (also: python prodmed_batch.py)
+# Queued as a background job: the ZIP is built by a worker process and kept on disk,
+# so reruns, other tabs or closing the browser do not interrupt it. Each session sees
+# only the exports it submitted; the queue is polled only while one of them is pending,
+# and the download is offered when the job is done.
+# -----------------------------------------------------------------------------
+JOB_POLL_SECONDS = 2
+
+def read_job_result(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def job_error(job):
+    lines = (job['error'] or '').strip().splitlines()
+    return lines[-1] if lines else 'unknown error'
+
+def session_batch_jobs():
+    """
+    The export jobs submitted from this browser session, newest first.
+    """
+    job_ids = st.session_state.get('batch_job_ids', [])
+    return load_job_queue().jobs('prodmed_reports', limit=5, ids=job_ids) if job_ids else []
+
+def render_batch_jobs(jobs):
+    for job in jobs:
+        if job['status'] == DONE:
+            if job['result_path'] and os.path.exists(job['result_path']):
+                st.download_button(
+                    label=f"Download {job['label']} reports ({job['result']['reports']} PDFs)",
+                    data=lambda path=job['result_path']: read_job_result(path),
+                    file_name=os.path.basename(job['result_path']),
+                    mime='application/zip',
+                    key=f"batch_job_{job['id']}",
+                    on_click='ignore'
+                )
+        elif job['status'] == FAILED:
+            st.error(f"Export {job['label']} failed: {job_error(job)}")
+        elif job['status'] == CANCELLED:
+            st.caption(f"Export {job['label']} cancelled.")
+        else:
+            st.progress(job['progress'], text=f"{job['label']}: {job['message'] or job['status']}")
+            if st.button('Cancel', key=f"cancel_batch_job_{job['id']}"):
+                load_job_queue().cancel(job['id'])
+
+def has_active_jobs(jobs):
+    return any(job['status'] not in FINISHED for job in jobs)
+
+# Polls the queue only while this session has an export queued or running
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def batch_jobs_progress():
+    jobs = session_batch_jobs()
+    render_batch_jobs(jobs)
+    if not has_active_jobs(jobs):
+        # Rerun the page once so the finished jobs move to the static list and polling stops
+        st.rerun()
+
+@st.fragment
+def month_batch_export(selected_month, selected_month_str, selected_year):
+    if st.button('Export All Doctors Reports (ZIP)'):
+        job_queue = load_job_queue()
+        job_id = job_queue.submit(
+            'prodmed_reports', {'month': selected_month, 'year': selected_year},
+            label=f'{selected_month_str}/{selected_year}'
+        )
+        st.session_state.setdefault('batch_job_ids', []).append(job_id)
+        ensure_workers(job_queue)
+        st.rerun()
+    jobs = session_batch_jobs()
+    if not has_active_jobs(jobs):
+        render_batch_jobs(jobs)
+
+month_batch_export(selected_month, selected_month_str, selected_year)
+if has_active_jobs(session_batch_jobs()):
+    batch_jobs_progress()
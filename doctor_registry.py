@@ -0,0 +1,235 @@
+import logging
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+from rapidfuzz import fuzz, process
+
+from local_store import data_path
+
+# -----------------------------
+# Canonical doctor identity registry
+# -----------------------------
+# One SQLite file shared by every process (dashboards, prodmed_batch, job workers):
+# IDs come from AUTOINCREMENT and aliases are UNIQUE, so two processes registering
+# at once cannot hand out conflicting DOCTOR_IDs.
+REGISTRY_PATH = data_path("doctor_registry.sqlite")
+# Registry of earlier versions, imported (keeping its IDs) the first time
+LEGACY_CSV_PATH = data_path("doctor_registry.csv")
+
+# Minimum token_sort_ratio for an unseen spelling to be folded into an existing doctor
+FUZZY_THRESHOLD = 92
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS doctors (
+    doctor_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    canonical_name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS aliases (
+    alias TEXT PRIMARY KEY,
+    doctor_id INTEGER NOT NULL REFERENCES doctors (doctor_id),
+    matched_alias TEXT,
+    score REAL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+def normalize_names(names: pd.Series) -> pd.Series:
+    """
+    Normalizes doctor names so spellings from different sources compare equal.
+    Folds accents, drops the "Dr."/"Dra." prefix, uppercases and collapses spacing.
+    The string work runs once per distinct value and is mapped back onto the Series.
+    """
+    names = names.fillna("").astype(str)
+    uniques = pd.Series(names.unique())
+    folded = (
+        uniques
+        .str.normalize("NFKD")
+        .str.encode("ascii", errors="ignore")
+        .str.decode("ascii")
+        .str.upper()
+        .str.replace(r"^\s*DRA?\.\s*|^\s*DRA?\s+", "", regex=True)
+        .str.replace(r"[^A-Z ]", " ", regex=True)
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+    )
+    return names.map(dict(zip(uniques, folded)))
+
+
+class DoctorRegistry:
+    """
+    Persisted mapping of every known spelling (ALIAS) to one integer DOCTOR_ID.
+    New spellings are resolved once (exact, then fuzzy against canonical names)
+    and written to the shared SQLite registry, so later runs only do dictionary lookups.
+    Fuzzy merges are logged and kept (matched alias and score) for review in fuzzy_merges().
+    """
+
+    def __init__(self, path=REGISTRY_PATH, threshold=FUZZY_THRESHOLD, legacy_csv_path=LEGACY_CSV_PATH):
+        self.path = path
+        self.threshold = threshold
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        with self._transaction() as conn:
+            empty = conn.execute("SELECT COUNT(*) FROM aliases").fetchone()[0] == 0
+            if empty and legacy_csv_path and os.path.exists(legacy_csv_path):
+                self._import_csv(conn, legacy_csv_path)
+        self._reload()
+
+    @contextmanager
+    def _connect(self):
+        # One connection per call: Streamlit resolves names from several threads
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE: one process registers at a time and sees the others' aliases
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _import_csv(conn, csv_path):
+        table = pd.read_csv(csv_path, dtype={"DOCTOR_ID": int, "ALIAS": str, "CANONICAL_NAME": str})
+        doctors = table.drop_duplicates("DOCTOR_ID")
+        conn.executemany(
+            "INSERT OR IGNORE INTO doctors (doctor_id, canonical_name) VALUES (?, ?)",
+            zip(doctors["DOCTOR_ID"].astype(int).tolist(), doctors["CANONICAL_NAME"])
+        )
+        now = time.time()
+        rows = zip(table["ALIAS"], table["DOCTOR_ID"].astype(int).tolist())
+        conn.executemany(
+            "INSERT OR IGNORE INTO aliases (alias, doctor_id, created_at) VALUES (?, ?, ?)",
+            [(alias, doctor_id, now) for alias, doctor_id in rows]
+        )
+
+    def _read(self, conn):
+        self.alias_to_id = dict(conn.execute("SELECT alias, doctor_id FROM aliases"))
+        self.id_to_name = dict(conn.execute("SELECT doctor_id, canonical_name FROM doctors"))
+
+    def _reload(self):
+        with self._connect() as conn:
+            self._read(conn)
+
+    def _fuzzy_match(self, alias):
+        """
+        (DOCTOR_ID, canonical name, score) of the closest canonical name above the
+        threshold, or None. Matching canonical names only (not every merged alias)
+        keeps a chain of near spellings from drifting into another doctor.
+        """
+        match = process.extractOne(
+            alias, self.id_to_name, scorer=fuzz.token_sort_ratio, score_cutoff=self.threshold
+        ) if self.id_to_name else None
+        return (match[2], match[0], match[1]) if match else None
+
+    def _register(self, conn, alias):
+        match = self._fuzzy_match(alias)
+        if match:
+            doctor_id, matched_alias, score = match
+            logger.info("Doctor alias %r merged into %r (DOCTOR_ID %s, score %.1f)",
+                        alias, matched_alias, doctor_id, score)
+        else:
+            matched_alias = score = None
+            doctor_id = conn.execute("INSERT INTO doctors (canonical_name) VALUES (?)", (alias,)).lastrowid
+            self.id_to_name[doctor_id] = alias
+        conn.execute(
+            "INSERT INTO aliases (alias, doctor_id, matched_alias, score, created_at) VALUES (?, ?, ?, ?, ?)",
+            (alias, doctor_id, matched_alias, score, time.time())
+        )
+        self.alias_to_id[alias] = doctor_id
+
+    def resolve(self, names: pd.Series) -> pd.Series:
+        """
+        Returns a nullable integer Series of DOCTOR_IDs aligned with `names`,
+        registering spellings not seen before. Blank names resolve to <NA>.
+        """
+        normalized = normalize_names(names)
+        unseen = [n for n in normalized.unique() if n and n not in self.alias_to_id]
+        if unseen:
+            with self._transaction() as conn:
+                # Aliases registered meanwhile by other processes count as known
+                self._read(conn)
+                # Sorted, so the merges do not depend on the order rows arrive in
+                for alias in sorted(unseen):
+                    if alias not in self.alias_to_id:
+                        self._register(conn, alias)
+        return normalized.map(self.alias_to_id).astype("Int64")
+
+    def resolve_one(self, name):
+        return self.resolve(pd.Series([name])).iloc[0]
+
+    def lookup(self, names: pd.Series, fuzzy=True) -> pd.Series:
+        """
+        Like resolve, but read-only: names not in the registry (exactly, or fuzzily
+        above the threshold) give <NA> instead of becoming new doctors. For fixed
+        name lists such as exclusions. fuzzy=False matches known aliases only.
+        """
+        normalized = normalize_names(names)
+        if any(n and n not in self.alias_to_id for n in normalized.unique()):
+            self._reload()
+
+        def find(alias):
+            if not alias or alias in self.alias_to_id or not fuzzy:
+                return self.alias_to_id.get(alias)
+            match = self._fuzzy_match(alias)
+            return match[0] if match else None
+
+        return normalized.map({alias: find(alias) for alias in normalized.unique()}).astype("Int64")
+
+    def display_names(self, names: pd.Series) -> pd.Series:
+        """
+        Canonical name for spellings the registry already knows exactly, otherwise the
+        normalized name itself. Read-only, so pages that only group names from uploads
+        (ibam, prescritor) can neither create payroll DOCTOR_IDs nor merge another
+        person into one.
+        """
+        canonical = self.names(self.lookup(names, fuzzy=False))
+        return canonical.fillna(normalize_names(names)).replace("", pd.NA)
+
+    def names(self, ids: pd.Series) -> pd.Series:
+        """
+        Canonical (normalized) display name for each DOCTOR_ID.
+        """
+        if any(doctor_id not in self.id_to_name for doctor_id in ids.dropna().unique()):
+            # IDs minted by another process since this registry was loaded
+            self._reload()
+        return ids.map(self.id_to_name)
+
+    def fuzzy_merges(self) -> pd.DataFrame:
+        """
+        Every alias that was folded into an existing doctor by fuzzy matching, with
+        the canonical name it matched and the score, for review.
+        """
+        with self._connect() as conn:
+            return pd.read_sql_query(
+                "SELECT a.alias AS ALIAS, a.matched_alias AS MATCHED_ALIAS, a.score AS SCORE, "
+                "a.doctor_id AS DOCTOR_ID, d.canonical_name AS CANONICAL_NAME "
+                "FROM aliases a JOIN doctors d USING (doctor_id) "
+                "WHERE a.matched_alias IS NOT NULL ORDER BY a.score, a.alias",
+                conn
+            )
+
+    def table(self) -> pd.DataFrame:
+        """
+        The whole registry (DOCTOR_ID, ALIAS, CANONICAL_NAME).
+        """
+        with self._connect() as conn:
+            return pd.read_sql_query(
+                "SELECT a.doctor_id AS DOCTOR_ID, a.alias AS ALIAS, d.canonical_name AS CANONICAL_NAME "
+                "FROM aliases a JOIN doctors d USING (doctor_id) ORDER BY a.doctor_id, a.alias",
+                conn
+            )
@@ -7,6 +7,8 @@ import requests
 from io import BytesIO
 import numpy as np
 from rapidfuzz import fuzz, process
+from doctor_registry import DoctorRegistry
+from table_styles import flag_rule, style_rules
 
 
 # Streamlit app
@@ -15,6 +17,10 @@ def load_logo(url):
     response = requests.get(url)
     return Image.open(BytesIO(response.content))
 
+@st.cache_resource
+def load_doctor_registry():
+    return DoctorRegistry()
+
 @st.cache_data
 def load_excel(file):
     return pd.read_excel(file)
@@ -33,10 +39,7 @@ def match_names(name, exam_names):
     # O RapidFuzz já retorna uma tupla (match, score, index) – adapte se necessário
     return match[0] if match and match[1] >= 70 else None
 
-def highlight_rows(row):
-    if pd.notna(row['Destaque']):
-        return ['background-color: yellow'] * len(row)
-    return [''] * len(row)
+highlight_rules = [flag_rule('Destaque', 'background-color: yellow')]
 
 def main():
     st.title("Análise IBAM")
@@ -100,9 +103,11 @@ def main():
                 st.error(f"Colunas faltando no dataset Consultas: {', '.join([col for col in required_columns_consultas if col not in df_consultas.columns])}")
                 return
     
-            # Padronizar colunas
-            df['MEDICO_SOLICITANTE'] = df['MEDICO_SOLICITANTE'].str.strip().str.lower()
-            df_consultas['Prestador'] = df_consultas['Prestador'].str.strip().str.lower()
+            # Padronizar colunas: exames e consultas usam o nome canônico do registro quando ele
+            # já conhece a grafia (só consulta: o registro define os DOCTOR_IDs da folha do PRODMED)
+            doctor_registry = load_doctor_registry()
+            df['MEDICO_SOLICITANTE'] = doctor_registry.display_names(df['MEDICO_SOLICITANTE']).str.lower()
+            df_consultas['Prestador'] = doctor_registry.display_names(df_consultas['Prestador']).str.lower()
     
             if 'Convênio' in df_consultas.columns:
                 df_consultas['Convênio'] = df_consultas['Convênio'].str.strip().str.upper()
@@ -132,13 +137,13 @@ def main():
                 st.warning("Nenhum dado disponível para o período selecionado.")
                 return
     
-            selected_doctor = st.sidebar.selectbox("Selecione o Médico Prescritor", options=filtered_df['MEDICO_SOLICITANTE'].unique())
+            selected_doctor = st.sidebar.selectbox("Selecione o Médico Prescritor", options=filtered_df['MEDICO_SOLICITANTE'].dropna().unique())
     
             # 🔹 **Filtrar exames do médico selecionado**
             exames_doctor_df = filtered_df[filtered_df['MEDICO_SOLICITANTE'] == selected_doctor]
     
             # 🔹 **Filtrar consultas do médico selecionado**
-            consultas_doctor_df = df_consultas[df_consultas['Prestador'] == selected_doctor] if selected_doctor in df_consultas['Prestador'].values else pd.DataFrame()
+            consultas_doctor_df = df_consultas[df_consultas['Prestador'] == selected_doctor]
     
             # 🔹 **Marcar pacientes encontrados nos exames**
             exam_patients = set(exames_doctor_df['NOME_PACIENTE'].dropna().str.lower())
@@ -157,14 +162,14 @@ def main():
                     total_exames = len(exames_mod_df)
                     total_grifados = exames_mod_df['Destaque'].notna().sum()
                     st.subheader(f"{modalidade} - Total: {total_exames} (Grifados: {total_grifados})")
-                    st.dataframe(exames_mod_df.style.apply(highlight_rows, axis=1))
+                    st.dataframe(style_rules(exames_mod_df, highlight_rules))
             else:
                 st.warning("Nenhum exame encontrado para este médico.")
     
             # 🔹 **Exibir lista de consultas destacadas**
             st.subheader(f"Consultas - Total de Pacientes: {len(consultas_doctor_df)}")
             if not consultas_doctor_df.empty:
-                st.dataframe(consultas_doctor_df.style.apply(highlight_rows, axis=1))
+                st.dataframe(style_rules(consultas_doctor_df, highlight_rules))
             else:
                 st.warning("Nenhuma consulta encontrada para este médico.")
     
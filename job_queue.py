@@ -0,0 +1,248 @@
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from local_store import data_dir, data_path
+
+# -----------------------------
+# Local job queue for long-running work (mining a big ZIP, every doctor's PDF)
+# -----------------------------
+# Jobs are rows in a SQLite file shared by the dashboards and the worker processes
+# (job_worker.py). A job is claimed by one worker at a time, and at most MAX_RUNNING
+# jobs run at once across all workers; each job may use CPUS_PER_JOB processes.
+# Status, progress and results stay in the table, so a job survives the browser tab
+# that queued it, and its result can be downloaded later.
+JOBS_PATH = data_path("jobs.sqlite")
+JOBS_DIR = data_dir("jobs")
+MAX_RUNNING = int(os.environ.get("SLA_JOBS_MAX_RUNNING", max(1, (os.cpu_count() or 1) // 4)))
+CPUS_PER_JOB = max(1, (os.cpu_count() or 1) // MAX_RUNNING)
+# A worker that has not checked in for this long is considered dead; its job is requeued
+HEARTBEAT_TIMEOUT = 60
+MAX_ATTEMPTS = 3
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    label TEXT NOT NULL DEFAULT '',
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT NOT NULL DEFAULT '',
+    result TEXT,
+    result_path TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker_pid INTEGER,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+CREATE TABLE IF NOT EXISTS workers (
+    pid INTEGER PRIMARY KEY,
+    heartbeat REAL NOT NULL
+);
+"""
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a job (by JobContext.progress) when the user asked to cancel it.
+    """
+
+
+def _row(cursor, row):
+    job = {column[0]: value for column, value in zip(cursor.description, row)}
+    for key in ("params", "result"):
+        if key in job and job[key] is not None:
+            job[key] = json.loads(job[key])
+    return job
+
+
+class JobQueue:
+    def __init__(self, path=JOBS_PATH, max_running=MAX_RUNNING):
+        self.path = path
+        self.max_running = max_running
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # One connection per call: Streamlit and the workers use the queue from several threads
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = _row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers cannot
+        # claim the same job or both see a free slot
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    # ---- dashboard side ----
+
+    def submit(self, kind, params, label=""):
+        """
+        Queues a job of `kind` (see job_worker.JOB_HANDLERS) and returns its id.
+        `params` must be JSON-serializable (paths, not file contents).
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (kind, label, params, status, created_at) VALUES (?, ?, ?, ?, ?)",
+                (kind, label, json.dumps(params, ensure_ascii=False), QUEUED, time.time())
+            )
+            return cursor.lastrowid
+
+    def job(self, job_id):
+        with self._connect() as conn:
+            return conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    def jobs(self, kind=None, limit=20, ids=None):
+        """
+        Most recent jobs first, optionally only those in `ids` (e.g. the ones a
+        dashboard session submitted).
+        """
+        conditions, params = [], []
+        if kind is not None:
+            conditions.append("kind = ?")
+            params.append(kind)
+        if ids is not None:
+            conditions.append(f"id IN ({', '.join('?' * len(ids))})")
+            params.extend(ids)
+        sql = "SELECT * FROM jobs"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY id DESC LIMIT ?"
+        with self._connect() as conn:
+            return conn.execute(sql, (*params, limit)).fetchall()
+
+    def cancel(self, job_id):
+        """
+        A queued job is cancelled right away; a running one stops at its next progress update.
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+                (CANCELLED, time.time(), job_id, QUEUED)
+            )
+            conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?", (job_id, RUNNING))
+
+    def workers_alive(self):
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) AS n FROM workers WHERE heartbeat >= ?", (time.time() - HEARTBEAT_TIMEOUT,)
+            ).fetchone()["n"]
+
+    # ---- worker side ----
+
+    def heartbeat(self, pid):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO workers VALUES (?, ?)", (pid, time.time()))
+
+    def remove_worker(self, pid):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM workers WHERE pid = ?", (pid,))
+
+    def claim(self, pid):
+        """
+        The oldest queued job, now marked as running by `pid`, or None when the queue
+        is empty or MAX_RUNNING jobs are already running. Jobs of dead workers are
+        requeued first (up to MAX_ATTEMPTS attempts).
+        """
+        with self._transaction() as conn:
+            limit = time.time() - HEARTBEAT_TIMEOUT
+            orphans = (
+                "status = ? AND (worker_pid IS NULL OR worker_pid NOT IN "
+                "(SELECT pid FROM workers WHERE heartbeat >= ?))"
+            )
+            conn.execute(
+                f"UPDATE jobs SET status = ?, error = 'worker stopped responding', finished_at = ? "
+                f"WHERE {orphans} AND attempts >= ?",
+                (FAILED, time.time(), RUNNING, limit, MAX_ATTEMPTS)
+            )
+            conn.execute(
+                f"UPDATE jobs SET status = ?, worker_pid = NULL WHERE {orphans}",
+                (QUEUED, RUNNING, limit)
+            )
+            running = conn.execute("SELECT COUNT(*) AS n FROM jobs WHERE status = ?", (RUNNING,)).fetchone()["n"]
+            if running >= self.max_running:
+                return None
+            job = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY id LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if job is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker_pid = ?, attempts = attempts + 1, started_at = ?, "
+                "progress = 0, message = '' WHERE id = ?",
+                (RUNNING, pid, time.time(), job["id"])
+            )
+            return conn.execute("SELECT * FROM jobs WHERE id = ?", (job["id"],)).fetchone()
+
+    def update(self, job_id, progress, message=""):
+        """
+        Records progress (0-1) and returns True if the user asked to cancel the job.
+        """
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET progress = ?, message = ? WHERE id = ?", (progress, message, job_id))
+            job = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            return bool(job["cancel_requested"])
+
+    def finish(self, job_id, status, result=None, result_path=None, error=None):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, result_path = ?, error = ?, finished_at = ?, "
+                "progress = CASE WHEN ? = ? THEN 1 ELSE progress END WHERE id = ?",
+                (status, json.dumps(result, ensure_ascii=False) if result is not None else None,
+                 result_path, error, time.time(), status, DONE, job_id)
+            )
+
+
+class JobContext:
+    """
+    What a job handler sees: its id, the CPU budget and progress reporting.
+    """
+
+    def __init__(self, queue, job):
+        self.queue = queue
+        self.id = job["id"]
+        self.cpus = CPUS_PER_JOB
+
+    def progress(self, fraction, message=""):
+        """
+        Reports progress; raises JobCancelled if the job was cancelled, so handlers
+        should save partial results before calling it.
+        """
+        if self.queue.update(self.id, min(max(fraction, 0.0), 1.0), message):
+            raise JobCancelled()
+
+    def result_path(self, file_name):
+        """
+        Where to write the job's result file (kept for later download).
+        """
+        return os.path.join(data_dir("jobs", str(self.id)), file_name)
+
+
+def input_path(file_name):
+    """
+    A new path for a job input (e.g. an uploaded ZIP) that the workers can read.
+    """
+    return os.path.join(data_dir("jobs", "inputs"), f"{time.time_ns()}-{os.path.basename(file_name)}")
@@ -0,0 +1,116 @@
+import argparse
+import importlib
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+import traceback
+
+from job_queue import (
+    CANCELLED, DONE, FAILED, HEARTBEAT_TIMEOUT, JOBS_DIR, JOBS_PATH, MAX_RUNNING,
+    JobCancelled, JobContext, JobQueue
+)
+
+# -----------------------------
+# Worker processes for the job queue (see job_queue.py)
+# -----------------------------
+# Run `python job_worker.py` next to the dashboards, or let them start it on the first
+# submitted job (ensure_workers). Each worker claims one job at a time, so a slow job
+# never runs inside a Streamlit rerun; the queue caps how many run at once.
+#
+# kind -> "module:function". The handler gets (params, JobContext) and returns
+# (summary dict, result file path or None).
+JOB_HANDLERS = {
+    "mineracao": "miner_jobs:minerar",
+    "prodmed_reports": "prodmed_batch:run_reports_job",
+}
+POLL_SECONDS = 1.0
+HEARTBEAT_SECONDS = HEARTBEAT_TIMEOUT / 6
+
+
+def run_job(queue, job):
+    module, function = JOB_HANDLERS[job["kind"]].split(":")
+    try:
+        handler = getattr(importlib.import_module(module), function)
+        result, result_path = handler(job["params"], JobContext(queue, job))
+    except JobCancelled:
+        queue.finish(job["id"], CANCELLED)
+    except Exception:
+        queue.finish(job["id"], FAILED, error=traceback.format_exc())
+    else:
+        queue.finish(job["id"], DONE, result, result_path)
+
+
+def _heartbeat(queue, pid, stop):
+    # In a thread, so a handler busy for minutes between progress updates is not taken for dead
+    while not stop.wait(HEARTBEAT_SECONDS):
+        queue.heartbeat(pid)
+
+
+def work(path=JOBS_PATH, max_running=MAX_RUNNING):
+    """
+    Worker loop: claims and runs jobs until the process is stopped.
+    """
+    queue = JobQueue(path, max_running)
+    pid = os.getpid()
+    queue.heartbeat(pid)
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat, args=(queue, pid, stop), daemon=True).start()
+    try:
+        while True:
+            job = queue.claim(pid)
+            if job is None:
+                time.sleep(POLL_SECONDS)
+            else:
+                run_job(queue, job)
+    finally:
+        stop.set()
+        queue.remove_worker(pid)
+
+
+def ensure_workers(queue):
+    """
+    Starts `python job_worker.py` in the background when no worker is alive.
+    Returns True if it started one.
+    """
+    if queue.workers_alive():
+        return False
+    with open(os.path.join(JOBS_DIR, "worker.log"), "ab") as log:
+        process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__)],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stdout=log, stderr=subprocess.STDOUT, start_new_session=True
+        )
+    # Waited on in a thread, so a worker that exits does not linger as a zombie of the dashboard
+    threading.Thread(target=process.wait, daemon=True).start()
+    # Counts as alive until its workers check in, so the next rerun does not start another
+    queue.heartbeat(process.pid)
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the background job workers.")
+    parser.add_argument("--workers", type=int, default=MAX_RUNNING,
+                        help=f"worker processes (default: SLA_JOBS_MAX_RUNNING = {MAX_RUNNING})")
+    args = parser.parse_args(argv)
+
+    if args.workers <= 1:
+        work()
+        return
+    # Not daemons: handlers start their own process pools
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=work) for _ in range(args.workers)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()
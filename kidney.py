@@ -1,16 +1,27 @@
+import mimetypes
 import os
 import re
-import fitz  # PyMuPDF
-import pytesseract
+import time
 from PIL import Image
-import calendar
+import numpy as np
 import pandas as pd
 import streamlit as st
 from io import BytesIO
-from fuzzywuzzy import fuzz, process
-import zipfile
 import requests  # Para carregar a logo a partir de uma URL
-import base64  # Já utilizado para download do PDF
+from job_queue import CANCELLED, DONE, FAILED, FINISHED, JobQueue
+from job_worker import ensure_workers
+from miner_blobs import BlobStore
+from miner_cache import MinerCache
+from miner_correlacao import melhores_correspondencias
+from miner_extraction import EXTENSOES_LAUDO
+from miner_jobs import enfileirar, erro_resumido, jobs_rastreador, salvar_entrada, salvar_zip
+from miner_pool import (
+    contar_documentos_zip, criar_pool, deduplicar_pacientes, iterar_documentos_zip, iterar_resultados,
+    pool_ativo
+)
+from miner_relatorios import contar_pacientes, html_diario, html_mensal
+from miner_resultados import ResultadosStore
+from miner_trackers import RASTREADORES, detectar_calculos
 
 # -------------------------------
 # FUNÇÃO PARA CARREGAR A LOGO COM CACHE
@@ -59,252 +70,277 @@ if logo is not None:
 st.sidebar.header("Selecione os Arquivos")
 
 # -------------------------------
-# EXPRESSÕES REGULARES GLOBAIS
+# POOL DE EXTRAÇÃO
+# Texto, OCR e detecção rodam em paralelo (miner_pool); o pool é criado uma vez
+# e reaproveitado entre reruns e sessões (e recriado se um processo filho morrer).
 # -------------------------------
-regex_calculo = re.compile(r"c\s*[áa]\s*l\s*[cç]\s*[úu]\s*l\s*[oa]s?", re.IGNORECASE)
-regex_tamanho = re.compile(r"\b\d+[.,]?\d*\s?(?:mm|cm)\b", re.IGNORECASE)
-regex_nome = re.compile(r"(?i)paciente\s*:\s*(.+)")
-regex_idade = re.compile(r"(?i)idade\s*:\s*(\d+[Aa]?\s*\d*[Mm]?)")
-regex_same = re.compile(r"(?i)same\s*:\s*(\S+)")
-regex_data = re.compile(r"(?i)data\s*do\s*exame\s*:\s*([\d/]+)")
+@st.cache_resource(show_spinner=False, validate=pool_ativo)
+def load_extraction_pool():
+    return criar_pool()
+
+
+# Cache em disco por SHA-256 do PDF: laudos já minerados não são reabertos
+@st.cache_resource(show_spinner=False)
+def load_miner_cache():
+    return MinerCache()
+
+
+# PDFs com achados ficam em disco; a sessão guarda só o hash de cada um
+@st.cache_resource(show_spinner=False)
+def load_pdf_store():
+    return BlobStore()
 
-# -------------------------------
-# FUNÇÃO PARA DESTACAR A PALAVRA-CHAVE "CALCULO" EM AMARELO
-# -------------------------------
-def highlight_calculo(sentence):
-    """
-    Recebe uma frase e retorna a mesma frase com todas as ocorrências
-    do termo 'calculo' (considerando variações com acentuação e espaçamentos)
-    envolvidas em uma tag <span> com fundo amarelo.
-    """
-    pattern = r"(c\s*[áa]\s*l\s*[cç]\s*[úu]\s*l\s*[oa]s?)"
-    highlighted = re.sub(
-        pattern,
-        r"<span style='background-color: green;'>\1</span>",
-        sentence,
-        flags=re.IGNORECASE
-    )
-    return highlighted
+
+# Pacientes minerados acumulados em disco: sobrevivem a refresh e a reinícios e
+# são compartilhados entre as sessões
+@st.cache_resource(show_spinner=False)
+def load_resultados():
+    return ResultadosStore(detectar_calculos.__name__, [*RASTREADORES["kidney"].colunas_saida(), "Convenio"])
+
+
+# Fila de jobs em segundo plano (job_queue): lotes grandes rodam nos processos do
+# job_worker.py, fora dos reruns da página, e continuam com a aba fechada
+@st.cache_resource(show_spinner=False)
+def load_fila():
+    return JobQueue()
 
 # -------------------------------
 # FUNÇÕES DE PROCESSAMENTO
+# Os achados aparecem à medida que cada laudo termina e são gravados no armazenamento
+# acumulado a cada atualização da tela; cancelar (ou qualquer rerun no meio do lote)
+# mantém o que já foi processado.
 # -------------------------------
-def extrair_texto(pdf_input):
-    """
-    Extrai o texto do PDF. Se não houver texto, aplica OCR.
-    Aceita tanto um caminho (string) quanto um objeto file-like (BytesIO).
-    """
-    texto_completo = ""
-    if isinstance(pdf_input, str):
-        doc = fitz.open(pdf_input)
-    elif hasattr(pdf_input, "read"):
-        pdf_input.seek(0)
-        pdf_bytes = pdf_input.read()
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    else:
-        doc = fitz.open(pdf_input)
-    for page_num in range(len(doc)):
-        texto = doc[page_num].get_text("text")
-        if not texto.strip():
-            pix = doc[page_num].get_pixmap()
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            texto = pytesseract.image_to_string(img, lang="por")
-        texto_completo += texto + "\n"
-    doc.close()
-    return texto_completo
-
-def extrair_informacoes(texto_completo):
+ATUALIZACAO_SEGUNDOS = 0.5
+
+
+def processar_com_progresso(documentos, total=None):
     """
-    Extrai informações do cabeçalho do laudo a partir do texto completo.
+    Processa (nome, bytes) de `documentos` mostrando o progresso, a vazão e os achados
+    parciais. Retorna o DataFrame (deduplicado) dos achados deste processamento.
     """
-    dados_cabecalho = {}
-    dados_cabecalho["Paciente"] = regex_nome.search(texto_completo).group(1).strip() if regex_nome.search(texto_completo) else "N/D"
-    dados_cabecalho["Idade"] = regex_idade.search(texto_completo).group(1).strip() if regex_idade.search(texto_completo) else "N/D"
-    dados_cabecalho["Same"] = regex_same.search(texto_completo).group(1).strip() if regex_same.search(texto_completo) else "N/D"
-    dados_cabecalho["Data do Exame"] = regex_data.search(texto_completo).group(1).strip() if regex_data.search(texto_completo) else "N/D"
-    return dados_cabecalho
+    st.session_state["processamento_em_andamento"] = True
+    # O clique reroda a página, o que interrompe este laço
+    st.button("Cancelar processamento")
+    progresso = st.progress(0.0, text="Iniciando...")
+    tabela = st.empty()
+    registros, pendentes = [], []
+    inicio = ultima_atualizacao = time.perf_counter()
+    concluidos = 0
+
+    def atualizar():
+        if pendentes:
+            load_resultados().adicionar(deduplicar_pacientes(pd.DataFrame(pendentes)))
+            registros.extend(pendentes)
+            pendentes.clear()
+        decorrido = max(time.perf_counter() - inicio, 1e-6)
+        progresso.progress(
+            min(concluidos / total, 1.0) if total else 0.0,
+            text=f"{concluidos}{f'/{total}' if total else ''} laudo(s) · "
+                 f"{concluidos / decorrido:.1f} laudos/s · {len(registros)} achado(s)"
+        )
+        if registros:
+            tabela.dataframe(pd.DataFrame(registros).drop(columns=["pdf_hash", "Arquivo", "Sentenca"], errors="ignore"))
+
+    fluxo = iterar_resultados(
+        documentos, [detectar_calculos], load_extraction_pool(), load_miner_cache(), load_pdf_store()
+    )
+    for _, (registros_laudo,) in fluxo:
+        concluidos += 1
+        pendentes.extend(registros_laudo)
+        if time.perf_counter() - ultima_atualizacao >= ATUALIZACAO_SEGUNDOS:
+            atualizar()
+            ultima_atualizacao = time.perf_counter()
+    atualizar()
+    st.session_state["processamento_em_andamento"] = False
+    novos_df = pd.DataFrame(registros)
+    return deduplicar_pacientes(novos_df) if not novos_df.empty else novos_df
+
 
 def processar_pdfs_streamlit(pdf_files):
     """
-    Processa os PDFs carregados via file uploader.
-    Retorna o relatório mensal, uma lista de registros e um DataFrame com os pacientes minerados.
-    Cada registro inclui o nome do arquivo, os bytes do PDF e a sentença destacada com a palavra-chave.
+    Processa os laudos carregados via file uploader.
+    Retorna um DataFrame com os pacientes minerados; cada registro inclui o nome do arquivo,
+    o hash do laudo (ver miner_blobs) e a sentença destacada com a palavra-chave.
     """
-    relatorio_mensal = {}
-    lista_calculos = []
-    for uploaded_file in pdf_files:
-        file_name = uploaded_file.name
-        pdf_bytes = uploaded_file.read()
-        pdf_stream = BytesIO(pdf_bytes)
-        texto_completo = extrair_texto(pdf_stream)
-        cabecalho = extrair_informacoes(texto_completo)
-        sentencas = re.split(r'(?<=[.!?])\s+', texto_completo)
-        ocorrencias_validas = []
-        for sentenca in sentencas:
-            sentenca = sentenca.replace('\n', ' ').replace('\r', ' ').strip()
-            # Verifica se a sentença contém o termo "calculo"
-            if regex_calculo.search(sentenca):
-                # Exclui se a sentença conter "sem"
-                if re.search(r"\bsem\b", sentenca, re.IGNORECASE):
-                    continue
-                # NOVO: Exclui se a sentença indicar negação (ex.: "não há", "não apresenta", etc.)
-                if re.search(r"\b(não\s+há|não\s+apresenta|não\s+possui|nenhum)\b", sentenca, re.IGNORECASE):
-                    continue
-                # Verifica se a sentença contém alguma das palavras obrigatórias
-                if not re.search(r"\b(?:renal(?:es)?|caliciano(?:s)?|calicinal(?:s)?|ureter(?:es)?|ureteral(?:ais))\b", sentenca, re.IGNORECASE):
-                    continue
-                # Destaca a ocorrência de "calculo" na frase
-                sentenca_destacada = highlight_calculo(sentenca)
-                tamanho_match = re.search(regex_tamanho, sentenca)
-                if tamanho_match:
-                    ocorrencias_validas.append((tamanho_match.group(0), sentenca_destacada))
-                else:
-                    ocorrencias_validas.append(("Não informado", sentenca_destacada))
-        
-        if ocorrencias_validas:
-            data_exame = cabecalho["Data do Exame"]
-            partes_data = data_exame.split("/")
-            if len(partes_data) == 3:
-                try:
-                    dia, mes, ano = partes_data
-                    mes = int(mes)
-                    ano = int(ano)
-                except ValueError:
-                    mes, ano = 0, 0
-            else:
-                mes, ano = 0, 0
-            key = (ano, mes)
-            if key not in relatorio_mensal:
-                relatorio_mensal[key] = set()
-            relatorio_mensal[key].add(cabecalho["Paciente"])
-            for tamanho, sentenca_destacada in ocorrencias_validas:
-                record = {**cabecalho,
-                          "Tamanho": tamanho,
-                          "Sentenca": sentenca_destacada,
-                          "Arquivo": file_name,
-                          "pdf_bytes": pdf_bytes}
-                lista_calculos.append(record)
-    for key in relatorio_mensal:
-        relatorio_mensal[key] = len(relatorio_mensal[key])
-    pacientes_minerados_df = pd.DataFrame(lista_calculos)
-    if not pacientes_minerados_df.empty:
-        pacientes_minerados_df['has_measure'] = pacientes_minerados_df['Tamanho'].apply(
-            lambda x: 0 if x.strip().lower() == "não informado" else 1
-        )
-        pacientes_minerados_df = pacientes_minerados_df.sort_values('has_measure', ascending=False)
-        pacientes_minerados_df = pacientes_minerados_df.drop_duplicates(subset=['Paciente', 'Same'], keep='first')
-        pacientes_minerados_df.drop(columns=['has_measure'], inplace=True)
-    return relatorio_mensal, lista_calculos, pacientes_minerados_df
+    # getbuffer(): memoryview do upload, sem copiar os bytes
+    documentos = [(uploaded_file.name, uploaded_file.getbuffer()) for uploaded_file in pdf_files]
+    return processar_com_progresso(documentos, len(documentos))
 
 
 def processar_pdfs_from_zip(zip_file):
     """
-    Recebe um arquivo ZIP e extrai todos os PDFs contidos nele.
-    Processa cada PDF e retorna o relatório mensal, uma lista de registros e um DataFrame.
-    Cada registro inclui o nome do arquivo, os bytes do PDF e a sentença destacada com a palavra-chave.
+    Processa os laudos contidos em um arquivo ZIP e retorna o DataFrame de pacientes minerados.
     """
-    relatorio_mensal = {}
-    lista_calculos = []
-    zip_data = BytesIO(zip_file.read())
-    with zipfile.ZipFile(zip_data, "r") as z:
-        pdf_names = [name for name in z.namelist() if name.lower().endswith(".pdf")]
-        for pdf_name in pdf_names:
-            with z.open(pdf_name) as pdf_file:
-                pdf_bytes = pdf_file.read()
-                pdf_stream = BytesIO(pdf_bytes)
-                texto_completo = extrair_texto(pdf_stream)
-                cabecalho = extrair_informacoes(texto_completo)
-                sentencas = re.split(r'(?<=[.!?])\s+', texto_completo)
-                ocorrencias_validas = []
-                for sentenca in sentencas:
-                    if regex_calculo.search(sentenca):
-                        if re.search(r"\bsem\b", sentenca, re.IGNORECASE):
-                            continue
-                        if re.search(r"\b(não\s+há|não\s+apresenta|não\s+possui|nenhum)\b", sentenca, re.IGNORECASE):
-                            continue
-                        if not re.search(r"\b(?:renal(?:es)?|caliciano(?:s)?|calicinal(?:s)?|ureter(?:es)?|ureteral(?:ais))\b", sentenca, re.IGNORECASE):
-                            continue
-                        sentenca_destacada = highlight_calculo(sentenca)
-                        tamanho_match = re.search(regex_tamanho, sentenca)
-                        if tamanho_match:
-                            ocorrencias_validas.append((tamanho_match.group(0), sentenca_destacada))
-                        else:
-                            ocorrencias_validas.append(("Não informado", sentenca_destacada))
-                if ocorrencias_validas:
-                    data_exame = cabecalho["Data do Exame"]
-                    partes_data = data_exame.split("/")
-                    if len(partes_data) == 3:
-                        try:
-                            dia, mes, ano = partes_data
-                            mes = int(mes)
-                            ano = int(ano)
-                        except ValueError:
-                            mes, ano = 0, 0
-                    else:
-                        mes, ano = 0, 0
-                    key = (ano, mes)
-                    if key not in relatorio_mensal:
-                        relatorio_mensal[key] = set()
-                    relatorio_mensal[key].add(cabecalho["Paciente"])
-                    for tamanho, sentenca_destacada in ocorrencias_validas:
-                        record = {**cabecalho,
-                                  "Tamanho": tamanho,
-                                  "Sentenca": sentenca_destacada,
-                                  "Arquivo": pdf_name,
-                                  "pdf_bytes": pdf_bytes}
-                        lista_calculos.append(record)
-    for key in relatorio_mensal:
-        relatorio_mensal[key] = len(relatorio_mensal[key])
-    pacientes_minerados_df = pd.DataFrame(lista_calculos)
-    if not pacientes_minerados_df.empty:
-        pacientes_minerados_df['has_measure'] = pacientes_minerados_df['Tamanho'].apply(
-            lambda x: 0 if x.strip().lower() == "não informado" else 1
-        )
-        pacientes_minerados_df = pacientes_minerados_df.sort_values('has_measure', ascending=False)
-        pacientes_minerados_df = pacientes_minerados_df.drop_duplicates(subset=['Paciente', 'Same'], keep='first')
-        pacientes_minerados_df.drop(columns=['has_measure'], inplace=True)
-        pacientes_minerados_df = pacientes_minerados_df.drop(columns=["Arquivo", "pdf_bytes"], errors="ignore")
-    return relatorio_mensal, lista_calculos, pacientes_minerados_df
+    # Um membro do ZIP por vez; a memória não cresce com o tamanho do arquivo
+    return processar_com_progresso(iterar_documentos_zip(zip_file), contar_documentos_zip(zip_file))
+
+# -------------------------------
+# DOWNLOAD DO PDF SOB DEMANDA
+# O PDF só é lido do disco quando o botão é clicado; o fragmento evita
+# rerodar a página inteira ao trocar o laudo selecionado.
+# -------------------------------
+@st.fragment
+def baixar_pdf(pacientes_df):
+    registros = pacientes_df.dropna(subset=["pdf_hash"]).reset_index(drop=True)
+    if registros.empty:
+        return
+    indice = st.selectbox(
+        "Selecione o laudo para download:",
+        registros.index,
+        format_func=lambda i: f"{registros.at[i, 'Paciente']} - {registros.at[i, 'Data do Exame']} ({registros.at[i, 'Arquivo']})"
+    )
+    pdf_hash = registros.at[indice, "pdf_hash"]
+    st.download_button(
+        label="Download do laudo",
+        data=lambda: load_pdf_store().ler(pdf_hash),
+        file_name=registros.at[indice, "Arquivo"],
+        mime=mimetypes.guess_type(str(registros.at[indice, "Arquivo"]))[0] or "application/octet-stream",
+        on_click="ignore"
+    )
 
+# -------------------------------
+# BUSCA NOS LAUDOS
+# Consulta o índice FTS5 do cache de extração (todos os laudos já minerados),
+# sem reenviar os PDFs. Fragmento: digitar a busca não reroda a página.
+# -------------------------------
+@st.fragment
+def busca_laudos():
+    st.markdown("### Busca nos laudos já minerados")
+    col_consulta, col_medida = st.columns([3, 1])
+    consulta = col_consulta.text_input(
+        "Termos da busca",
+        placeholder='ex.: "nódulo adrenal", calc*, nódulo NOT pulmão',
+        help="Sem diferenciar acentos/maiúsculas. Aspas: frase exata; *: prefixo; NOT: exclui."
+    )
+    medida_min = col_medida.number_input("Medida mínima (mm)", min_value=0.0, value=0.0, step=1.0)
+    if not consulta.strip():
+        return
+    try:
+        resultados = load_miner_cache().buscar_sentencas(consulta, medida_min or None)
+    except ValueError as e:
+        st.error(str(e))
+        return
+    st.caption(f"{len(resultados)} sentença(s) em {resultados['sha256'].nunique()} laudo(s)")
+    st.dataframe(resultados.drop(columns=["sha256"]), hide_index=True)
+
+# -------------------------------
+# ACOMPANHAMENTO POR PACIENTE
+# Consulta o índice longitudinal do cache (achados de todos os laudos já minerados,
+# por SAME, com a medida em mm e a data do exame), sem reprocessar os PDFs.
+# -------------------------------
+@st.fragment
+def acompanhamento_lesoes():
+    st.markdown("### Acompanhamento de cálculos por paciente")
+    cache = load_miner_cache()
+    rastreador = detectar_calculos.__name__
+    aba_persistentes, aba_crescimento = st.tabs(["Persistentes", "Em crescimento"])
+    with aba_persistentes:
+        col_medida, col_meses = st.columns(2)
+        medida = col_medida.number_input("Maior que (mm)", min_value=0.0, value=5.0, step=1.0)
+        meses = col_meses.number_input("Presente por pelo menos (meses)", min_value=1, value=6, step=1)
+        persistentes = cache.lesoes_persistentes(rastreador, medida, meses)
+        st.caption(f"{len(persistentes)} paciente(s)")
+        st.dataframe(persistentes, hide_index=True)
+    with aba_crescimento:
+        crescimento = st.number_input("Crescimento maior que (mm)", min_value=0.0, value=2.0, step=0.5)
+        em_crescimento = cache.lesoes_em_crescimento(rastreador, crescimento)
+        st.caption(f"{len(em_crescimento)} paciente(s)")
+        st.dataframe(em_crescimento, hide_index=True)
+    same = st.text_input("Histórico do paciente (SAME)")
+    if same.strip():
+        historico = cache.historico_lesoes(same.strip(), rastreador)
+        st.dataframe(historico.drop(columns=["sha256"]), hide_index=True)
+
+# -------------------------------
+# PROCESSAMENTOS EM SEGUNDO PLANO
+# Lotes enfileirados (miner_jobs) gravam os achados no armazenamento acumulado.
+# Só os lotes desta sessão aparecem, e o fragmento consulta a fila a cada poucos
+# segundos (sem rerodar a página) apenas enquanto algum deles está na fila ou rodando.
+# -------------------------------
+ATUALIZACAO_FILA_SEGUNDOS = 3
+
+
+def jobs_sessao():
+    """
+    Os jobs de mineração enfileirados nesta sessão do navegador, mais recentes primeiro.
+    """
+    ids = st.session_state.get("jobs_mineracao", [])
+    return jobs_rastreador(load_fila(), "kidney", ids=ids) if ids else []
+
+
+def jobs_ativos(jobs):
+    return any(job["status"] not in FINISHED for job in jobs)
+
+
+def processamentos_em_segundo_plano(jobs):
+    if not jobs:
+        return
+    st.markdown("### Processamentos em segundo plano")
+    for job in jobs:
+        rotulo = f"#{job['id']} {job['label']}"
+        if job["status"] == DONE:
+            st.caption(
+                f"{rotulo}: concluído · {job['result']['laudos']} laudo(s) · "
+                f"{job['result']['achados']['kidney']} achado(s)"
+            )
+        elif job["status"] == FAILED:
+            st.error(f"{rotulo}: falhou ({erro_resumido(job)})")
+        elif job["status"] == CANCELLED:
+            st.caption(f"{rotulo}: cancelado; os achados dos laudos já processados foram mantidos.")
+        else:
+            st.progress(job["progress"], text=f"{rotulo}: {job['message'] or 'na fila'}")
+            if st.button("Cancelar", key=f"cancelar_job_{job['id']}"):
+                load_fila().cancel(job["id"])
+    if st.button("Mostrar pacientes acumulados"):
+        st.session_state["pacientes_minerados_df"] = load_resultados().carregar()
+        st.session_state["lista_calculos"] = st.session_state["pacientes_minerados_df"].to_dict(orient="records")
+        st.session_state["mostrar_pacientes"] = True
+        st.rerun()
+
+
+@st.fragment(run_every=ATUALIZACAO_FILA_SEGUNDOS)
+def acompanhar_processamentos():
+    jobs = jobs_sessao()
+    processamentos_em_segundo_plano(jobs)
+    if not jobs_ativos(jobs):
+        # Reroda a página uma vez: os lotes concluídos passam à lista fixa e a consulta para
+        st.rerun()
+
+# Resultado em cache por conteúdo dos dois DataFrames (pacientes minerados, planilha)
+@st.cache_data(show_spinner=False, max_entries=16)
 def correlacionar_pacientes_fuzzy(pacientes_df, internados_df, threshold=70):
     """
     Correlaciona os pacientes minerados com os internados usando fuzzy matching.
     Retorna um DataFrame com os pacientes que tiveram correspondência com pontuação >= threshold
     e inclui a coluna 'convenio' extraída do dataframe dos internados.
     """
-    pacientes_df['Paciente'] = pacientes_df['Paciente'].fillna("").astype(str)
-    internados_df['Paciente'] = internados_df['Paciente'].fillna("").astype(str)
+    nomes = pacientes_df['Paciente'].fillna("").astype(str)
     if 'Convenio' not in internados_df.columns:
         st.warning("A coluna 'convenio' não foi encontrada no dataframe de internados. Será criada com valores vazios.")
-        internados_df['Convenio'] = None
-    pacientes_df['Paciente_lower'] = pacientes_df['Paciente'].str.lower()
-    internados_df['Paciente_lower'] = internados_df['Paciente'].str.lower()
-    internados_list = internados_df['Paciente_lower'].tolist()
-    matched_indices = []
-    convenios = []
-    for idx, row in pacientes_df.iterrows():
-        nome = row['Paciente_lower']
-        if not nome:
-            continue
-        best_match, score = process.extractOne(nome, internados_list, scorer=fuzz.ratio)
-        if score >= threshold:
-            matched_indices.append(idx)
-            match_idx = internados_df[internados_df['Paciente_lower'] == best_match].index[0]
-            convenio_value = internados_df.loc[match_idx, 'Convenio']
-            convenios.append(convenio_value)
-    correlated_df = pacientes_df.loc[matched_indices].copy()
-    correlated_df.drop(columns=['Paciente_lower'], inplace=True)
-    correlated_df = correlated_df.drop(columns=["Arquivo", "pdf_bytes"], errors="ignore")
-    correlated_df['Convenio'] = convenios
+        convenios_ref = np.full(len(internados_df), None, dtype=object)
+    else:
+        convenios_ref = internados_df['Convenio'].to_numpy()
+    posicoes, _ = melhores_correspondencias(nomes, internados_df['Paciente'].fillna("").astype(str), threshold)
+    encontrados = posicoes >= 0
+    correlated_df = pacientes_df[encontrados].copy()
+    correlated_df['Paciente'] = nomes[encontrados]
+    correlated_df = correlated_df.drop(columns=["Arquivo", "pdf_hash"], errors="ignore")
+    correlated_df['Convenio'] = convenios_ref[posicoes[encontrados]]
     return correlated_df
 
 # -------------------------------
 # ARMAZENAMENTO EM CACHE (st.session_state)
 # -------------------------------
 if "pacientes_minerados_df" not in st.session_state:
-    st.session_state["pacientes_minerados_df"] = pd.DataFrame(columns=["Paciente", "Idade", "Same", "Data do Exame", "Tamanho", "Sentenca", "Arquivo", "pdf_bytes", "Convenio"])
-    st.session_state["relatorio_mensal"] = {}
-    st.session_state["lista_calculos"] = []
+    st.session_state["pacientes_minerados_df"] = load_resultados().carregar()
+    st.session_state["lista_calculos"] = st.session_state["pacientes_minerados_df"].to_dict(orient="records")
+
+# Processamento interrompido (cancelado, ou a página rerodou no meio do lote): os achados
+# dos laudos já concluídos estão no armazenamento acumulado
+if st.session_state.pop("processamento_em_andamento", False):
+    st.session_state["pacientes_minerados_df"] = load_resultados().carregar()
+    st.session_state["lista_calculos"] = st.session_state["pacientes_minerados_df"].to_dict(orient="records")
+    st.warning("Processamento interrompido: os achados dos laudos já processados foram mantidos.")
 
 # -------------------------------
 # INTERFACE STREAMLIT (SIDEBAR)
@@ -313,9 +349,12 @@ upload_method = st.sidebar.radio("Selecione o método de upload:",
                                  ("Upload de PDFs", "Upload de ZIP contendo PDFs"))
 
 if upload_method == "Upload de PDFs":
-    pdf_files = st.sidebar.file_uploader("Selecione os arquivos PDF", type="pdf", accept_multiple_files=True)
+    pdf_files = st.sidebar.file_uploader(
+        "Selecione os laudos (PDF, ou exportação do RIS em TXT, HTML ou DOCX)",
+        type=list(EXTENSOES_LAUDO), accept_multiple_files=True
+    )
 else:
-    zip_file = st.sidebar.file_uploader("Selecione o arquivo ZIP contendo os PDFs", type="zip")
+    zip_file = st.sidebar.file_uploader("Selecione o arquivo ZIP contendo os laudos", type="zip")
 
 # Upload do arquivo de internados (opcional)
 internados_file = st.sidebar.file_uploader("Arquivo internados.xlsx (opcional)", type="xlsx")
@@ -327,107 +366,56 @@ atendimentos_file = st.sidebar.file_uploader("Arquivo Atendimentos PA (xlsx) (op
 # -------------------------------
 # BOTÃO DE PROCESSAMENTO
 # -------------------------------
-if st.sidebar.button("Processar"):
+if st.sidebar.button("Limpar pacientes acumulados"):
+    load_resultados().limpar()
+    st.session_state["pacientes_minerados_df"] = load_resultados().carregar()
+    st.session_state["lista_calculos"] = []
+
+if st.sidebar.button("Processar em segundo plano"):
     if upload_method == "Upload de PDFs" and pdf_files:
-        with st.spinner("Processando PDFs..."):
-            new_relatorio, new_lista_calculos, new_df = processar_pdfs_streamlit(pdf_files)
+        entrada = salvar_entrada((uploaded_file.name, uploaded_file.getbuffer()) for uploaded_file in pdf_files)
+        rotulo = f"{len(pdf_files)} arquivo(s)"
+    elif upload_method == "Upload de ZIP contendo PDFs" and zip_file:
+        entrada, rotulo = salvar_zip(zip_file), zip_file.name
+    else:
+        entrada = None
+        st.sidebar.error("Por favor, selecione os arquivos PDF ou o arquivo ZIP.")
+    if entrada:
+        st.session_state.setdefault("jobs_mineracao", []).append(enfileirar(load_fila(), ["kidney"], entrada, rotulo))
+        ensure_workers(load_fila())
+        st.sidebar.success("Processamento enfileirado; o andamento aparece no fim da página.")
+
+processar = st.sidebar.button("Processar")
+# "Mostrar pacientes acumulados" após um processamento em segundo plano: só exibe
+mostrar_pacientes = st.session_state.pop("mostrar_pacientes", False)
+if processar or mostrar_pacientes:
+    if mostrar_pacientes:
+        new_df = pd.DataFrame()
+    elif upload_method == "Upload de PDFs" and pdf_files:
+        new_df = processar_pdfs_streamlit(pdf_files)
         st.success("Processamento concluído!")
-    elif upload_method == "Upload de ZIP" and zip_file:
-        with st.spinner("Processando arquivo ZIP..."):
-            new_relatorio, new_lista_calculos, new_df = processar_pdfs_from_zip(zip_file)
+    elif upload_method == "Upload de ZIP contendo PDFs" and zip_file:
+        new_df = processar_pdfs_from_zip(zip_file)
         st.success("Processamento concluído!")
     else:
         st.error("Por favor, selecione os arquivos PDF ou o arquivo ZIP.")
-        new_relatorio, new_lista_calculos, new_df = {}, [], pd.DataFrame()
+        new_df = pd.DataFrame()
 
-    # Combina os dados novos com os já armazenados em cache
+    # Os achados do lote já foram gravados (upsert por Paciente/Same) durante o processamento
     if not new_df.empty:
-        combined_df = pd.concat([st.session_state["pacientes_minerados_df"], new_df], ignore_index=True)
-        combined_df['has_measure'] = combined_df['Tamanho'].apply(lambda x: 0 if x.strip().lower() == "não informado" else 1)
-        combined_df = combined_df.sort_values('has_measure', ascending=False)
-        combined_df = combined_df.drop_duplicates(subset=['Paciente', 'Same'], keep='first')
-        combined_df.drop(columns=['has_measure'], inplace=True)
+        combined_df = load_resultados().carregar()
         st.session_state["pacientes_minerados_df"] = combined_df
-
-        # Recalcula o relatório mensal a partir do DataFrame combinado
-        combined_relatorio = {}
-        for idx, row in combined_df.iterrows():
-            data_exame = row["Data do Exame"]
-            partes_data = data_exame.split("/")
-            if len(partes_data) == 3:
-                try:
-                    dia, mes, ano = partes_data
-                    mes = int(mes)
-                    ano = int(ano)
-                except ValueError:
-                    mes, ano = 0, 0
-            else:
-                mes, ano = 0, 0
-            key = (ano, mes)
-            if key not in combined_relatorio:
-                combined_relatorio[key] = set()
-            combined_relatorio[key].add(row["Paciente"])
-        for key in combined_relatorio:
-            combined_relatorio[key] = len(combined_relatorio[key])
-        st.session_state["relatorio_mensal"] = combined_relatorio
         st.session_state["lista_calculos"] = combined_df.to_dict(orient="records")
 
     # -------------------------------
     # MONTAGEM DO RELATÓRIO E DA LISTA (EM ABAS)
     # -------------------------------
-    report_md = "Pacientes encontrados com cálculos por mês:\n"
-    for key in sorted(st.session_state["relatorio_mensal"].keys(), key=lambda x: (x[0], x[1]) if isinstance(x, tuple) and len(x)==2 else (0,0)):
-        ano, mes = key if isinstance(key, tuple) and len(key)==2 else (0, 0)
-        nome_mes = calendar.month_name[mes] if 1 <= mes <= 12 else "Desconhecido"
-        report_md += f"- <span style='color: yellow; font-size: 20px;'>{nome_mes}/{ano}</span>: {st.session_state['relatorio_mensal'].get((ano, mes), 0)} paciente(s)<br>"
-    report_md += "<br>Dados dos pacientes minerados:<br>"
-    
-    df_para_exibicao = st.session_state["pacientes_minerados_df"].drop(columns=["pdf_bytes", "Arquivo", "Sentenca"], errors="ignore")
+    relatorio_mensal, relatorio_diario = contar_pacientes(st.session_state["pacientes_minerados_df"])
+    report_md = html_mensal(relatorio_mensal, "Pacientes encontrados com cálculos por mês:\n", "yellow")
     
-    # Prepara o relatório diário
-    relatorio_diario = {}
-    for idx, row in st.session_state["pacientes_minerados_df"].iterrows():
-        data = row["Data do Exame"]
-        partes = data.split("/")
-        if len(partes) == 3:
-            dia = partes[0].zfill(2)
-            try:
-                mes = int(partes[1])
-            except:
-                mes = 0
-            ano = partes[2]
-            key = (ano, mes, dia)
-            if key not in relatorio_diario:
-                relatorio_diario[key] = set()
-            relatorio_diario[key].add(row["Paciente"])
+    df_para_exibicao = st.session_state["pacientes_minerados_df"].drop(columns=["pdf_hash", "Arquivo", "Sentenca"], errors="ignore")
     
-    grouped_by_month = {}
-    for (ano, mes, dia), pacientes in relatorio_diario.items():
-        month_key = (ano, mes)
-        if month_key not in grouped_by_month:
-            grouped_by_month[month_key] = {}
-        grouped_by_month[month_key][dia] = len(pacientes)
-    
-    daily_report_md = "<h3>Pacientes minerados por dia</h3>"
-    for (ano, mes) in sorted(grouped_by_month.keys(), key=lambda x: (x[0], x[1])):
-        nome_mes = calendar.month_name[mes] if 1 <= mes <= 12 else "Desconhecido"
-        daily_report_md += f"<h4 style='color: cyan;'>{nome_mes}/{ano}</h4>"
-        daily_report_md += (
-            "<table style='width: 50%; border-collapse: collapse;'>"
-            "<tr>"
-            "<th style='border: 1px solid #ffffff; padding: 4px;'>Dia</th>"
-            "<th style='border: 1px solid #ffffff; padding: 4px;'>Pacientes</th>"
-            "</tr>"
-        )
-        for dia in sorted(grouped_by_month[(ano, mes)].keys()):
-            count = grouped_by_month[(ano, mes)][dia]
-            daily_report_md += (
-                f"<tr>"
-                f"<td style='border: 1px solid #ffffff; padding: 4px;'>{dia}</td>"
-                f"<td style='border: 1px solid #ffffff; padding: 4px;'>{count}</td>"
-                f"</tr>"
-            )
-        daily_report_md += "</table><br>"
+    daily_report_md = html_diario(relatorio_diario)
     
     # Cria os dois tabs: um para o relatório e outro para a lista com acesso ao PDF
     tab1, tab2 = st.tabs(["Relatório", "Lista de Pacientes Minerados com Acesso ao PDF"])
@@ -446,29 +434,15 @@ if st.sidebar.button("Processar"):
     # -------------------------------
     # SEÇÃO: Lista de Pacientes Minerados com Acesso ao PDF (segunda aba)
     # -------------------------------
-    def create_download_link(pdf_bytes, file_name):
-        try:
-            b64 = base64.b64encode(pdf_bytes).decode()
-        except Exception as e:
-            return "Erro na conversão"
-        return f'<a href="data:application/octet-stream;base64,{b64}" download="{file_name}">Download PDF</a>'
-    
-    df_display = st.session_state["pacientes_minerados_df"].copy()
-    df_display["Acesso PDF"] = df_display.apply(lambda row: create_download_link(row["pdf_bytes"], row["Arquivo"]), axis=1)
-    df_display = df_display.drop(columns=["pdf_bytes", "Arquivo"], errors="ignore")
-    
     with tab2:
         st.markdown("### Lista de Pacientes Minerados com Acesso ao PDF:")
 
-        # Mantém a coluna "Sentenca" com destaque para exibição
-        df_display = st.session_state["pacientes_minerados_df"].copy()
-        df_display["Acesso PDF"] = df_display.apply(
-            lambda row: create_download_link(row["pdf_bytes"], row["Arquivo"]), axis=1
-        )
-        df_display = df_display.drop(columns=["pdf_bytes", "Arquivo"], errors="ignore")
+        # Mantém a coluna "Sentenca" com destaque para exibição; o PDF é baixado abaixo da tabela
+        df_display = st.session_state["pacientes_minerados_df"].drop(columns=["pdf_hash", "Arquivo"], errors="ignore")
         
         # Exibe com destaque na tela (a coluna "Sentenca" ainda contém HTML)
         st.markdown(df_display.to_html(escape=False, index=False), unsafe_allow_html=True)
+        baixar_pdf(st.session_state["pacientes_minerados_df"])
 
         # -------------------------------
         # DOWNLOAD DO ARQUIVO EXCEL (Pacientes Minerados) SEM FORMATAÇÃO
@@ -476,8 +450,8 @@ if st.sidebar.button("Processar"):
         df_export = st.session_state["pacientes_minerados_df"].copy()
         # Remove as tags HTML somente para exportação
         df_export["Sentenca"] = df_export["Sentenca"].apply(remove_html_tags)
-        # Remove as colunas "Arquivo" e "pdf_bytes"
-        df_export = df_export.drop(columns=["Arquivo", "pdf_bytes"], errors="ignore")
+        # Remove as colunas "Arquivo" e "pdf_hash"
+        df_export = df_export.drop(columns=["Arquivo", "pdf_hash"], errors="ignore")
 
 
         towrite = BytesIO()
@@ -537,7 +511,20 @@ if st.sidebar.button("Processar"):
                 st.session_state["pacientes_minerados_df"]["Convenio_pa"]
             )
             st.session_state["pacientes_minerados_df"].drop(columns=["Convenio_pa"], inplace=True)
+        load_resultados().atualizar(st.session_state["pacientes_minerados_df"], ["Convenio"])
 
         # Atualiza a exibição dos dados
-        df_para_exibicao_atend = st.session_state["pacientes_minerados_df"].drop(columns=["pdf_bytes", "Arquivo", "Sentenca"], errors="ignore")
+        df_para_exibicao_atend = st.session_state["pacientes_minerados_df"].drop(columns=["pdf_hash", "Arquivo", "Sentenca"], errors="ignore")
         st.dataframe(df_para_exibicao_atend)
+
+# -------------------------------
+# BUSCA NOS LAUDOS (sempre visível, independente do processamento)
+# -------------------------------
+st.divider()
+busca_laudos()
+acompanhamento_lesoes()
+jobs_mineracao = jobs_sessao()
+if jobs_ativos(jobs_mineracao):
+    acompanhar_processamentos()
+else:
+    processamentos_em_segundo_plano(jobs_mineracao)
@@ -0,0 +1,27 @@
+import os
+
+# -----------------------------
+# Local on-disk storage shared by the dashboards (registries, caches, stores)
+# -----------------------------
+DATA_DIR = os.environ.get(
+    "SLA_DATA_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "sla_data")
+)
+
+
+def data_path(*parts):
+    """
+    Returns a path inside DATA_DIR, creating the parent folder if needed.
+    """
+    path = os.path.join(DATA_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def data_dir(*parts):
+    """
+    Returns a folder inside DATA_DIR, creating it if needed.
+    """
+    path = os.path.join(DATA_DIR, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
@@ -1,16 +1,26 @@
+import mimetypes
 import os
 import re
-import fitz  # PyMuPDF
-import pytesseract
+import time
 from PIL import Image
-import calendar
 import pandas as pd
 import streamlit as st
 from io import BytesIO
-from fuzzywuzzy import fuzz, process
-import zipfile
 import requests  # Para carregar a logo a partir de uma URL
-import base64  # Para download do PDF/Excel
+from job_queue import CANCELLED, DONE, FAILED, FINISHED, JobQueue
+from job_worker import ensure_workers
+from miner_blobs import BlobStore
+from miner_cache import MinerCache
+from miner_correlacao import melhores_correspondencias
+from miner_extraction import EXTENSOES_LAUDO
+from miner_jobs import enfileirar, erro_resumido, jobs_rastreador, salvar_entrada, salvar_zip
+from miner_pool import (
+    contar_documentos_zip, criar_pool, deduplicar_pacientes, iterar_documentos_zip, iterar_resultados,
+    pool_ativo
+)
+from miner_relatorios import contar_pacientes, html_diario, html_mensal
+from miner_resultados import ResultadosStore
+from miner_trackers import RASTREADORES, detectar_nodulos
 
 # -------------------------------
 # FUNÇÃO PARA CARREGAR A LOGO COM CACHE
@@ -53,289 +63,264 @@ if logo is not None:
 st.sidebar.header("Selecione os Arquivos")
 
 # -------------------------------
-# EXPRESSÕES REGULARES GLOBAIS
+# POOL DE EXTRAÇÃO
+# Texto, OCR e detecção rodam em paralelo (miner_pool); o pool é criado uma vez
+# e reaproveitado entre reruns e sessões (e recriado se um processo filho morrer).
 # -------------------------------
-regex_nodulo = re.compile(r"n[oó]dulo[s]?", re.IGNORECASE)
-regex_tamanho = re.compile(r"\b\d+[.,]?\d*\s?(?:mm|cm)\b", re.IGNORECASE)
-regex_nome = re.compile(r"(?i)paciente\s*:\s*(.+)")
-regex_idade = re.compile(r"(?i)idade\s*:\s*(\d+[Aa]?\s*\d*[Mm]?)")
-regex_same = re.compile(r"(?i)same\s*:\s*(\S+)")
-regex_data = re.compile(r"(?i)data\s*do\s*exame\s*:\s*([\d/]+)")
-regex_context = re.compile(r"\b(pulmão|pulmões|lobo|lobos)\b", re.IGNORECASE)
-regex_contorno = re.compile(r"\bcontorno[s]?\b\s+(\w+)", re.IGNORECASE)
-regex_calc = re.compile(r"\b(c[áa]lcificad[o]s?|c[áa]lcic[óo]s?)\b", re.IGNORECASE)
-regex_calc_exceptions = re.compile(r"\b(sem calcifica[cç][ãa]o|não calcificado|parcialmente calcificado)\b", re.IGNORECASE)
-regex_exclude = re.compile(r"\b(tire[oó]ide|f[ií]gado|rins?|ba[çc]o)\b", re.IGNORECASE)
-regex_contorno_keywords = re.compile(r"\b(lobulad[oó]s?|bocelad[oó]s?|irregular[es]?)\b", re.IGNORECASE)
-# Expressões para extração de "Localização" e "Densidade"
-regex_localizacao = re.compile(r"\b(lobo superior|segmento superior)\b", re.IGNORECASE)
-regex_densidade = re.compile(
-    r"\b(s[óo]lido[s]?|semi-?s[óo]lido[s]?|semisolido[s]?|vidro\s*fosco|subs[óo]lido[s]?|partes?\s*moles?)\b",
-    re.IGNORECASE
-)
+@st.cache_resource(show_spinner=False, validate=pool_ativo)
+def load_extraction_pool():
+    return criar_pool()
+
+
+# Cache em disco por SHA-256 do PDF: laudos já minerados não são reabertos
+@st.cache_resource(show_spinner=False)
+def load_miner_cache():
+    return MinerCache()
+
+
+# PDFs com achados ficam em disco; a sessão guarda só o hash de cada um
+@st.cache_resource(show_spinner=False)
+def load_pdf_store():
+    return BlobStore()
+
+
+# Pacientes minerados acumulados em disco: sobrevivem a refresh e a reinícios e
+# são compartilhados entre as sessões
+@st.cache_resource(show_spinner=False)
+def load_resultados():
+    return ResultadosStore(detectar_nodulos.__name__, RASTREADORES["lung"].colunas_saida())
+
+
+# Fila de jobs em segundo plano (job_queue): lotes grandes rodam nos processos do
+# job_worker.py, fora dos reruns da página, e continuam com a aba fechada
+@st.cache_resource(show_spinner=False)
+def load_fila():
+    return JobQueue()
 
 # -------------------------------
-# FUNÇÃO PARA DESTACAR "NÓDULO" EM VERDE
+# FUNÇÕES DE PROCESSAMENTO
+# Os achados aparecem à medida que cada laudo termina e são gravados no armazenamento
+# acumulado a cada atualização da tela; cancelar (ou qualquer rerun no meio do lote)
+# mantém o que já foi processado.
 # -------------------------------
-def highlight_nodulo(sentence):
-    pattern = r"(n[oó]dulo[s]?)"
-    highlighted = re.sub(
-        pattern,
-        r"<span style='background-color: green;'>\1</span>",
-        sentence,
-        flags=re.IGNORECASE
+ATUALIZACAO_SEGUNDOS = 0.5
+
+
+def processar_com_progresso(documentos, total=None):
+    """
+    Processa (nome, bytes) de `documentos` mostrando o progresso, a vazão e os achados
+    parciais. Retorna o DataFrame (deduplicado) dos achados deste processamento.
+    """
+    st.session_state["processamento_em_andamento"] = True
+    # O clique reroda a página, o que interrompe este laço
+    st.button("Cancelar processamento")
+    progresso = st.progress(0.0, text="Iniciando...")
+    tabela = st.empty()
+    registros, pendentes = [], []
+    inicio = ultima_atualizacao = time.perf_counter()
+    concluidos = 0
+
+    def atualizar():
+        if pendentes:
+            load_resultados().adicionar(deduplicar_pacientes(pd.DataFrame(pendentes)))
+            registros.extend(pendentes)
+            pendentes.clear()
+        decorrido = max(time.perf_counter() - inicio, 1e-6)
+        progresso.progress(
+            min(concluidos / total, 1.0) if total else 0.0,
+            text=f"{concluidos}{f'/{total}' if total else ''} laudo(s) · "
+                 f"{concluidos / decorrido:.1f} laudos/s · {len(registros)} achado(s)"
+        )
+        if registros:
+            tabela.dataframe(pd.DataFrame(registros).drop(columns=["pdf_hash", "Sentenca"], errors="ignore"))
+
+    fluxo = iterar_resultados(
+        documentos, [detectar_nodulos], load_extraction_pool(), load_miner_cache(), load_pdf_store()
     )
-    return highlighted
+    for _, (registros_laudo,) in fluxo:
+        concluidos += 1
+        pendentes.extend(registros_laudo)
+        if time.perf_counter() - ultima_atualizacao >= ATUALIZACAO_SEGUNDOS:
+            atualizar()
+            ultima_atualizacao = time.perf_counter()
+    atualizar()
+    st.session_state["processamento_em_andamento"] = False
+    novos_df = pd.DataFrame(registros)
+    return deduplicar_pacientes(novos_df) if not novos_df.empty else novos_df
+
+
+def processar_pdfs_streamlit(pdf_files):
+    """
+    Processa os laudos carregados via file uploader.
+    Retorna um DataFrame com os pacientes minerados; cada registro inclui o nome do arquivo,
+    o hash do laudo (ver miner_blobs) e a sentença destacada com a palavra-chave.
+    """
+    # getbuffer(): memoryview do upload, sem copiar os bytes
+    documentos = [(uploaded_file.name, uploaded_file.getbuffer()) for uploaded_file in pdf_files]
+    return processar_com_progresso(documentos, len(documentos))
+
+
+def processar_pdfs_from_zip(zip_file):
+    """
+    Processa os laudos contidos em um arquivo ZIP e retorna o DataFrame de pacientes minerados.
+    """
+    # Um membro do ZIP por vez; a memória não cresce com o tamanho do arquivo
+    return processar_com_progresso(iterar_documentos_zip(zip_file), contar_documentos_zip(zip_file))
 
 # -------------------------------
-# FUNÇÃO PARA DESTACAR A PALAVRA EXTRAÍDA APÓS "CONTORNO(S)" EM VERDE
+# DOWNLOAD DO PDF SOB DEMANDA
+# O PDF só é lido do disco quando o botão é clicado; o fragmento evita
+# rerodar a página inteira ao trocar o laudo selecionado.
 # -------------------------------
-def highlight_contorno(sentence):
-    def repl(match):
-        return f"{match.group(1)} <span style='background-color: green;'>{match.group(2)}</span>"
-    return re.sub(r"(\bcontorno[s]?\b)\s+(\w+)", repl, sentence, flags=re.IGNORECASE)
+@st.fragment
+def baixar_pdf(pacientes_df):
+    registros = pacientes_df.dropna(subset=["pdf_hash"]).reset_index(drop=True)
+    if registros.empty:
+        return
+    indice = st.selectbox(
+        "Selecione o laudo para download:",
+        registros.index,
+        format_func=lambda i: f"{registros.at[i, 'Paciente']} - {registros.at[i, 'Data do Exame']} ({registros.at[i, 'Arquivo']})"
+    )
+    pdf_hash = registros.at[indice, "pdf_hash"]
+    st.download_button(
+        label="Download do laudo",
+        data=lambda: load_pdf_store().ler(pdf_hash),
+        file_name=registros.at[indice, "Arquivo"],
+        mime=mimetypes.guess_type(str(registros.at[indice, "Arquivo"]))[0] or "application/octet-stream",
+        on_click="ignore"
+    )
 
 # -------------------------------
-# FUNÇÕES DE PROCESSAMENTO
+# BUSCA NOS LAUDOS
+# Consulta o índice FTS5 do cache de extração (todos os laudos já minerados),
+# sem reenviar os PDFs. Fragmento: digitar a busca não reroda a página.
 # -------------------------------
-def extrair_texto(pdf_input):
-    texto_completo = ""
-    if isinstance(pdf_input, str):
-        doc = fitz.open(pdf_input)
-    elif hasattr(pdf_input, "read"):
-        pdf_input.seek(0)
-        pdf_bytes = pdf_input.read()
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    else:
-        doc = fitz.open(pdf_input)
-    for page_num in range(len(doc)):
-        texto = doc[page_num].get_text("text")
-        if not texto.strip():
-            pix = doc[page_num].get_pixmap()
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            texto = pytesseract.image_to_string(img, lang="por")
-        texto_completo += texto + "\n"
-    doc.close()
-    return texto_completo
-
-def extrair_informacoes(texto_completo):
-    dados_cabecalho = {}
-    dados_cabecalho["Paciente"] = regex_nome.search(texto_completo).group(1).strip() if regex_nome.search(texto_completo) else "N/D"
-    dados_cabecalho["Idade"] = regex_idade.search(texto_completo).group(1).strip() if regex_idade.search(texto_completo) else "N/D"
-    dados_cabecalho["Same"] = regex_same.search(texto_completo).group(1).strip() if regex_same.search(texto_completo) else "N/D"
-    dados_cabecalho["Data do Exame"] = regex_data.search(texto_completo).group(1).strip() if regex_data.search(texto_completo) else "N/D"
-    return dados_cabecalho
+@st.fragment
+def busca_laudos():
+    st.markdown("### Busca nos laudos já minerados")
+    col_consulta, col_medida = st.columns([3, 1])
+    consulta = col_consulta.text_input(
+        "Termos da busca",
+        placeholder='ex.: "nódulo adrenal", calc*, nódulo NOT pulmão',
+        help="Sem diferenciar acentos/maiúsculas. Aspas: frase exata; *: prefixo; NOT: exclui."
+    )
+    medida_min = col_medida.number_input("Medida mínima (mm)", min_value=0.0, value=0.0, step=1.0)
+    if not consulta.strip():
+        return
+    try:
+        resultados = load_miner_cache().buscar_sentencas(consulta, medida_min or None)
+    except ValueError as e:
+        st.error(str(e))
+        return
+    st.caption(f"{len(resultados)} sentença(s) em {resultados['sha256'].nunique()} laudo(s)")
+    st.dataframe(resultados.drop(columns=["sha256"]), hide_index=True)
 
-def processar_pdfs_streamlit(pdf_files):
-    relatorio_mensal = {}
-    lista_nodulos = []
-    for uploaded_file in pdf_files:
-        file_name = uploaded_file.name
-        pdf_bytes = uploaded_file.read()
-        pdf_stream = BytesIO(pdf_bytes)
-        texto_completo = extrair_texto(pdf_stream)
-        cabecalho = extrair_informacoes(texto_completo)
-        sentencas = re.split(r'(?<=[.!?])\s+', texto_completo)
-        ocorrencias_validas = []
-        for sentenca in sentencas:
-            # Seleciona sentenças que contenham "nódulo" e contexto obrigatório
-            if regex_nodulo.search(sentenca) and regex_context.search(sentenca):
-                if re.search(r"\bsem\b", sentenca, re.IGNORECASE):
-                    continue
-                if re.search(r"\b(não\s+há|não\s+apresenta|não\s+possui|nenhum)\b", sentenca, re.IGNORECASE):
-                    continue
-                if regex_exclude.search(sentenca):
-                    continue
-                if regex_calc.search(sentenca) and not regex_calc_exceptions.search(sentenca):
-                    continue
-                # Extrai contornos: via "contorno(s)" ou pelas palavras-chave
-                contorno_match = regex_contorno.search(sentenca)
-                if contorno_match:
-                    contorno_word = contorno_match.group(1)
-                    sentenca = highlight_contorno(sentenca)
-                else:
-                    keyword_match = regex_contorno_keywords.search(sentenca)
-                    if keyword_match:
-                        contorno_word = keyword_match.group(0)
-                    else:
-                        contorno_word = "Não informado"
-                # Extrai localização, se houver
-                match_localizacao = regex_localizacao.search(sentenca)
-                if match_localizacao:
-                    localizacao = match_localizacao.group(0)
-                else:
-                    localizacao = "Não informado"
-                # Extrai densidade, se presente
-                match_densidade = regex_densidade.search(sentenca)
-                if match_densidade:
-                    densidade = match_densidade.group(0)
-                else:
-                    densidade = "Não informado"
-                # Destaca "nódulo" em verde
-                sentenca_destacada = highlight_nodulo(sentenca)
-                tamanho_match = re.search(regex_tamanho, sentenca)
-                tamanho_valor = tamanho_match.group(0) if tamanho_match else "Não informado"
-                ocorrencias_validas.append((tamanho_valor, sentenca_destacada, contorno_word, localizacao, densidade))
-        
-        if ocorrencias_validas:
-            data_exame = cabecalho["Data do Exame"]
-            partes_data = data_exame.split("/")
-            if len(partes_data) == 3:
-                try:
-                    dia, mes, ano = partes_data
-                    mes = int(mes)
-                    ano = int(ano)
-                except ValueError:
-                    mes, ano = 0, 0
-            else:
-                mes, ano = 0, 0
-            key = (ano, mes)
-            if key not in relatorio_mensal:
-                relatorio_mensal[key] = set()
-            relatorio_mensal[key].add(cabecalho["Paciente"])
-            for tamanho, sentenca_destacada, contorno_word, localizacao, densidade in ocorrencias_validas:
-                record = {**cabecalho,
-                          "Tamanho": tamanho,
-                          "Sentenca": sentenca_destacada,
-                          "Arquivo": file_name,
-                          "pdf_bytes": pdf_bytes,
-                          "Contornos": contorno_word,
-                          "Localização": localizacao,
-                          "Densidade": densidade,
-                          "Convenio": ""}  # Inicialmente vazio
-                lista_nodulos.append(record)
-    for key in relatorio_mensal:
-        relatorio_mensal[key] = len(relatorio_mensal[key])
-    pacientes_minerados_df = pd.DataFrame(lista_nodulos)
-    if not pacientes_minerados_df.empty:
-        pacientes_minerados_df['has_measure'] = pacientes_minerados_df['Tamanho'].apply(
-            lambda x: 0 if x.strip().lower() == "não informado" else 1
-        )
-        pacientes_minerados_df = pacientes_minerados_df.sort_values('has_measure', ascending=False)
-        pacientes_minerados_df = pacientes_minerados_df.drop_duplicates(subset=['Paciente', 'Same'], keep='first')
-        pacientes_minerados_df.drop(columns=['has_measure'], inplace=True)
-    return relatorio_mensal, lista_nodulos, pacientes_minerados_df
+# -------------------------------
+# ACOMPANHAMENTO POR PACIENTE
+# Consulta o índice longitudinal do cache (achados de todos os laudos já minerados,
+# por SAME, com a medida em mm e a data do exame), sem reprocessar os PDFs.
+# -------------------------------
+@st.fragment
+def acompanhamento_lesoes():
+    st.markdown("### Acompanhamento de nódulos por paciente")
+    cache = load_miner_cache()
+    rastreador = detectar_nodulos.__name__
+    aba_crescimento, aba_persistentes = st.tabs(["Em crescimento", "Persistentes"])
+    with aba_crescimento:
+        crescimento = st.number_input("Crescimento maior que (mm)", min_value=0.0, value=2.0, step=0.5)
+        em_crescimento = cache.lesoes_em_crescimento(rastreador, crescimento)
+        st.caption(f"{len(em_crescimento)} paciente(s)")
+        st.dataframe(em_crescimento, hide_index=True)
+    with aba_persistentes:
+        col_medida, col_meses = st.columns(2)
+        medida = col_medida.number_input("Maior que (mm)", min_value=0.0, value=5.0, step=1.0)
+        meses = col_meses.number_input("Presente por pelo menos (meses)", min_value=1, value=6, step=1)
+        persistentes = cache.lesoes_persistentes(rastreador, medida, meses)
+        st.caption(f"{len(persistentes)} paciente(s)")
+        st.dataframe(persistentes, hide_index=True)
+    same = st.text_input("Histórico do paciente (SAME)")
+    if same.strip():
+        historico = cache.historico_lesoes(same.strip(), rastreador)
+        st.dataframe(historico.drop(columns=["sha256"]), hide_index=True)
 
-def processar_pdfs_from_zip(zip_file):
-    relatorio_mensal = {}
-    lista_nodulos = []
-    zip_data = BytesIO(zip_file.read())
-    with zipfile.ZipFile(zip_data, "r") as z:
-        pdf_names = [name for name in z.namelist() if name.lower().endswith(".pdf")]
-        for pdf_name in pdf_names:
-            with z.open(pdf_name) as pdf_file:
-                pdf_bytes = pdf_file.read()
-                pdf_stream = BytesIO(pdf_bytes)
-                texto_completo = extrair_texto(pdf_stream)
-                cabecalho = extrair_informacoes(texto_completo)
-                sentencas = re.split(r'(?<=[.!?])\s+', texto_completo)
-                ocorrencias_validas = []
-                for sentenca in sentencas:
-                    if regex_nodulo.search(sentenca) and regex_context.search(sentenca):
-                        if re.search(r"\bsem\b", sentenca, re.IGNORECASE):
-                            continue
-                        if re.search(r"\b(não\s+há|não\s+apresenta|não\s+possui|nenhum)\b", sentenca, re.IGNORECASE):
-                            continue
-                        if regex_exclude.search(sentenca):
-                            continue
-                        if regex_calc.search(sentenca) and not regex_calc_exceptions.search(sentenca):
-                            continue
-                        contorno_match = regex_contorno.search(sentenca)
-                        if contorno_match:
-                            contorno_word = contorno_match.group(1)
-                            sentenca = highlight_contorno(sentenca)
-                        else:
-                            keyword_match = regex_contorno_keywords.search(sentenca)
-                            if keyword_match:
-                                contorno_word = keyword_match.group(0)
-                            else:
-                                contorno_word = "Não informado"
-                        match_localizacao = regex_localizacao.search(sentenca)
-                        if match_localizacao:
-                            localizacao = match_localizacao.group(0)
-                        else:
-                            localizacao = "Não informado"
-                        match_densidade = regex_densidade.search(sentenca)
-                        if match_densidade:
-                            densidade = match_densidade.group(0)
-                        else:
-                            densidade = "Não informado"
-                        sentenca_destacada = highlight_nodulo(sentenca)
-                        tamanho_match = re.search(regex_tamanho, sentenca)
-                        tamanho_valor = tamanho_match.group(0) if tamanho_match else "Não informado"
-                        ocorrencias_validas.append((tamanho_valor, sentenca_destacada, contorno_word, localizacao, densidade))
-                if ocorrencias_validas:
-                    data_exame = cabecalho["Data do Exame"]
-                    partes_data = data_exame.split("/")
-                    if len(partes_data) == 3:
-                        try:
-                            dia, mes, ano = partes_data
-                            mes = int(mes)
-                            ano = int(ano)
-                        except ValueError:
-                            mes, ano = 0, 0
-                    else:
-                        mes, ano = 0, 0
-                    key = (ano, mes)
-                    if key not in relatorio_mensal:
-                        relatorio_mensal[key] = set()
-                    relatorio_mensal[key].add(cabecalho["Paciente"])
-                    for tamanho, sentenca_destacada, contorno_word, localizacao, densidade in ocorrencias_validas:
-                        record = {**cabecalho,
-                                  "Tamanho": tamanho,
-                                  "Sentenca": sentenca_destacada,
-                                  "Arquivo": pdf_name,
-                                  "pdf_bytes": pdf_bytes,
-                                  "Contornos": contorno_word,
-                                  "Localização": localizacao,
-                                  "Densidade": densidade,
-                                  "Convenio": ""}
-                        lista_nodulos.append(record)
-    for key in relatorio_mensal:
-        relatorio_mensal[key] = len(relatorio_mensal[key])
-    pacientes_minerados_df = pd.DataFrame(lista_nodulos)
-    if not pacientes_minerados_df.empty:
-        pacientes_minerados_df['has_measure'] = pacientes_minerados_df['Tamanho'].apply(
-            lambda x: 0 if x.strip().lower() == "não informado" else 1
-        )
-        pacientes_minerados_df = pacientes_minerados_df.sort_values('has_measure', ascending=False)
-        pacientes_minerados_df = pacientes_minerados_df.drop_duplicates(subset=['Paciente', 'Same'], keep='first')
-        pacientes_minerados_df.drop(columns=['has_measure'], inplace=True)
-        pacientes_minerados_df = pacientes_minerados_df.drop(columns=["Arquivo", "pdf_bytes"], errors="ignore")
-    return relatorio_mensal, lista_nodulos, pacientes_minerados_df
+# -------------------------------
+# PROCESSAMENTOS EM SEGUNDO PLANO
+# Lotes enfileirados (miner_jobs) gravam os achados no armazenamento acumulado.
+# Só os lotes desta sessão aparecem, e o fragmento consulta a fila a cada poucos
+# segundos (sem rerodar a página) apenas enquanto algum deles está na fila ou rodando.
+# -------------------------------
+ATUALIZACAO_FILA_SEGUNDOS = 3
+
+
+def jobs_sessao():
+    """
+    Os jobs de mineração enfileirados nesta sessão do navegador, mais recentes primeiro.
+    """
+    ids = st.session_state.get("jobs_mineracao", [])
+    return jobs_rastreador(load_fila(), "lung", ids=ids) if ids else []
 
+
+def jobs_ativos(jobs):
+    return any(job["status"] not in FINISHED for job in jobs)
+
+
+def processamentos_em_segundo_plano(jobs):
+    if not jobs:
+        return
+    st.markdown("### Processamentos em segundo plano")
+    for job in jobs:
+        rotulo = f"#{job['id']} {job['label']}"
+        if job["status"] == DONE:
+            st.caption(
+                f"{rotulo}: concluído · {job['result']['laudos']} laudo(s) · "
+                f"{job['result']['achados']['lung']} achado(s)"
+            )
+        elif job["status"] == FAILED:
+            st.error(f"{rotulo}: falhou ({erro_resumido(job)})")
+        elif job["status"] == CANCELLED:
+            st.caption(f"{rotulo}: cancelado; os achados dos laudos já processados foram mantidos.")
+        else:
+            st.progress(job["progress"], text=f"{rotulo}: {job['message'] or 'na fila'}")
+            if st.button("Cancelar", key=f"cancelar_job_{job['id']}"):
+                load_fila().cancel(job["id"])
+    if st.button("Mostrar pacientes acumulados"):
+        st.session_state["pacientes_minerados_df"] = load_resultados().carregar()
+        st.session_state["lista_nodulos"] = st.session_state["pacientes_minerados_df"].to_dict(orient="records")
+        st.session_state["mostrar_pacientes"] = True
+        st.rerun()
+
+
+@st.fragment(run_every=ATUALIZACAO_FILA_SEGUNDOS)
+def acompanhar_processamentos():
+    jobs = jobs_sessao()
+    processamentos_em_segundo_plano(jobs)
+    if not jobs_ativos(jobs):
+        # Reroda a página uma vez: os lotes concluídos passam à lista fixa e a consulta para
+        st.rerun()
+
+# Resultado em cache por conteúdo dos dois DataFrames (pacientes minerados, planilha do PA)
+@st.cache_data(show_spinner=False, max_entries=16)
 def correlacionar_pacientes_fuzzy(pacientes_df, pa_df, threshold=70):
-    # Ajusta os nomes para comparação
-    pacientes_df['Paciente_lower'] = pacientes_df['Paciente'].fillna("").str.lower()
-    pa_df['Paciente_lower'] = pa_df['Paciente'].fillna("").str.lower()
-    internados_list = pa_df['Paciente_lower'].tolist()
-    matched_indices = []
-    convenios = []
-    for idx, row in pacientes_df.iterrows():
-        nome = row['Paciente_lower']
-        if not nome:
-            continue
-        best_match, score = process.extractOne(nome, internados_list, scorer=fuzz.ratio)
-        if score >= threshold:
-            matched_indices.append(idx)
-            match_idx = pa_df[pa_df['Paciente_lower'] == best_match].index[0]
-            convenio_value = pa_df.loc[match_idx, 'Convenio']
-            convenios.append(convenio_value)
-    correlated_df = pacientes_df.loc[matched_indices].copy()
-    correlated_df['Convenio'] = convenios
-    correlated_df.drop(columns=['Paciente_lower'], inplace=True)
+    posicoes, _ = melhores_correspondencias(pacientes_df['Paciente'].fillna(""), pa_df['Paciente'].fillna(""), threshold)
+    encontrados = posicoes >= 0
+    correlated_df = pacientes_df[encontrados].copy()
+    correlated_df['Convenio'] = pa_df['Convenio'].to_numpy()[posicoes[encontrados]]
     return correlated_df
 
 # -------------------------------
 # ARMAZENAMENTO EM CACHE (st.session_state)
 # -------------------------------
 if "pacientes_minerados_df" not in st.session_state:
-    st.session_state["pacientes_minerados_df"] = pd.DataFrame(
-        columns=["Paciente", "Idade", "Same", "Data do Exame", "Tamanho", "Sentenca",
-                 "pdf_bytes", "Contornos", "Localização", "Densidade", "Convenio"]
-    )
-    st.session_state["relatorio_mensal"] = {}
-    st.session_state["lista_nodulos"] = []
+    st.session_state["pacientes_minerados_df"] = load_resultados().carregar()
+    st.session_state["lista_nodulos"] = st.session_state["pacientes_minerados_df"].to_dict(orient="records")
+
+# Processamento interrompido (cancelado, ou a página rerodou no meio do lote): os achados
+# dos laudos já concluídos estão no armazenamento acumulado
+if st.session_state.pop("processamento_em_andamento", False):
+    st.session_state["pacientes_minerados_df"] = load_resultados().carregar()
+    st.session_state["lista_nodulos"] = st.session_state["pacientes_minerados_df"].to_dict(orient="records")
+    st.warning("Processamento interrompido: os achados dos laudos já processados foram mantidos.")
 
 # -------------------------------
 # INTERFACE STREAMLIT (SIDEBAR)
@@ -344,9 +329,12 @@ upload_method = st.sidebar.radio("Selecione o método de upload:",
                                  ("Upload de PDFs", "Upload de ZIP contendo PDFs"))
 
 if upload_method == "Upload de PDFs":
-    pdf_files = st.sidebar.file_uploader("Selecione os arquivos PDF", type="pdf", accept_multiple_files=True)
+    pdf_files = st.sidebar.file_uploader(
+        "Selecione os laudos (PDF, ou exportação do RIS em TXT, HTML ou DOCX)",
+        type=list(EXTENSOES_LAUDO), accept_multiple_files=True
+    )
 else:
-    zip_file = st.sidebar.file_uploader("Selecione o arquivo ZIP contendo os PDFs", type="zip")
+    zip_file = st.sidebar.file_uploader("Selecione o arquivo ZIP contendo os laudos", type="zip")
 
 # Uploader para o arquivo de Atendimento PA
 atendimento_pa_file = st.sidebar.file_uploader("Atendimento PA (arquivo xlsx)", type="xlsx")
@@ -354,47 +342,44 @@ atendimento_pa_file = st.sidebar.file_uploader("Atendimento PA (arquivo xlsx)",
 # -------------------------------
 # BOTÃO DE PROCESSAMENTO
 # -------------------------------
-if st.sidebar.button("Processar"):
+if st.sidebar.button("Limpar pacientes acumulados"):
+    load_resultados().limpar()
+    st.session_state["pacientes_minerados_df"] = load_resultados().carregar()
+    st.session_state["lista_nodulos"] = []
+
+if st.sidebar.button("Processar em segundo plano"):
     if upload_method == "Upload de PDFs" and pdf_files:
-        with st.spinner("Processando PDFs..."):
-            new_relatorio, new_lista_nodulos, new_df = processar_pdfs_streamlit(pdf_files)
+        entrada = salvar_entrada((uploaded_file.name, uploaded_file.getbuffer()) for uploaded_file in pdf_files)
+        rotulo = f"{len(pdf_files)} arquivo(s)"
+    elif upload_method == "Upload de ZIP contendo PDFs" and zip_file:
+        entrada, rotulo = salvar_zip(zip_file), zip_file.name
+    else:
+        entrada = None
+        st.sidebar.error("Por favor, selecione os arquivos PDF ou o arquivo ZIP.")
+    if entrada:
+        st.session_state.setdefault("jobs_mineracao", []).append(enfileirar(load_fila(), ["lung"], entrada, rotulo))
+        ensure_workers(load_fila())
+        st.sidebar.success("Processamento enfileirado; o andamento aparece no fim da página.")
+
+processar = st.sidebar.button("Processar")
+# "Mostrar pacientes acumulados" após um processamento em segundo plano: só exibe
+mostrar_pacientes = st.session_state.pop("mostrar_pacientes", False)
+if processar or mostrar_pacientes:
+    if mostrar_pacientes:
+        new_df = pd.DataFrame()
+    elif upload_method == "Upload de PDFs" and pdf_files:
+        new_df = processar_pdfs_streamlit(pdf_files)
         st.success("Processamento concluído!")
-    elif upload_method == "Upload de ZIP" and zip_file:
-        with st.spinner("Processando arquivo ZIP..."):
-            new_relatorio, new_lista_nodulos, new_df = processar_pdfs_from_zip(zip_file)
+    elif upload_method == "Upload de ZIP contendo PDFs" and zip_file:
+        new_df = processar_pdfs_from_zip(zip_file)
         st.success("Processamento concluído!")
     else:
         st.error("Por favor, selecione os arquivos PDF ou o arquivo ZIP.")
-        new_relatorio, new_lista_nodulos, new_df = {}, [], pd.DataFrame()
+        new_df = pd.DataFrame()
 
     if not new_df.empty:
-        combined_df = pd.concat([st.session_state["pacientes_minerados_df"], new_df], ignore_index=True)
-        combined_df['has_measure'] = combined_df['Tamanho'].apply(lambda x: 0 if x.strip().lower() == "não informado" else 1)
-        combined_df = combined_df.sort_values('has_measure', ascending=False)
-        combined_df = combined_df.drop_duplicates(subset=['Paciente', 'Same'], keep='first')
-        combined_df.drop(columns=['has_measure'], inplace=True)
+        combined_df = load_resultados().carregar()
         st.session_state["pacientes_minerados_df"] = combined_df
-
-        combined_relatorio = {}
-        for idx, row in combined_df.iterrows():
-            data_exame = row["Data do Exame"]
-            partes_data = data_exame.split("/")
-            if len(partes_data) == 3:
-                try:
-                    dia, mes, ano = partes_data
-                    mes = int(mes)
-                    ano = int(ano)
-                except ValueError:
-                    mes, ano = 0, 0
-            else:
-                mes, ano = 0, 0
-            key = (ano, mes)
-            if key not in combined_relatorio:
-                combined_relatorio[key] = set()
-            combined_relatorio[key].add(row["Paciente"])
-        for key in combined_relatorio:
-            combined_relatorio[key] = len(combined_relatorio[key])
-        st.session_state["relatorio_mensal"] = combined_relatorio
         st.session_state["lista_nodulos"] = combined_df.to_dict(orient="records")
 
     # Se houver arquivo de Atendimento PA, correlacione e extraia "Convenio"
@@ -402,68 +387,23 @@ if st.sidebar.button("Processar"):
         pa_df = pd.read_excel(atendimento_pa_file)
         # Certifique-se de que a planilha de PA contenha as colunas "Paciente" e "Convenio"
         correlated_pa_df = correlacionar_pacientes_fuzzy(
-            st.session_state["pacientes_minerados_df"].copy(), pa_df, threshold=70
+            st.session_state["pacientes_minerados_df"], pa_df, threshold=70
         )
-        # Atualize o DataFrame com o Convenio encontrado
-        for idx, row in correlated_pa_df.iterrows():
-            st.session_state["pacientes_minerados_df"].loc[
-                st.session_state["pacientes_minerados_df"]['Paciente'] == row['Paciente'], 'Convenio'
-            ] = row['Convenio']
+        # Atualize o DataFrame com o Convenio encontrado (a última correspondência de cada nome prevalece)
+        convenio_por_paciente = dict(zip(correlated_pa_df['Paciente'], correlated_pa_df['Convenio']))
+        pacientes = st.session_state["pacientes_minerados_df"]['Paciente']
+        com_convenio = pacientes.isin(list(convenio_por_paciente))
+        st.session_state["pacientes_minerados_df"].loc[com_convenio, 'Convenio'] = pacientes[com_convenio].map(convenio_por_paciente)
+        load_resultados().atualizar(st.session_state["pacientes_minerados_df"][com_convenio], ["Convenio"])
         st.success("Correlação com Atendimento PA realizada com sucesso!")
 
     # Montagem do relatório e das abas
-    report_md = "Pacientes encontrados com nódulos por mês:<br>"
-    for key in sorted(st.session_state["relatorio_mensal"].keys(), key=lambda x: (x[0], x[1]) if isinstance(x, tuple) and len(x)==2 else (0,0)):
-        ano, mes = key if isinstance(key, tuple) and len(key)==2 else (0, 0)
-        nome_mes = calendar.month_name[mes] if 1 <= mes <= 12 else "Desconhecido"
-        report_md += f"- <span style='color: green; font-size: 20px;'>{nome_mes}/{ano}</span>: {st.session_state['relatorio_mensal'].get((ano, mes), 0)} paciente(s)<br>"
-    report_md += "<br>Dados dos pacientes minerados:<br>"
+    relatorio_mensal, relatorio_diario = contar_pacientes(st.session_state["pacientes_minerados_df"])
+    report_md = html_mensal(relatorio_mensal, "Pacientes encontrados com nódulos por mês:<br>", "green")
     
-    df_para_exibicao = st.session_state["pacientes_minerados_df"].drop(columns=["pdf_bytes", "Sentenca"], errors="ignore")
+    df_para_exibicao = st.session_state["pacientes_minerados_df"].drop(columns=["pdf_hash", "Sentenca"], errors="ignore")
     
-    relatorio_diario = {}
-    for idx, row in st.session_state["pacientes_minerados_df"].iterrows():
-        data = row["Data do Exame"]
-        partes = data.split("/")
-        if len(partes) == 3:
-            dia = partes[0].zfill(2)
-            try:
-                mes = int(partes[1])
-            except:
-                mes = 0
-            ano = partes[2]
-            key = (ano, mes, dia)
-            if key not in relatorio_diario:
-                relatorio_diario[key] = set()
-            relatorio_diario[key].add(row["Paciente"])
-    
-    grouped_by_month = {}
-    for (ano, mes, dia), pacientes in relatorio_diario.items():
-        month_key = (ano, mes)
-        if month_key not in grouped_by_month:
-            grouped_by_month[month_key] = {}
-        grouped_by_month[month_key][dia] = len(pacientes)
-    
-    daily_report_md = "<h3>Pacientes minerados por dia</h3>"
-    for (ano, mes) in sorted(grouped_by_month.keys(), key=lambda x: (x[0], x[1])):
-        nome_mes = calendar.month_name[mes] if 1 <= mes <= 12 else "Desconhecido"
-        daily_report_md += f"<h4 style='color: cyan;'>{nome_mes}/{ano}</h4>"
-        daily_report_md += (
-            "<table style='width: 50%; border-collapse: collapse;'>"
-            "<tr>"
-            "<th style='border: 1px solid #ffffff; padding: 4px;'>Dia</th>"
-            "<th style='border: 1px solid #ffffff; padding: 4px;'>Pacientes</th>"
-            "</tr>"
-        )
-        for dia in sorted(grouped_by_month[(ano, mes)].keys()):
-            count = grouped_by_month[(ano, mes)][dia]
-            daily_report_md += (
-                f"<tr>"
-                f"<td style='border: 1px solid #ffffff; padding: 4px;'>{dia}</td>"
-                f"<td style='border: 1px solid #ffffff; padding: 4px;'>{count}</td>"
-                f"</tr>"
-            )
-        daily_report_md += "</table><br>"
+    daily_report_md = html_diario(relatorio_diario)
     
     tab1, tab2 = st.tabs(["Relatório", "Lista de Pacientes Minerados com Acesso ao PDF"])
     
@@ -472,20 +412,12 @@ if st.sidebar.button("Processar"):
         st.dataframe(df_para_exibicao)
         st.markdown(daily_report_md, unsafe_allow_html=True)
     
-    def create_download_link(pdf_bytes, file_name):
-        try:
-            b64 = base64.b64encode(pdf_bytes).decode()
-        except Exception as e:
-            return "Erro na conversão"
-        return f'<a href="data:application/octet-stream;base64,{b64}" download="{file_name}">Download PDF</a>'
-    
-    df_display = st.session_state["pacientes_minerados_df"].copy()
-    df_display["Acesso PDF"] = df_display.apply(lambda row: create_download_link(row["pdf_bytes"], row["Arquivo"]), axis=1)
-    df_display = df_display.drop(columns=["pdf_bytes"], errors="ignore")
+    df_display = st.session_state["pacientes_minerados_df"].drop(columns=["pdf_hash"], errors="ignore")
     
     with tab2:
         st.markdown("### Lista de Pacientes Minerados com Acesso ao PDF:")
         st.markdown(df_display.to_html(escape=False, index=False), unsafe_allow_html=True)
+        baixar_pdf(st.session_state["pacientes_minerados_df"])
     
     towrite = BytesIO()
     st.session_state["pacientes_minerados_df"].to_excel(towrite, index=False, engine='openpyxl')
@@ -499,11 +431,8 @@ if st.sidebar.button("Processar"):
     
     if atendimento_pa_file:
         st.markdown("### Atendimento PA Correlacionado:")
-        pa_df = pd.read_excel(atendimento_pa_file)
-        correlated_pa_df = correlacionar_pacientes_fuzzy(
-            st.session_state["pacientes_minerados_df"].copy(), pa_df, threshold=70
-        )
-        df_para_exibicao2 = correlated_pa_df.drop(columns=["Tamanho","pdf_bytes", "Sentenca", "Contornos", "Densidade", "Localização"], errors="ignore")
+        # Reaproveita a correlação feita acima (mesmos pacientes e mesma planilha)
+        df_para_exibicao2 = correlated_pa_df.drop(columns=["Tamanho","pdf_hash", "Sentenca", "Contornos", "Densidade", "Localização"], errors="ignore")
         st.dataframe(df_para_exibicao2)
         towrite_corr = BytesIO()
         correlated_pa_df.to_excel(towrite_corr, index=False, engine='openpyxl')
@@ -514,3 +443,15 @@ if st.sidebar.button("Processar"):
             file_name="pacientes_atendimento_pa_correlacionado.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
+
+# -------------------------------
+# BUSCA NOS LAUDOS (sempre visível, independente do processamento)
+# -------------------------------
+st.divider()
+busca_laudos()
+acompanhamento_lesoes()
+jobs_mineracao = jobs_sessao()
+if jobs_ativos(jobs_mineracao):
+    acompanhar_processamentos()
+else:
+    processamentos_em_segundo_plano(jobs_mineracao)
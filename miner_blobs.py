@@ -0,0 +1,37 @@
+import os
+import tempfile
+
+from local_store import data_dir
+
+# -------------------------------
+# Armazenamento em disco dos laudos de origem, endereçado pelo SHA-256 dos bytes.
+# Os registros minerados guardam só o hash ("pdf_hash"); o arquivo é lido do disco
+# quando o usuário pede o download. Exportações em TXT/HTML/DOCX ficam no mesmo
+# caminho ".pdf": o nome e o tipo do download vêm da coluna "Arquivo".
+# -------------------------------
+BLOBS_DIR = data_dir("miner_pdfs")
+
+
+class BlobStore:
+    def __init__(self, raiz=BLOBS_DIR):
+        self.raiz = raiz
+
+    def caminho(self, pdf_hash):
+        # Dois níveis de pasta para não acumular milhares de arquivos em uma só
+        return os.path.join(self.raiz, pdf_hash[:2], pdf_hash + ".pdf")
+
+    def guardar(self, pdf_hash, pdf_bytes):
+        """
+        Grava o PDF se ainda não existir (conteúdo igual, hash igual).
+        """
+        caminho = self.caminho(pdf_hash)
+        if os.path.exists(caminho):
+            return
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(caminho), suffix=".tmp", delete=False) as tmp:
+            tmp.write(pdf_bytes)
+        os.replace(tmp.name, caminho)
+
+    def ler(self, pdf_hash):
+        with open(self.caminho(pdf_hash), "rb") as f:
+            return f.read()
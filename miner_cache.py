@@ -0,0 +1,352 @@
+import json
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+from local_store import data_path
+from miner_extraction import spans_sentencas
+from miner_trackers import maior_tamanho_mm, tamanho_mm
+
+# -------------------------------
+# Cache de extração endereçado por conteúdo (SHA-256 dos bytes do PDF).
+# Guarda o texto extraído, o cabeçalho e os achados de cada rastreador;
+# os achados valem só para a assinatura das regras que os gerou.
+# O OCR também é guardado por página (hash da imagem binarizada, ver miner_ocr).
+# Cada texto novo é indexado por sentença em um índice FTS5 (ver buscar_sentencas):
+# o índice não guarda o texto, só o intervalo da sentença em documentos.texto e a
+# maior medida citada nela, em mm.
+# Os achados também alimentam um índice longitudinal por paciente (SAME): cada achado
+# com a medida em mm e a data do exame (lesoes) e um resumo por paciente e rastreador
+# (evolucao_lesoes), atualizado só para os pacientes de cada lote salvo.
+# -------------------------------
+CACHE_PATH = data_path("miner_cache.sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documentos (
+    sha256 TEXT PRIMARY KEY,
+    texto TEXT NOT NULL,
+    paciente TEXT,
+    idade TEXT,
+    same TEXT,
+    data_exame TEXT
+);
+CREATE TABLE IF NOT EXISTS achados (
+    sha256 TEXT NOT NULL,
+    rastreador TEXT NOT NULL,
+    assinatura TEXT NOT NULL,
+    achados TEXT NOT NULL,
+    PRIMARY KEY (sha256, rastreador)
+);
+CREATE TABLE IF NOT EXISTS paginas_ocr (
+    sha256 TEXT PRIMARY KEY,
+    texto TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sentencas (
+    id INTEGER PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    inicio INTEGER NOT NULL,
+    fim INTEGER NOT NULL,
+    medida_mm REAL
+);
+CREATE INDEX IF NOT EXISTS sentencas_sha256 ON sentencas (sha256);
+CREATE VIRTUAL TABLE IF NOT EXISTS busca USING fts5(
+    sentenca, content='', tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+CREATE TABLE IF NOT EXISTS lesoes (
+    sha256 TEXT NOT NULL,
+    rastreador TEXT NOT NULL,
+    same TEXT NOT NULL,
+    paciente TEXT,
+    data_exame TEXT,
+    medida_mm REAL,
+    achado TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS lesoes_documento ON lesoes (sha256, rastreador);
+CREATE INDEX IF NOT EXISTS lesoes_paciente ON lesoes (rastreador, same, data_exame);
+CREATE INDEX IF NOT EXISTS lesoes_medida ON lesoes (rastreador, medida_mm);
+CREATE TABLE IF NOT EXISTS evolucao_lesoes (
+    rastreador TEXT NOT NULL,
+    same TEXT NOT NULL,
+    paciente TEXT,
+    exames INTEGER NOT NULL,
+    primeiro_exame TEXT,
+    ultimo_exame TEXT,
+    medida_inicial_mm REAL,
+    medida_final_mm REAL,
+    maior_mm REAL,
+    crescimento_mm REAL,
+    PRIMARY KEY (rastreador, same)
+);
+CREATE INDEX IF NOT EXISTS evolucao_crescimento ON evolucao_lesoes (rastreador, crescimento_mm);
+"""
+
+# Limite de parâmetros por consulta "IN (...)" do SQLite
+_LOTE = 500
+
+COLUNAS_BUSCA = ["Paciente", "Idade", "Same", "Data do Exame", "Medida (mm)", "Sentenca", "sha256"]
+COLUNAS_EVOLUCAO = ["Paciente", "Same", "Exames", "Primeiro Exame", "Último Exame",
+                    "Medida Inicial (mm)", "Medida Final (mm)", "Maior Medida (mm)", "Crescimento (mm)"]
+COLUNAS_PERSISTENCIA = ["Paciente", "Same", "Exames", "Primeiro Exame", "Último Exame", "Maior Medida (mm)"]
+COLUNAS_HISTORICO = ["Paciente", "Same", "Data do Exame", "Medida (mm)", "Achado", "sha256"]
+
+
+def _cabecalho(paciente, idade, same, data_exame):
+    return {"Paciente": paciente, "Idade": idade, "Same": same, "Data do Exame": data_exame}
+
+
+def _indexar(conn, sha, texto):
+    for inicio, fim in spans_sentencas(texto):
+        sentenca = texto[inicio:fim]
+        if not sentenca.strip():
+            continue
+        cursor = conn.execute(
+            "INSERT INTO sentencas (sha256, inicio, fim, medida_mm) VALUES (?, ?, ?, ?)",
+            (sha, inicio, fim, maior_tamanho_mm(sentenca))
+        )
+        conn.execute("INSERT INTO busca (rowid, sentenca) VALUES (?, ?)", (cursor.lastrowid, sentenca))
+
+
+def _data_iso(data_exame):
+    # "dd/mm/aaaa" -> "aaaa-mm-dd" (ordenável e aceito pelas funções de data do SQLite)
+    try:
+        return datetime.strptime(data_exame, "%d/%m/%Y").date().isoformat()
+    except (TypeError, ValueError):
+        return None
+
+
+def _indexar_lesoes(conn, sha, rastreador, lista):
+    """
+    Substitui os achados do documento no índice longitudinal; retorna o SAME do
+    paciente, ou None se o laudo não tem SAME (não entra no índice).
+    """
+    conn.execute("DELETE FROM lesoes WHERE sha256 = ? AND rastreador = ?", (sha, rastreador))
+    paciente, same, data_exame = conn.execute(
+        "SELECT paciente, same, data_exame FROM documentos WHERE sha256 = ?", (sha,)
+    ).fetchone()
+    if not same or same == "N/D":
+        return None
+    data_iso = _data_iso(data_exame)
+    conn.executemany(
+        "INSERT INTO lesoes VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [
+            (sha, rastreador, same, paciente, data_iso, tamanho_mm(achado.get("Tamanho")),
+             json.dumps(achado, ensure_ascii=False))
+            for achado in lista
+        ]
+    )
+    return same
+
+
+def _atualizar_evolucao(conn, rastreador, sames):
+    """
+    Recalcula o resumo de cada paciente a partir dos seus achados. A medida de um
+    exame é a maior medida citada nele; o crescimento é o maior aumento de um exame
+    para qualquer exame posterior (None com menos de dois exames medidos).
+    """
+    for same in sames:
+        linhas = conn.execute(
+            "SELECT data_exame, MAX(medida_mm), MAX(paciente) FROM lesoes "
+            "WHERE rastreador = ? AND same = ? AND data_exame IS NOT NULL "
+            "GROUP BY data_exame ORDER BY data_exame",
+            (rastreador, same)
+        ).fetchall()
+        if not linhas:
+            conn.execute("DELETE FROM evolucao_lesoes WHERE rastreador = ? AND same = ?", (rastreador, same))
+            continue
+        medidas = [medida for _, medida, _ in linhas if medida is not None]
+        crescimento = menor = None
+        for medida in medidas:
+            if menor is not None and (crescimento is None or medida - menor > crescimento):
+                crescimento = medida - menor
+            menor = medida if menor is None else min(menor, medida)
+        conn.execute(
+            "INSERT OR REPLACE INTO evolucao_lesoes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (rastreador, same, linhas[-1][2], len(linhas), linhas[0][0], linhas[-1][0],
+             medidas[0] if medidas else None, medidas[-1] if medidas else None,
+             max(medidas, default=None), crescimento)
+        )
+
+
+class MinerCache:
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        with self._conectar() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            indice_novo = not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'busca'").fetchone()
+            lesoes_novas = not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'lesoes'").fetchone()
+            conn.executescript(_SCHEMA)
+            if indice_novo:
+                # Cache anterior ao índice: indexa os textos que já estavam guardados
+                for sha, texto in conn.execute("SELECT sha256, texto FROM documentos").fetchall():
+                    _indexar(conn, sha, texto)
+            if lesoes_novas:
+                # Idem para os achados já guardados
+                tocados = set()
+                for sha, rastreador, lista in conn.execute("SELECT sha256, rastreador, achados FROM achados").fetchall():
+                    same = _indexar_lesoes(conn, sha, rastreador, json.loads(lista))
+                    if same is not None:
+                        tocados.add((rastreador, same))
+                for rastreador, same in tocados:
+                    _atualizar_evolucao(conn, rastreador, [same])
+
+    @contextmanager
+    def _conectar(self):
+        # Uma conexão por operação: o Streamlit chama de threads diferentes
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _consultar(self, sql, chaves, *params):
+        linhas = []
+        chaves = list(chaves)
+        with self._conectar() as conn:
+            for i in range(0, len(chaves), _LOTE):
+                lote = chaves[i:i + _LOTE]
+                marcadores = ",".join("?" * len(lote))
+                linhas.extend(conn.execute(sql.format(marcadores=marcadores), (*params, *lote)).fetchall())
+        return linhas
+
+    def buscar_achados(self, hashes, rastreador, assinatura):
+        """
+        {sha256: (cabecalho, achados)} dos documentos já processados com estas regras.
+        """
+        linhas = self._consultar(
+            "SELECT d.sha256, d.paciente, d.idade, d.same, d.data_exame, a.achados "
+            "FROM achados a JOIN documentos d ON d.sha256 = a.sha256 "
+            "WHERE a.rastreador = ? AND a.assinatura = ? AND a.sha256 IN ({marcadores})",
+            hashes, rastreador, assinatura
+        )
+        return {sha: (_cabecalho(*campos), json.loads(achados)) for sha, *campos, achados in linhas}
+
+    def buscar_textos(self, hashes):
+        """
+        {sha256: (texto, cabecalho)} dos documentos com texto já extraído.
+        """
+        linhas = self._consultar(
+            "SELECT sha256, texto, paciente, idade, same, data_exame FROM documentos "
+            "WHERE sha256 IN ({marcadores})",
+            hashes
+        )
+        return {sha: (texto, _cabecalho(*campos)) for sha, texto, *campos in linhas}
+
+    def salvar(self, documentos, achados, rastreador, assinatura):
+        """
+        `documentos`: {sha256: (texto, cabecalho)} recém-extraídos;
+        `achados`: {sha256: lista de achados} do rastreador.
+        """
+        with self._conectar() as conn:
+            for sha, (texto, cab) in documentos.items():
+                # Mesmo hash, mesmo conteúdo: o texto de um documento nunca é reescrito
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO documentos VALUES (?, ?, ?, ?, ?, ?)",
+                    (sha, texto, cab["Paciente"], cab["Idade"], cab["Same"], cab["Data do Exame"])
+                )
+                if cursor.rowcount:
+                    _indexar(conn, sha, texto)
+            conn.executemany(
+                "INSERT OR REPLACE INTO achados VALUES (?, ?, ?, ?)",
+                [
+                    (sha, rastreador, assinatura, json.dumps(lista, ensure_ascii=False))
+                    for sha, lista in achados.items()
+                ]
+            )
+            sames = {_indexar_lesoes(conn, sha, rastreador, lista) for sha, lista in achados.items()}
+            sames.discard(None)
+            _atualizar_evolucao(conn, rastreador, sorted(sames))
+
+    def buscar_ocr(self, hashes):
+        """
+        {hash da página: texto} das páginas já reconhecidas pelo OCR.
+        """
+        return dict(self._consultar("SELECT sha256, texto FROM paginas_ocr WHERE sha256 IN ({marcadores})", hashes))
+
+    def salvar_ocr(self, textos):
+        with self._conectar() as conn:
+            conn.executemany("INSERT OR REPLACE INTO paginas_ocr VALUES (?, ?)", list(textos.items()))
+
+    def buscar_sentencas(self, consulta, medida_min_mm=None, limite=500):
+        """
+        Sentenças dos laudos que casam com `consulta` (sintaxe FTS5, sem diferenciar
+        acentos nem maiúsculas), as mais relevantes primeiro, com o cabeçalho do laudo:
+            nodulo adrenal       as duas palavras na mesma sentença
+            "nodulo adrenal"     a frase exata
+            calc*                prefixo (calculo, calcificado, ...)
+            nodulo NOT pulmao    exclusão
+        `medida_min_mm` exige uma medida pelo menos desse tamanho na sentença.
+        """
+        sql = (
+            "SELECT d.paciente, d.idade, d.same, d.data_exame, s.medida_mm, "
+            "substr(d.texto, s.inicio + 1, s.fim - s.inicio), s.sha256 "
+            "FROM busca JOIN sentencas s ON s.id = busca.rowid JOIN documentos d ON d.sha256 = s.sha256 "
+            "WHERE busca MATCH ?"
+        )
+        parametros = [consulta]
+        if medida_min_mm is not None:
+            sql += " AND s.medida_mm >= ?"
+            parametros.append(medida_min_mm)
+        sql += " ORDER BY busca.rank LIMIT ?"
+        parametros.append(limite)
+        try:
+            with self._conectar() as conn:
+                linhas = conn.execute(sql, parametros).fetchall()
+        except sqlite3.OperationalError as e:
+            raise ValueError(f"Consulta inválida: {e}") from e
+        resultados = pd.DataFrame(linhas, columns=COLUNAS_BUSCA)
+        resultados["Sentenca"] = resultados["Sentenca"].str.replace(r"\s+", " ", regex=True).str.strip()
+        return resultados
+
+    def lesoes_em_crescimento(self, rastreador, acima_de_mm, limite=500):
+        """
+        Pacientes cuja lesão cresceu mais que `acima_de_mm` entre dois exames
+        (ver evolucao_lesoes), os maiores crescimentos primeiro.
+        `rastreador`: nome do detector (ex.: detectar_nodulos.__name__).
+        """
+        with self._conectar() as conn:
+            linhas = conn.execute(
+                "SELECT paciente, same, exames, primeiro_exame, ultimo_exame, medida_inicial_mm, "
+                "medida_final_mm, maior_mm, crescimento_mm FROM evolucao_lesoes "
+                "WHERE rastreador = ? AND crescimento_mm > ? ORDER BY crescimento_mm DESC LIMIT ?",
+                (rastreador, acima_de_mm, limite)
+            ).fetchall()
+        return _com_datas(pd.DataFrame(linhas, columns=COLUNAS_EVOLUCAO), "Primeiro Exame", "Último Exame")
+
+    def lesoes_persistentes(self, rastreador, acima_de_mm, meses, limite=500):
+        """
+        Pacientes com achados maiores que `acima_de_mm` em exames separados por pelo
+        menos `meses` meses. Só os achados acima da medida são lidos (índice por medida).
+        """
+        with self._conectar() as conn:
+            linhas = conn.execute(
+                "SELECT MAX(paciente), same, COUNT(DISTINCT data_exame), MIN(data_exame), MAX(data_exame), "
+                "MAX(medida_mm) FROM lesoes "
+                "WHERE rastreador = ? AND medida_mm > ? AND data_exame IS NOT NULL GROUP BY same "
+                "HAVING MAX(data_exame) >= date(MIN(data_exame), ?) "
+                "ORDER BY MAX(data_exame) DESC LIMIT ?",
+                (rastreador, acima_de_mm, f"+{int(meses)} months", limite)
+            ).fetchall()
+        return _com_datas(pd.DataFrame(linhas, columns=COLUNAS_PERSISTENCIA), "Primeiro Exame", "Último Exame")
+
+    def historico_lesoes(self, same, rastreador):
+        """
+        Todos os achados do paciente, do exame mais antigo ao mais recente.
+        """
+        with self._conectar() as conn:
+            linhas = conn.execute(
+                "SELECT paciente, same, data_exame, medida_mm, achado, sha256 FROM lesoes "
+                "WHERE rastreador = ? AND same = ? ORDER BY data_exame, medida_mm DESC",
+                (rastreador, same)
+            ).fetchall()
+        historico = pd.DataFrame(linhas, columns=COLUNAS_HISTORICO)
+        historico["Achado"] = [json.loads(achado)["Sentenca"] for achado in historico["Achado"]]
+        return _com_datas(historico, "Data do Exame")
+
+
+def _com_datas(df, *colunas):
+    for coluna in colunas:
+        df[coluna] = pd.to_datetime(df[coluna], format="%Y-%m-%d").dt.date
+    return df
@@ -0,0 +1,188 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from itertools import islice
+
+import pandas as pd
+
+from miner_cache import MinerCache
+from miner_pool import criar_pool, iterar_documentos_pasta, iterar_documentos_zip, processar_rastreadores
+from miner_trackers import RASTREADORES
+
+# -------------------------------
+# Mineração em lote sem navegador (ex.: cron noturno):
+#   python miner_cli.py kidney /dados/laudos/2024-05 achados_renais.jsonl
+#   python miner_cli.py lung laudos.zip achados_pulmonares.parquet --workers 8
+#   python miner_cli.py kidney,lung laudos.zip achados.jsonl
+# Com vários rastreadores, cada PDF é extraído uma vez e o texto passa por todos;
+# cada achado leva o nome do rastreador na coluna "Rastreador".
+# Os achados são gravados a cada lote e o checkpoint (<saida>.checkpoint) registra os
+# documentos concluídos e até onde a saída é válida; rodar de novo com os mesmos
+# rastreadores continua de onde parou.
+# -------------------------------
+LOTE_CLI = 64
+
+
+class Checkpoint:
+    """
+    Uma linha JSON por lote concluído: {"rastreadores": [...], "documentos": [...],
+    "saida": estado da saída}. Uma última linha incompleta (interrupção durante a
+    gravação) é ignorada. Só retoma com os mesmos rastreadores (ValueError se não):
+    um documento concluído por outro conjunto não passou pelos rastreadores novos.
+    `recomecar` descarta o checkpoint (e, com ele, a saída anterior).
+    """
+
+    def __init__(self, caminho, rastreadores, recomecar=False):
+        self.caminho = caminho
+        self.rastreadores = list(rastreadores)
+        self.processados = set()
+        self.estado = None
+        anteriores = None
+        if os.path.exists(caminho) and not recomecar:
+            with open(caminho, encoding="utf-8") as f:
+                for linha in f:
+                    try:
+                        lote = json.loads(linha)
+                    except json.JSONDecodeError:
+                        break
+                    anteriores = lote.get("rastreadores")
+                    self.processados.update(lote["documentos"])
+                    self.estado = lote["saida"]
+        if self.processados and anteriores != self.rastreadores:
+            raise ValueError(
+                f"{caminho} foi gravado com os rastreadores {','.join(anteriores or ['(desconhecidos)'])}, "
+                f"não {','.join(self.rastreadores)}; use outra saída ou --recomecar"
+            )
+        # Reescreve só as linhas válidas antes de continuar
+        with open(caminho + ".tmp", "w", encoding="utf-8") as f:
+            if self.processados:
+                f.write(self._linha(sorted(self.processados), self.estado))
+        os.replace(caminho + ".tmp", caminho)
+
+    def _linha(self, documentos, estado):
+        lote = {"rastreadores": self.rastreadores, "documentos": documentos, "saida": estado}
+        return json.dumps(lote, ensure_ascii=False) + "\n"
+
+    def registrar(self, documentos, estado):
+        with open(self.caminho, "a", encoding="utf-8") as f:
+            f.write(self._linha(documentos, estado))
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class SaidaJsonl:
+    """
+    Um achado por linha; o estado é o tamanho do arquivo ao fim do último lote.
+    """
+
+    def __init__(self, caminho, estado):
+        modo = "r+b" if estado is not None and os.path.exists(caminho) else "wb"
+        self.arquivo = open(caminho, modo)
+        # Descarta o que foi escrito depois do último checkpoint
+        self.arquivo.truncate(estado or 0)
+        self.arquivo.seek(0, os.SEEK_END)
+
+    def gravar(self, registros):
+        for registro in registros:
+            self.arquivo.write((json.dumps(registro, ensure_ascii=False) + "\n").encode("utf-8"))
+        self.arquivo.flush()
+        os.fsync(self.arquivo.fileno())
+        return self.arquivo.tell()
+
+    def fechar(self):
+        self.arquivo.close()
+
+
+class SaidaParquet:
+    """
+    Pasta com um part-NNNNN.parquet por lote com achados (pd.read_parquet lê a pasta);
+    o estado é o número de partes válidas.
+    """
+
+    def __init__(self, caminho, estado):
+        self.caminho = caminho
+        self.partes = estado or 0
+        os.makedirs(caminho, exist_ok=True)
+        for parte in glob.glob(os.path.join(caminho, "part-*.parquet")):
+            if int(os.path.basename(parte)[5:10]) >= self.partes:
+                os.remove(parte)
+
+    def gravar(self, registros):
+        if registros:
+            parte = os.path.join(self.caminho, f"part-{self.partes:05d}.parquet")
+            pd.DataFrame(registros).to_parquet(parte + ".tmp", index=False)
+            os.replace(parte + ".tmp", parte)
+            self.partes += 1
+        return self.partes
+
+    def fechar(self):
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Minera laudos (PDF, TXT, HTML ou DOCX; pasta ou ZIP) sem o Streamlit.")
+    parser.add_argument("rastreadores", help=f"um ou mais, separados por vírgula: {', '.join(sorted(RASTREADORES))}")
+    parser.add_argument("entrada", help="pasta com laudos (inclui subpastas) ou arquivo .zip")
+    parser.add_argument("saida", help="arquivo .jsonl ou pasta .parquet")
+    parser.add_argument("--workers", type=int, default=None, help="processos de extração (padrão: núcleos da máquina)")
+    parser.add_argument("--lote", type=int, default=LOTE_CLI, help="documentos por checkpoint")
+    parser.add_argument("--sem-cache", action="store_true", help="não usa o cache de extração em sla_data")
+    parser.add_argument("--recomecar", action="store_true",
+                        help="ignora o checkpoint e sobrescreve a saída (ex.: outros rastreadores)")
+    args = parser.parse_args(argv)
+    nomes = [nome.strip() for nome in args.rastreadores.split(",") if nome.strip()]
+    desconhecidos = [nome for nome in nomes if nome not in RASTREADORES]
+    if not nomes or desconhecidos:
+        parser.error(f"rastreador inválido: {', '.join(desconhecidos) or args.rastreadores!r} "
+                     f"(opções: {', '.join(sorted(RASTREADORES))})")
+
+    try:
+        checkpoint = Checkpoint(args.saida + ".checkpoint", nomes, args.recomecar)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.saida.endswith(".parquet"):
+        saida = SaidaParquet(args.saida, checkpoint.estado)
+    else:
+        saida = SaidaJsonl(args.saida, checkpoint.estado)
+    if os.path.isdir(args.entrada):
+        documentos = iterar_documentos_pasta(args.entrada, pular=checkpoint.processados)
+    else:
+        documentos = iterar_documentos_zip(args.entrada, pular=checkpoint.processados)
+    cache = None if args.sem_cache else MinerCache()
+    detectores = [RASTREADORES[nome].detector for nome in nomes]
+    # Mesmas colunas em todos os registros (e em todas as partes do Parquet): as
+    # colunas extras de um rastreador ficam vazias nos achados dos outros
+    colunas = list(dict.fromkeys(coluna for nome in nomes for coluna in RASTREADORES[nome].colunas_saida()))
+
+    if checkpoint.processados:
+        print(f"Retomando: {len(checkpoint.processados)} documentos já processados", file=sys.stderr)
+    total_documentos = total_achados = 0
+    inicio = time.perf_counter()
+    try:
+        with criar_pool(args.workers) as pool:
+            while True:
+                bloco = list(islice(documentos, args.lote))
+                if not bloco:
+                    break
+                resultados = processar_rastreadores(bloco, detectores, pool, cache)
+                registros = [
+                    {**{coluna: registro.get(coluna, "") for coluna in colunas}, "Rastreador": nome}
+                    for nome, (_, registros_rastreador, _) in zip(nomes, resultados)
+                    for registro in registros_rastreador
+                ]
+                checkpoint.registrar([nome for nome, _ in bloco], saida.gravar(registros))
+                total_documentos += len(bloco)
+                total_achados += len(registros)
+                decorrido = time.perf_counter() - inicio
+                print(f"{total_documentos} documentos, {total_achados} achados "
+                      f"({total_documentos / decorrido:.1f} documentos/s)", file=sys.stderr)
+    finally:
+        saida.fechar()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
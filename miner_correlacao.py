@@ -0,0 +1,103 @@
+import re
+import unicodedata
+
+import numpy as np
+from rapidfuzz import fuzz, process
+from rapidfuzz.utils import default_process
+
+# -------------------------------
+# Correlação aproximada de nomes de pacientes (minerados x internados/PA).
+# Em vez de um extractOne por paciente contra a lista inteira, todos os nomes são
+# comparados de uma vez com rapidfuzz.process.cdist (multi-thread, com score_cutoff).
+# Só em listas grandes os nomes são agrupados por chave fonética do primeiro e do
+# último nome (blocagem) e cada bloco é comparado separadamente: pares que não
+# compartilham nem o primeiro nem o último nome fonético não são comparados, o que
+# perde ~1% dos pares (erros de digitação nos dois nomes) e, abaixo do limite, é mais
+# lento que o cdist completo (medido com nomes sintéticos, 1 núcleo: mil x 5 mil
+# 0,08 s sem blocagem contra 0,11 s com; 2 mil x 20 mil 0,56 s contra 0,39 s).
+# -------------------------------
+_SONS = [
+    (re.compile(padrao), troca) for padrao, troca in [
+        ("ç", "s"), ("ph", "f"), ("th", "t"), ("qu", "c"), ("[cs]h", "x"), ("lh", "l"), ("nh", "n"),
+        ("h", ""), ("y", "i"), ("w", "v"), ("k", "c"), ("z", "s"),
+    ]
+]
+# Células (float32) por chamada do cdist: ~64 MB, qualquer que seja o tamanho do bloco
+_CELULAS_POR_LOTE = 1 << 24
+# Pares (nomes x nomes_referencia) a partir dos quais blocagem=None liga a blocagem
+_PARES_BLOCAGEM = 1 << 25
+_VOGAIS = re.compile(r"[aeiou]")
+_REPETIDAS = re.compile(r"(.)\1+")
+
+
+def _sem_acentos(texto):
+    return "".join(c for c in unicodedata.normalize("NFD", texto) if not unicodedata.combining(c))
+
+
+def chave_fonetica(token):
+    """
+    Código fonético simples para nomes em português: primeira letra + consoantes
+    (grafias como Sousa/Souza, Silva/Sylva, Luiz/Luis caem na mesma chave).
+    """
+    for padrao, troca in _SONS:
+        token = padrao.sub(troca, token)
+    token = _sem_acentos(token)
+    if not token:
+        return ""
+    return _REPETIDAS.sub(r"\1", token[0] + _VOGAIS.sub("", token[1:]))[:4]
+
+
+def _chaves(nome):
+    tokens = nome.split()
+    return {("primeiro", chave_fonetica(tokens[0])), ("ultimo", chave_fonetica(tokens[-1]))}
+
+
+def melhores_correspondencias(nomes, nomes_referencia, threshold=70, blocagem=None, workers=-1):
+    """
+    Para cada nome, a posição em `nomes_referencia` do nome mais parecido (fuzz.ratio,
+    após minúsculas e remoção de pontuação) com pontuação >= threshold, ou -1.
+    Em empates vence a primeira posição, como no extractOne.
+    blocagem=None compara tudo com tudo até _PARES_BLOCAGEM pares e usa a blocagem
+    fonética acima disso; True/False forçam um ou outro.
+    Retorna (posições, pontuações) como arrays numpy.
+    """
+    nomes = [default_process(str(nome)) for nome in nomes]
+    nomes_referencia = [default_process(str(nome)) for nome in nomes_referencia]
+    if blocagem is None:
+        blocagem = len(nomes) * len(nomes_referencia) >= _PARES_BLOCAGEM
+    melhor_posicao = np.full(len(nomes), -1, dtype=np.int64)
+    melhor_score = np.full(len(nomes), -1.0)
+
+    blocos = {}
+    for lado, lista in ((0, nomes), (1, nomes_referencia)):
+        for posicao, nome in enumerate(lista):
+            if not nome:
+                continue
+            for chave in (_chaves(nome) if blocagem else {None}):
+                blocos.setdefault(chave, ([], []))[lado].append(posicao)
+
+    for posicoes_bloco, posicoes_referencia in blocos.values():
+        if not posicoes_bloco or not posicoes_referencia:
+            continue
+        posicoes_referencia = np.array(posicoes_referencia)
+        nomes_bloco_referencia = [nomes_referencia[j] for j in posicoes_referencia]
+        passo = max(1, _CELULAS_POR_LOTE // len(posicoes_referencia))
+        for inicio in range(0, len(posicoes_bloco), passo):
+            posicoes = np.array(posicoes_bloco[inicio:inicio + passo])
+            # score_cutoff meio ponto abaixo: a pontuação é arredondada como no fuzzywuzzy
+            matriz = process.cdist(
+                [nomes[i] for i in posicoes], nomes_bloco_referencia,
+                scorer=fuzz.ratio, score_cutoff=max(threshold - 0.5, 0), workers=workers
+            )
+            matriz = np.rint(matriz, out=matriz)
+            coluna = matriz.argmax(axis=1)
+            score = matriz[np.arange(len(posicoes)), coluna]
+            candidato = posicoes_referencia[coluna]
+            atual_score = melhor_score[posicoes]
+            atual_posicao = melhor_posicao[posicoes]
+            melhora = (score >= threshold) & (
+                (score > atual_score) | ((score == atual_score) & (candidato < atual_posicao))
+            )
+            melhor_score[posicoes[melhora]] = score[melhora]
+            melhor_posicao[posicoes[melhora]] = candidato[melhora]
+    return melhor_posicao, melhor_score
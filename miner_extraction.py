@@ -0,0 +1,251 @@
+import io
+import os
+import re
+import zipfile
+from html.parser import HTMLParser
+from xml.etree import ElementTree
+
+import fitz  # PyMuPDF
+
+from miner_ocr import ocr_paginas
+
+# -------------------------------
+# Extração de texto e cabeçalho dos laudos (compartilhada por kidney.py e lung.py).
+# Sem Streamlit: roda nos processos do pool de extração.
+# Além do PDF, aceita as exportações do RIS em texto, HTML e DOCX (extrair_texto_documento):
+# o texto sai direto do arquivo, sem PyMuPDF nem OCR, e segue para as mesmas regras.
+# -------------------------------
+EXTENSOES_LAUDO = (".pdf", ".txt", ".html", ".htm", ".docx")
+regex_nome = re.compile(r"(?i)paciente\s*:\s*(.+)")
+regex_idade = re.compile(r"(?i)idade\s*:\s*(\d+[Aa]?\s*\d*[Mm]?)")
+regex_same = re.compile(r"(?i)same\s*:\s*(\S+)")
+regex_data = re.compile(r"(?i)data\s*do\s*exame\s*:\s*([\d/]+)")
+regex_fim_sentenca = re.compile(r"(?<=[.!?])\s+")
+
+
+def extrair_texto(pdf_input, ocr_cache=None):
+    """
+    Extrai o texto do PDF. Páginas sem texto passam pelo OCR (miner_ocr),
+    com o texto em cache por página em `ocr_cache` (MinerCache), se informado.
+    Aceita um caminho (string), os bytes do PDF ou um objeto file-like (BytesIO).
+    """
+    if isinstance(pdf_input, (bytes, bytearray, memoryview)):
+        doc = fitz.open(stream=pdf_input, filetype="pdf")
+    elif hasattr(pdf_input, "read"):
+        pdf_input.seek(0)
+        pdf_bytes = pdf_input.read()
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    else:
+        doc = fitz.open(pdf_input)
+    textos = [doc[page_num].get_text("text") for page_num in range(len(doc))]
+    sem_texto = [page_num for page_num, texto in enumerate(textos) if not texto.strip()]
+    if sem_texto:
+        for page_num, texto in ocr_paginas(doc, sem_texto, cache=ocr_cache).items():
+            textos[page_num] = texto
+    doc.close()
+    return "".join(texto + "\n" for texto in textos)
+
+
+def _decodificar(conteudo):
+    # Exportações do RIS vêm em UTF-8 ou, as mais antigas, em Windows-1252
+    conteudo = bytes(conteudo)
+    try:
+        return conteudo.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return conteudo.decode("cp1252", "replace")
+
+
+class _TextoHTML(HTMLParser):
+    # Blocos (parágrafos, linhas e células de tabela) viram quebras de linha, como no
+    # texto do PDF, para que "Paciente: ..." não se estenda até a célula seguinte
+    BLOCOS = {"p", "div", "br", "tr", "td", "th", "li", "h1", "h2", "h3", "h4", "h5", "h6", "table", "section"}
+    IGNORAR = {"script", "style", "head", "title"}
+
+    def __init__(self):
+        super().__init__()
+        self.partes = []
+        self.ignorando = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.IGNORAR:
+            self.ignorando += 1
+        elif tag in self.BLOCOS:
+            self.partes.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.IGNORAR:
+            self.ignorando = max(0, self.ignorando - 1)
+        elif tag in self.BLOCOS:
+            self.partes.append("\n")
+
+    def handle_data(self, data):
+        if not self.ignorando:
+            self.partes.append(data)
+
+
+def _texto_html(conteudo):
+    parser = _TextoHTML()
+    parser.feed(_decodificar(conteudo))
+    parser.close()
+    return "".join(parser.partes)
+
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def _texto_docx(conteudo):
+    """
+    Texto do word/document.xml: um parágrafo por linha (inclusive os das tabelas).
+    """
+    with zipfile.ZipFile(io.BytesIO(conteudo)) as docx:
+        raiz = ElementTree.fromstring(docx.read("word/document.xml"))
+    linhas = []
+    for paragrafo in raiz.iter(f"{_W}p"):
+        partes = []
+        for elemento in paragrafo.iter():
+            if elemento.tag == f"{_W}t":
+                partes.append(elemento.text or "")
+            elif elemento.tag == f"{_W}tab":
+                partes.append("\t")
+            elif elemento.tag in (f"{_W}br", f"{_W}cr"):
+                partes.append("\n")
+        linhas.append("".join(partes))
+    return "\n".join(linhas) + "\n"
+
+
+def extrair_texto_documento(nome, conteudo, ocr_cache=None):
+    """
+    Texto do laudo conforme a extensão de `nome`: PDF (extrair_texto), TXT, HTML ou DOCX.
+    """
+    extensao = os.path.splitext(nome)[1].lower()
+    if extensao == ".txt":
+        return _decodificar(conteudo)
+    if extensao in (".html", ".htm"):
+        return _texto_html(conteudo)
+    if extensao == ".docx":
+        return _texto_docx(conteudo)
+    return extrair_texto(conteudo, ocr_cache=ocr_cache)
+
+
+def extrair_informacoes(texto_completo):
+    """
+    Extrai informações do cabeçalho do laudo a partir do texto completo.
+    """
+    dados_cabecalho = {}
+    dados_cabecalho["Paciente"] = regex_nome.search(texto_completo).group(1).strip() if regex_nome.search(texto_completo) else "N/D"
+    dados_cabecalho["Idade"] = regex_idade.search(texto_completo).group(1).strip() if regex_idade.search(texto_completo) else "N/D"
+    dados_cabecalho["Same"] = regex_same.search(texto_completo).group(1).strip() if regex_same.search(texto_completo) else "N/D"
+    dados_cabecalho["Data do Exame"] = regex_data.search(texto_completo).group(1).strip() if regex_data.search(texto_completo) else "N/D"
+    return dados_cabecalho
+
+
+def dividir_sentencas(texto_completo):
+    return regex_fim_sentenca.split(texto_completo)
+
+
+def spans_sentencas(texto_completo):
+    """
+    (início, fim) de cada sentença de dividir_sentencas no texto.
+    """
+    inicio = 0
+    for fim_sentenca in regex_fim_sentenca.finditer(texto_completo):
+        yield inicio, fim_sentenca.start()
+        inicio = fim_sentenca.end()
+    yield inicio, len(texto_completo)
+
+
+def _docx(texto):
+    # DOCX mínimo (um parágrafo por linha) para o benchmark
+    corpo = "".join(
+        f"<w:p><w:r><w:t xml:space=\"preserve\">{linha}</w:t></w:r></w:p>"
+        for linha in texto.replace("&", "&amp;").replace("<", "&lt;").split("\n")
+    )
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as docx:
+        docx.writestr("[Content_Types].xml", (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Override PartName="/word/document.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+            '</Types>'
+        ))
+        docx.writestr("_rels/.rels", (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Target="word/document.xml" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+            '</Relationships>'
+        ))
+        docx.writestr("word/document.xml", (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            f'<w:document xmlns:w="{_W[1:-1]}"><w:body>{corpo}</w:body></w:document>'
+        ))
+    return buffer.getvalue()
+
+
+def _laudos_sinteticos(quantidade):
+    """
+    O mesmo laudo em cada formato: {extensão: [(nome, bytes), ...]}.
+    """
+    frases = [
+        "Presença de cálculo renal à direita medindo {} mm.",
+        "Nódulo sólido no lobo superior direito medindo {} mm, de contornos lobulados.",
+        "Fígado de dimensões normais e contornos regulares.",
+        "Rins tópicos, sem dilatação pielocalicinal.",
+        "Pequeno nódulo em vidro fosco no pulmão esquerdo com {} mm.",
+    ]
+    laudos = {extensao: [] for extensao in (".pdf", ".txt", ".html", ".docx")}
+    for i in range(quantidade):
+        texto = (
+            f"Paciente: PACIENTE {i:05d}\nIdade: {20 + i % 60}A\nSame: {100000 + i}\n"
+            f"Data do Exame: {1 + i % 28:02d}/{1 + i % 12:02d}/2024\n\n"
+            + " ".join(frases[(i + j) % len(frases)].format(2 + (i + j) % 20) for j in range(30))
+            + "\nConclusão: vide acima.\n"
+        )
+        doc = fitz.open()
+        doc.new_page().insert_textbox(fitz.Rect(40, 40, 560, 800), texto, fontsize=8)
+        laudos[".pdf"].append((f"laudo_{i:05d}.pdf", doc.tobytes()))
+        doc.close()
+        laudos[".txt"].append((f"laudo_{i:05d}.txt", texto.encode("utf-8")))
+        html = "".join(f"<p>{linha}</p>" for linha in texto.split("\n"))
+        laudos[".html"].append((f"laudo_{i:05d}.html", f"<html><body>{html}</body></html>".encode("utf-8")))
+        laudos[".docx"].append((f"laudo_{i:05d}.docx", _docx(texto)))
+    return laudos
+
+
+def _benchmark():
+    """
+    Laudos/s da extração de texto + cabeçalho por formato (a detecção de achados é a
+    mesma para todos). Sem arquivos, gera o mesmo laudo sintético em PDF, TXT, HTML e DOCX.
+    Uso: python miner_extraction.py [laudo1.pdf export1.docx ...] [--sinteticos 200]
+    """
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description=_benchmark.__doc__)
+    parser.add_argument("arquivos", nargs="*")
+    parser.add_argument("--sinteticos", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.arquivos:
+        laudos = {}
+        for caminho in args.arquivos:
+            with open(caminho, "rb") as f:
+                laudos.setdefault(os.path.splitext(caminho)[1].lower(), []).append((caminho, f.read()))
+    else:
+        laudos = _laudos_sinteticos(args.sinteticos)
+
+    referencia = None
+    for extensao, documentos in sorted(laudos.items(), key=lambda item: item[0] != ".pdf"):
+        inicio = time.perf_counter()
+        for nome, conteudo in documentos:
+            extrair_informacoes(extrair_texto_documento(nome, conteudo))
+        por_segundo = len(documentos) / (time.perf_counter() - inicio)
+        referencia = referencia or (por_segundo if extensao == ".pdf" else None)
+        comparacao = f" ({por_segundo / referencia:.1f}x o PDF)" if referencia and extensao != ".pdf" else ""
+        print(f"{extensao:6} {len(documentos):5d} laudos  {por_segundo:10.1f} laudos/s{comparacao}")
+
+
+if __name__ == "__main__":
+    _benchmark()
@@ -0,0 +1,130 @@
+import os
+import shutil
+import time
+import zipfile
+
+import pandas as pd
+
+from job_queue import input_path
+from miner_blobs import BlobStore
+from miner_cache import MinerCache
+from miner_extraction import EXTENSOES_LAUDO
+from miner_pool import (
+    contar_documentos_zip, criar_pool, deduplicar_pacientes, iterar_documentos_pasta,
+    iterar_documentos_zip, iterar_resultados
+)
+from miner_resultados import ResultadosStore
+from miner_trackers import RASTREADORES
+
+# -------------------------------
+# Mineração em segundo plano (fila em job_queue, workers em job_worker).
+# O dashboard grava os laudos enviados em disco e enfileira o job; o worker roda o
+# mesmo pipeline do miner_pool e grava os achados no armazenamento acumulado
+# (miner_resultados) a cada atualização, então fechar a aba não perde nada e o
+# dashboard vê os pacientes ao recarregar.
+# -------------------------------
+TIPO = "mineracao"
+ATUALIZACAO_SEGUNDOS = 2.0
+
+
+def salvar_entrada(arquivos):
+    """
+    Grava os uploads [(nome, bytes)] em um ZIP (sem compressão) que o worker lê.
+    Retorna o caminho.
+    """
+    caminho = input_path("laudos.zip")
+    with zipfile.ZipFile(caminho, "w", zipfile.ZIP_STORED) as zf:
+        for nome, conteudo in arquivos:
+            zf.writestr(nome, conteudo)
+    return caminho
+
+
+def salvar_zip(zip_file):
+    """
+    Copia um ZIP enviado (arquivo aberto) para a pasta de entradas da fila, em blocos.
+    """
+    caminho = input_path(getattr(zip_file, "name", "laudos.zip"))
+    zip_file.seek(0)
+    with open(caminho, "wb") as destino:
+        shutil.copyfileobj(zip_file, destino)
+    return caminho
+
+
+def enfileirar(fila, rastreadores, entrada, rotulo=""):
+    """
+    Enfileira a mineração de `entrada` (ZIP ou pasta, removida ao final) com os
+    rastreadores de RASTREADORES indicados. Retorna o id do job.
+    """
+    return fila.submit(TIPO, {"rastreadores": list(rastreadores), "entrada": entrada}, rotulo)
+
+
+def jobs_rastreador(fila, rastreador, limite=5, ids=None):
+    """
+    Os jobs de mineração mais recentes que incluem `rastreador`, opcionalmente só os
+    de `ids` (ex.: os enfileirados por uma sessão do dashboard).
+    """
+    jobs = fila.jobs(TIPO, limite * 4, ids=ids)
+    return [job for job in jobs if rastreador in job["params"]["rastreadores"]][:limite]
+
+
+def erro_resumido(job):
+    """
+    Última linha do traceback de um job que falhou.
+    """
+    linhas = (job["error"] or "").strip().splitlines()
+    return linhas[-1] if linhas else "erro desconhecido"
+
+
+def minerar(params, job):
+    """
+    Handler do job_worker: minera a entrada com job.cpus processos e grava os achados
+    de cada rastreador no seu ResultadosStore. Retorna (resumo, None).
+    """
+    rastreadores = [RASTREADORES[nome] for nome in params["rastreadores"]]
+    stores = [ResultadosStore(r.detector.__name__, r.colunas_saida()) for r in rastreadores]
+    entrada = params["entrada"]
+    try:
+        if os.path.isdir(entrada):
+            documentos = iterar_documentos_pasta(entrada)
+            total = sum(
+                nome.lower().endswith(EXTENSOES_LAUDO) for _, _, arquivos in os.walk(entrada) for nome in arquivos
+            )
+        else:
+            documentos = iterar_documentos_zip(entrada)
+            total = contar_documentos_zip(entrada)
+
+        pendentes = [[] for _ in rastreadores]
+        achados = [0 for _ in rastreadores]
+        concluidos = 0
+
+        def gravar():
+            for indice, (store, lista) in enumerate(zip(stores, pendentes)):
+                if lista:
+                    store.adicionar(deduplicar_pacientes(pd.DataFrame(lista)))
+                    achados[indice] += len(lista)
+                    lista.clear()
+
+        with criar_pool(job.cpus) as pool:
+            fluxo = iterar_resultados(
+                documentos, [r.detector for r in rastreadores], pool, MinerCache(), BlobStore()
+            )
+            ultima_atualizacao = time.perf_counter()
+            for _, registros_laudo in fluxo:
+                concluidos += 1
+                for lista, registros in zip(pendentes, registros_laudo):
+                    lista.extend(registros)
+                if time.perf_counter() - ultima_atualizacao >= ATUALIZACAO_SEGUNDOS:
+                    # Grava antes de informar o progresso: um cancelamento mantém o que já saiu
+                    gravar()
+                    job.progress(
+                        concluidos / max(total, 1), f"{concluidos}/{total} laudo(s) · {sum(achados)} achado(s)"
+                    )
+                    ultima_atualizacao = time.perf_counter()
+            gravar()
+    finally:
+        # O worker só chega aqui se não caiu; se cair, o job volta para a fila com a entrada intacta
+        if os.path.isdir(entrada):
+            shutil.rmtree(entrada, ignore_errors=True)
+        elif os.path.exists(entrada):
+            os.remove(entrada)
+    return {"laudos": concluidos, "achados": dict(zip(params["rastreadores"], achados))}, None
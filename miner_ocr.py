@@ -0,0 +1,128 @@
+import argparse
+import hashlib
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz  # PyMuPDF
+import numpy as np
+import pytesseract
+from PIL import Image
+
+# -------------------------------
+# OCR das páginas sem camada de texto.
+# Cada página é renderizada uma vez em tons de cinza no DPI configurado, binarizada
+# (limiar de Otsu, imagem de 1 bit) e enviada ao Tesseract em threads: o trabalho pesado roda no
+# processo do tesseract, então as threads já dão paralelismo real.
+# O texto fica em cache pelo hash da imagem binarizada (ver MinerCache).
+# -------------------------------
+OCR_DPI = int(os.environ.get("MINER_OCR_DPI", 300))
+OCR_WORKERS = int(os.environ.get("MINER_OCR_WORKERS", 2))
+# Orçamento de memória para as páginas renderizadas aguardando OCR
+OCR_MEMORIA_MB = int(os.environ.get("MINER_OCR_MEMORIA_MB", 256))
+OCR_LANG = "por"
+
+# Uma thread interna por tesseract; o paralelismo vem das páginas simultâneas
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+
+def renderizar_pagina(page, dpi=OCR_DPI):
+    """
+    Renderiza a página em tons de cinza e binariza em uma imagem de 1 bit.
+    Retorna a imagem e o SHA-256 dos bits (chave do cache de OCR).
+    """
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+    pixels = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+    bits = np.packbits(pixels > limiar_otsu(pixels), axis=1)
+    return Image.frombytes("1", (pix.width, pix.height), bits.tobytes()), hashlib.sha256(bits).hexdigest()
+
+
+def limiar_otsu(pixels):
+    """
+    Limiar de Otsu do histograma de tons de cinza (amostrado: 1 a cada 4 pixels).
+    """
+    histograma = np.bincount(pixels[::2, ::2].ravel(), minlength=256).astype(np.float64)
+    peso_fundo = np.cumsum(histograma)
+    soma_fundo = np.cumsum(histograma * np.arange(256))
+    peso_frente = peso_fundo[-1] - peso_fundo
+    with np.errstate(divide="ignore", invalid="ignore"):
+        media_fundo = soma_fundo / peso_fundo
+        media_frente = (soma_fundo[-1] - soma_fundo) / peso_frente
+        variancia = np.nan_to_num(peso_fundo * peso_frente * (media_fundo - media_frente) ** 2)
+    return int(np.argmax(variancia)) if variancia.any() else 127
+
+
+def _ocr(img, lang):
+    return pytesseract.image_to_string(img, lang=lang)
+
+
+def ocr_paginas(doc, paginas, dpi=OCR_DPI, workers=OCR_WORKERS, memoria_mb=OCR_MEMORIA_MB, cache=None, lang=OCR_LANG):
+    """
+    {número da página: texto} das `paginas` de `doc` via OCR.
+    A renderização fica na thread atual (o fitz não é thread-safe) e limita o número
+    de imagens em memória ao orçamento `memoria_mb`; o OCR roda em `workers` threads.
+    """
+    textos = {}
+    pendentes = deque()
+    limite = None
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for page_num in paginas:
+            img, hash_bits = renderizar_pagina(doc[page_num], dpi)
+            chave = hashlib.sha256(f"{hash_bits}|{img.size}|{lang}".encode()).hexdigest()
+            em_cache = cache.buscar_ocr([chave]) if cache is not None else {}
+            if chave in em_cache:
+                textos[page_num] = em_cache[chave]
+                continue
+            if limite is None:
+                # Imagem de 1 bit + a cópia em tons de cinza que o pytesseract grava para o tesseract
+                limite = max(1, (memoria_mb << 20) // max(1, img.width * img.height * 2))
+            while len(pendentes) >= limite:
+                _concluir(pendentes.popleft(), textos, cache)
+            pendentes.append((page_num, chave, executor.submit(_ocr, img, lang)))
+        while pendentes:
+            _concluir(pendentes.popleft(), textos, cache)
+    return textos
+
+
+def _concluir(pendente, textos, cache):
+    page_num, chave, futuro = pendente
+    textos[page_num] = futuro.result()
+    if cache is not None:
+        cache.salvar_ocr({chave: textos[page_num]})
+
+
+def _benchmark():
+    """
+    Páginas/s do OCR antigo (pixmap padrão, serial) contra ocr_paginas.
+    Uso: python miner_ocr.py laudo1.pdf laudo2.pdf ... [--dpi 300] [--workers 2]
+    """
+    parser = argparse.ArgumentParser(description=_benchmark.__doc__)
+    parser.add_argument("pdfs", nargs="+")
+    parser.add_argument("--dpi", type=int, default=OCR_DPI)
+    parser.add_argument("--workers", type=int, default=OCR_WORKERS)
+    args = parser.parse_args()
+
+    docs = [fitz.open(caminho) for caminho in args.pdfs]
+    total_paginas = sum(len(doc) for doc in docs)
+
+    inicio = time.perf_counter()
+    for doc in docs:
+        for page in doc:
+            pix = page.get_pixmap()
+            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+            pytesseract.image_to_string(img, lang=OCR_LANG)
+    antigo = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    for doc in docs:
+        ocr_paginas(doc, range(len(doc)), dpi=args.dpi, workers=args.workers)
+    novo = time.perf_counter() - inicio
+
+    print(f"{total_paginas} páginas")
+    print(f"atual:    {total_paginas / antigo:.2f} páginas/s")
+    print(f"ocr_paginas (dpi={args.dpi}, workers={args.workers}): {total_paginas / novo:.2f} páginas/s")
+
+
+if __name__ == "__main__":
+    _benchmark()
@@ -0,0 +1,260 @@
+import hashlib
+import multiprocessing
+import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import pandas as pd
+
+from miner_extraction import EXTENSOES_LAUDO, extrair_informacoes, extrair_texto_documento
+from miner_trackers import assinatura_regras
+
+# -------------------------------
+# Extração + detecção de achados em paralelo (pool de processos).
+# Cada processo recebe os bytes do laudo (PDF, TXT, HTML ou DOCX) e devolve o texto, o cabeçalho e os achados
+# de cada detector (um laudo é extraído uma vez, qualquer que seja o número de rastreadores);
+# os resultados voltam na ordem de entrada, então o relatório é determinístico.
+# Com um MinerCache, laudos já vistos (mesmo SHA-256) não são abertos de novo.
+# Os documentos são consumidos em lotes proporcionais ao número de processos, então
+# a memória de pico não depende do tamanho do lote enviado (ex.: um ZIP de 2 GB).
+# -------------------------------
+# Arquivos ZIP acima deste tamanho vão para o disco em vez da memória
+ZIP_SPOOL_MB = 64
+
+
+def criar_pool(max_workers=None):
+    """
+    Pool limitado ao número de núcleos. Usa "spawn": o Streamlit tem threads
+    rodando e os processos filhos só precisam importar os módulos do minerador.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def pool_ativo(pool):
+    """
+    False se o pool quebrou (um processo filho morreu: BrokenProcessPool) ou foi
+    encerrado; usado para recriar o pool guardado em cache em vez de reaproveitá-lo.
+    """
+    return not getattr(pool, "_broken", False) and not getattr(pool, "_shutdown_thread", False)
+
+
+def iterar_documentos_zip(zip_file, pular=()):
+    """
+    Gera (nome, bytes) de cada laudo do ZIP (extensões em EXTENSOES_LAUDO), um membro
+    por vez (exceto os nomes em `pular`).
+    Aceita um caminho ou um arquivo; arquivos sem seek são copiados antes, em blocos,
+    para um SpooledTemporaryFile (memória até ZIP_SPOOL_MB, disco acima disso).
+    """
+    spool = None
+    if hasattr(zip_file, "read") and not (hasattr(zip_file, "seekable") and zip_file.seekable()):
+        spool = tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_MB << 20)
+        shutil.copyfileobj(zip_file, spool, 1 << 20)
+        zip_file = spool
+    elif hasattr(zip_file, "seek"):
+        zip_file.seek(0)
+    try:
+        with zipfile.ZipFile(zip_file, "r") as z:
+            for info in z.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(EXTENSOES_LAUDO) and info.filename not in pular:
+                    yield info.filename, z.read(info)
+    finally:
+        if spool is not None:
+            spool.close()
+
+
+def contar_documentos_zip(zip_file):
+    """
+    Número de laudos no ZIP (só o diretório central é lido), ou None se o arquivo
+    não permite seek (iterar_documentos_zip ainda funciona nesse caso).
+    """
+    if hasattr(zip_file, "read") and not (hasattr(zip_file, "seekable") and zip_file.seekable()):
+        return None
+    with zipfile.ZipFile(zip_file, "r") as z:
+        total = sum(1 for info in z.infolist() if not info.is_dir() and info.filename.lower().endswith(EXTENSOES_LAUDO))
+    if hasattr(zip_file, "seek"):
+        zip_file.seek(0)
+    return total
+
+
+def iterar_documentos_pasta(pasta, pular=()):
+    """
+    Gera (caminho relativo, bytes) de cada laudo da pasta e subpastas, em ordem alfabética,
+    lendo um arquivo por vez (exceto os caminhos em `pular`).
+    """
+    for raiz, subpastas, arquivos in os.walk(pasta):
+        subpastas.sort()
+        for nome in sorted(arquivos):
+            caminho = os.path.join(raiz, nome)
+            relativo = os.path.relpath(caminho, pasta)
+            if nome.lower().endswith(EXTENSOES_LAUDO) and relativo not in pular:
+                with open(caminho, "rb") as f:
+                    yield relativo, f.read()
+
+
+def _processar_documento(tarefa):
+    nome, conteudo, detectores, cache = tarefa
+    texto_completo = extrair_texto_documento(nome, conteudo, ocr_cache=cache)
+    return texto_completo, extrair_informacoes(texto_completo), [detector(texto_completo) for detector in detectores]
+
+
+def _chave_mes(data_exame):
+    partes_data = data_exame.split("/")
+    if len(partes_data) == 3:
+        try:
+            dia, mes, ano = partes_data
+            return int(ano), int(mes)
+        except ValueError:
+            pass
+    return 0, 0
+
+
+def deduplicar_pacientes(pacientes_df):
+    """
+    Mantém um registro por (Paciente, Same), preferindo os que têm medida.
+    """
+    pacientes_df['has_measure'] = pacientes_df['Tamanho'].apply(
+        lambda x: 0 if x.strip().lower() == "não informado" else 1
+    )
+    pacientes_df = pacientes_df.sort_values('has_measure', ascending=False)
+    pacientes_df = pacientes_df.drop_duplicates(subset=['Paciente', 'Same'], keep='first')
+    return pacientes_df.drop(columns=['has_measure'])
+
+
+def _resultados_com_cache(documentos, hashes, detectores, assinaturas, pool, cache, chunksize):
+    """
+    (cabecalho, [achados de cada detector]) de cada documento, na ordem de entrada,
+    consultando o cache: achados das mesmas regras são reaproveitados; texto já
+    extraído só passa pelos detectores que faltam; o restante (hashes únicos) é
+    extraído uma vez no pool, para todos os detectores, e gravado no cache.
+    """
+    cabecalhos = {}
+    achados = []
+    for detector, assinatura in zip(detectores, assinaturas):
+        encontrados = cache.buscar_achados(set(hashes), detector.__name__, assinatura)
+        cabecalhos.update((sha, cabecalho) for sha, (cabecalho, _) in encontrados.items())
+        achados.append({sha: lista for sha, (_, lista) in encontrados.items()})
+
+    faltando = {sha for sha in hashes if any(sha not in por_detector for por_detector in achados)}
+    textos = cache.buscar_textos(faltando)
+    novos_achados = [{} for _ in detectores]
+    for sha, (texto_completo, cabecalho) in textos.items():
+        cabecalhos[sha] = cabecalho
+        for detector, por_detector, novos in zip(detectores, achados, novos_achados):
+            if sha not in por_detector:
+                novos[sha] = por_detector[sha] = detector(texto_completo)
+
+    pendentes = {}
+    for sha, documento in zip(hashes, documentos):
+        if sha in faltando and sha not in textos:
+            pendentes.setdefault(sha, documento)
+    extraidos = _extrair(pendentes.values(), detectores, pool, cache, chunksize)
+    novos_documentos = {}
+    for sha, (texto_completo, cabecalho, listas) in zip(pendentes, extraidos):
+        novos_documentos[sha] = (texto_completo, cabecalho)
+        cabecalhos[sha] = cabecalho
+        for lista, por_detector, novos in zip(listas, achados, novos_achados):
+            novos[sha] = por_detector[sha] = lista
+
+    for detector, assinatura, novos in zip(detectores, assinaturas, novos_achados):
+        if novos:
+            cache.salvar(novos_documentos, novos, detector.__name__, assinatura)
+            novos_documentos = {}
+    return [(cabecalhos[sha], [por_detector[sha] for por_detector in achados]) for sha in hashes]
+
+
+def _extrair(documentos, detectores, pool, cache, chunksize):
+    if pool is None:
+        # No processo atual, memoryviews (ex.: buffer do upload) vão direto ao PyMuPDF
+        return map(_processar_documento, ((nome, conteudo, detectores, cache) for nome, conteudo in documentos))
+    # Para o pool os bytes são serializados de qualquer forma; memoryview não é picklable
+    tarefas = [(nome, bytes(conteudo) if isinstance(conteudo, memoryview) else conteudo, detectores, cache)
+               for nome, conteudo in documentos]
+    return pool.map(_processar_documento, tarefas, chunksize=chunksize)
+
+
+def _resultados(documentos, detectores, pool, cache, chunksize, lote):
+    """
+    Gera ((nome, bytes), hash, (cabecalho, [achados de cada detector])) na ordem de
+    entrada, com no máximo `lote` documentos em memória por vez.
+    """
+    documentos = iter(documentos)
+    assinaturas = [assinatura_regras(detector) for detector in detectores] if cache is not None else None
+    while True:
+        bloco = list(islice(documentos, lote))
+        if not bloco:
+            return
+        hashes = [hashlib.sha256(pdf_bytes).hexdigest() for _, pdf_bytes in bloco]
+        if cache is not None:
+            resultados = _resultados_com_cache(bloco, hashes, detectores, assinaturas, pool, cache, chunksize)
+        else:
+            extraidos = _extrair(bloco, detectores, pool, None, chunksize)
+            resultados = [(cabecalho, listas) for _, cabecalho, listas in extraidos]
+        yield from zip(bloco, hashes, resultados)
+
+
+def iterar_resultados(documentos, detectores, pool=None, cache=None, blobs=None, chunksize=4, lote=None):
+    """
+    Gera (nome do arquivo, [registros de cada detector]) a cada laudo concluído, na
+    ordem de entrada, para mostrar os achados enquanto o lote ainda está em andamento.
+    Parar de consumir o gerador (ex.: o usuário cancelou) interrompe o processamento
+    depois do lote em curso; o que já foi extraído fica no cache.
+    """
+    lote = lote or 2 * chunksize * (os.cpu_count() or 1)
+    for (file_name, pdf_bytes), pdf_hash, (cabecalho, listas) in _resultados(documentos, detectores, pool, cache, chunksize, lote):
+        if blobs is not None and any(listas):
+            blobs.guardar(pdf_hash, pdf_bytes)
+        registros = []
+        for achados in listas:
+            registros_detector = []
+            for achado in achados:
+                extras = {k: v for k, v in achado.items() if k not in ("Tamanho", "Sentenca")}
+                registros_detector.append({**cabecalho,
+                                           "Tamanho": achado["Tamanho"],
+                                           "Sentenca": achado["Sentenca"],
+                                           "Arquivo": file_name,
+                                           "pdf_hash": pdf_hash,
+                                           **extras})
+            registros.append(registros_detector)
+        yield file_name, registros
+
+
+def processar_rastreadores(documentos, detectores, pool=None, cache=None, blobs=None, chunksize=4, lote=None):
+    """
+    Como processar_documentos, para vários detectores de uma vez: cada laudo é extraído
+    (texto, OCR, cabeçalho) uma única vez e o texto passa por todos os detectores.
+    Retorna uma tupla (relatório mensal, registros, DataFrame) por detector, na ordem de `detectores`.
+    """
+    relatorios = [{} for _ in detectores]
+    registros = [[] for _ in detectores]
+    for _, registros_laudo in iterar_resultados(documentos, detectores, pool, cache, blobs, chunksize, lote):
+        for registros_detector, relatorio_mensal, lista_registros in zip(registros_laudo, relatorios, registros):
+            if not registros_detector:
+                continue
+            cabecalho = registros_detector[0]
+            relatorio_mensal.setdefault(_chave_mes(cabecalho["Data do Exame"]), set()).add(cabecalho["Paciente"])
+            lista_registros.extend(registros_detector)
+    saida = []
+    for relatorio_mensal, lista_registros in zip(relatorios, registros):
+        relatorio_mensal = {key: len(pacientes) for key, pacientes in relatorio_mensal.items()}
+        pacientes_minerados_df = pd.DataFrame(lista_registros)
+        if not pacientes_minerados_df.empty:
+            pacientes_minerados_df = deduplicar_pacientes(pacientes_minerados_df)
+        saida.append((relatorio_mensal, lista_registros, pacientes_minerados_df))
+    return saida
+
+
+def processar_documentos(documentos, detector, pool=None, cache=None, blobs=None, chunksize=4, lote=None):
+    """
+    Processa (nome do arquivo, bytes do laudo) de `documentos` (lista ou gerador, ex.:
+    iterar_documentos_zip; PDF, TXT, HTML ou DOCX, conforme a extensão do nome) com
+    `detector` (ver miner_trackers) e retorna o relatório mensal, a lista de registros
+    e o DataFrame de pacientes minerados. Sem `pool`, roda no
+    processo atual; com `cache` (MinerCache), só extrai os laudos ainda não vistos.
+    Os registros levam o SHA-256 do arquivo ("pdf_hash"), não os bytes; com `blobs`
+    (BlobStore), os arquivos com achados são gravados em disco para download.
+    """
+    return processar_rastreadores(documentos, [detector], pool, cache, blobs, chunksize, lote)[0]
@@ -0,0 +1,102 @@
+import calendar
+from string import Template
+
+import pandas as pd
+
+# -------------------------------
+# Relatórios mensal/diário dos pacientes minerados.
+# A "Data do Exame" (dd/mm/aaaa) é convertida uma vez em colunas inteiras (ano, mes, dia)
+# e as contagens de pacientes distintos saem de um groupby/nunique; o HTML é montado
+# a partir dos templates abaixo.
+# -------------------------------
+_ITEM_MENSAL = Template("- <span style='color: $cor; font-size: 20px;'>$nome_mes/$ano</span>: $pacientes paciente(s)<br>")
+_TABELA_DIARIA = Template(
+    "<h4 style='color: cyan;'>$nome_mes/$ano</h4>"
+    "<table style='width: 50%; border-collapse: collapse;'>"
+    "<tr>"
+    "<th style='border: 1px solid #ffffff; padding: 4px;'>Dia</th>"
+    "<th style='border: 1px solid #ffffff; padding: 4px;'>Pacientes</th>"
+    "</tr>"
+    "$linhas"
+    "</table><br>"
+)
+_LINHA_DIARIA = Template(
+    "<tr>"
+    "<td style='border: 1px solid #ffffff; padding: 4px;'>$dia</td>"
+    "<td style='border: 1px solid #ffffff; padding: 4px;'>$pacientes</td>"
+    "</tr>"
+)
+
+
+def _nome_mes(mes):
+    return calendar.month_name[mes] if 1 <= mes <= 12 else "Desconhecido"
+
+
+def datas_exame(pacientes_df):
+    """
+    "Data do Exame" em colunas Int64 ano/mes/dia (nulas onde a parte não é um número)
+    e a coluna booleana completa (data com três partes).
+    """
+    partes = pacientes_df["Data do Exame"].astype(str).str.split("/")
+    completa = partes.str.len() == 3
+    datas = pd.DataFrame({"completa": completa}, index=pacientes_df.index)
+    for posicao, coluna in enumerate(("dia", "mes", "ano")):
+        datas[coluna] = pd.to_numeric(partes.str[posicao].where(completa), errors="coerce").astype("Int64")
+    return datas
+
+
+def contar_pacientes(pacientes_df):
+    """
+    Pacientes distintos por mês ({(ano, mes): n}; datas inválidas em (0, 0)) e por dia
+    (DataFrame ano/mes/dia/pacientes, só datas com três partes), com uma única leitura das datas.
+    """
+    datas = datas_exame(pacientes_df)
+    pacientes = pacientes_df["Paciente"]
+
+    mes_valido = datas["ano"].notna() & datas["mes"].notna()
+    mensal = (
+        pd.DataFrame({
+            "ano": datas["ano"].where(mes_valido, 0).fillna(0),
+            "mes": datas["mes"].where(mes_valido, 0).fillna(0),
+            "Paciente": pacientes,
+        })
+        .groupby(["ano", "mes"])["Paciente"].nunique()
+    )
+    relatorio_mensal = {(int(ano), int(mes)): int(n) for (ano, mes), n in mensal.items()}
+
+    completas = datas["completa"]
+    diario = (
+        pd.DataFrame({
+            "ano": datas.loc[completas, "ano"].fillna(0),
+            "mes": datas.loc[completas, "mes"].fillna(0),
+            "dia": datas.loc[completas, "dia"].fillna(0),
+            "Paciente": pacientes[completas],
+        })
+        .groupby(["ano", "mes", "dia"])["Paciente"].nunique()
+        .rename("pacientes")
+        .reset_index()
+    )
+    return relatorio_mensal, diario
+
+
+def html_mensal(relatorio_mensal, titulo, cor):
+    itens = "".join(
+        _ITEM_MENSAL.substitute(cor=cor, nome_mes=_nome_mes(mes), ano=ano, pacientes=relatorio_mensal[(ano, mes)])
+        for ano, mes in sorted(relatorio_mensal)
+    )
+    return f"{titulo}{itens}<br>Dados dos pacientes minerados:<br>"
+
+
+def html_diario(diario):
+    tabelas = "".join(
+        _TABELA_DIARIA.substitute(
+            nome_mes=_nome_mes(mes),
+            ano=ano,
+            linhas="".join(
+                _LINHA_DIARIA.substitute(dia=f"{dia:02d}", pacientes=n)
+                for dia, n in zip(dias["dia"], dias["pacientes"])
+            ),
+        )
+        for (ano, mes), dias in diario.groupby(["ano", "mes"], sort=True)
+    )
+    return f"<h3>Pacientes minerados por dia</h3>{tabelas}"
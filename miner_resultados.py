@@ -0,0 +1,113 @@
+import sqlite3
+from contextlib import contextmanager
+
+import pandas as pd
+
+from local_store import data_path
+
+# -------------------------------
+# Pacientes minerados acumulados entre sessões e reinícios do servidor.
+# Uma tabela por rastreador com chave única (Paciente, Same); cada lote novo é gravado
+# com upsert, que aplica a mesma regra da deduplicação em memória: o registro com
+# medida prevalece sobre o "Não informado", e entre dois iguais fica o mais antigo.
+# -------------------------------
+RESULTADOS_PATH = data_path("miner_resultados.sqlite")
+
+CHAVE = ("Paciente", "Same")
+
+
+def _nome(identificador):
+    return '"' + identificador.replace('"', '""') + '"'
+
+
+def _tem_medida(tamanho):
+    return 0 if str(tamanho).strip().lower() == "não informado" else 1
+
+
+class ResultadosStore:
+    def __init__(self, rastreador, colunas, path=RESULTADOS_PATH):
+        """
+        `rastreador`: nome do detector (ex.: detectar_calculos.__name__);
+        `colunas`: colunas iniciais da tabela (outras são criadas quando aparecem).
+        """
+        self.path = path
+        self.tabela = _nome(f"pacientes_{rastreador}")
+        with self._conectar() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            definicoes = ", ".join(f"{_nome(coluna)} TEXT" for coluna in colunas)
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.tabela} ({definicoes}, tem_medida INTEGER NOT NULL, "
+                f"PRIMARY KEY ({', '.join(map(_nome, CHAVE))}))"
+            )
+            self._garantir_colunas(conn, colunas)
+
+    @contextmanager
+    def _conectar(self):
+        # Uma conexão por operação: o Streamlit chama de threads diferentes
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _colunas(self, conn):
+        return [linha[1] for linha in conn.execute(f"PRAGMA table_info({self.tabela})") if linha[1] != "tem_medida"]
+
+    def _garantir_colunas(self, conn, colunas):
+        existentes = set(self._colunas(conn))
+        for coluna in colunas:
+            if coluna not in existentes:
+                conn.execute(f"ALTER TABLE {self.tabela} ADD COLUMN {_nome(coluna)} TEXT")
+
+    def adicionar(self, pacientes_df):
+        """
+        Grava os registros de um lote (upsert por Paciente/Same); custa O(lote),
+        independentemente de quantos pacientes já estão acumulados.
+        """
+        if pacientes_df.empty:
+            return
+        colunas = list(pacientes_df.columns)
+        nomes = ", ".join(map(_nome, colunas))
+        atualizacoes = ", ".join(f"{_nome(c)} = excluded.{_nome(c)}" for c in colunas if c not in CHAVE)
+        sql = (
+            f"INSERT INTO {self.tabela} ({nomes}, tem_medida) VALUES ({', '.join('?' * (len(colunas) + 1))}) "
+            f"ON CONFLICT ({', '.join(map(_nome, CHAVE))}) DO UPDATE SET {atualizacoes}, tem_medida = excluded.tem_medida "
+            f"WHERE excluded.tem_medida > {self.tabela}.tem_medida"
+        )
+        valores = pacientes_df.astype(object).where(pacientes_df.notna(), None)
+        linhas = [
+            (*registro, _tem_medida(tamanho))
+            for registro, tamanho in zip(valores.itertuples(index=False, name=None), pacientes_df["Tamanho"])
+        ]
+        with self._conectar() as conn:
+            self._garantir_colunas(conn, colunas)
+            conn.executemany(sql, linhas)
+
+    def atualizar(self, pacientes_df, colunas):
+        """
+        Regrava `colunas` (ex.: ["Convenio"] após a correlação) dos registros de
+        `pacientes_df` já gravados.
+        """
+        atribuicoes = ", ".join(f"{_nome(c)} = ?" for c in colunas)
+        condicao = " AND ".join(f"{_nome(c)} = ?" for c in CHAVE)
+        valores = pacientes_df[list(colunas) + list(CHAVE)].astype(object)
+        valores = valores.where(valores.notna(), None)
+        with self._conectar() as conn:
+            self._garantir_colunas(conn, colunas)
+            conn.executemany(
+                f"UPDATE {self.tabela} SET {atribuicoes} WHERE {condicao}",
+                list(valores.itertuples(index=False, name=None))
+            )
+
+    def carregar(self):
+        """
+        Todos os pacientes acumulados, os com medida primeiro.
+        """
+        with self._conectar() as conn:
+            nomes = ", ".join(map(_nome, self._colunas(conn)))
+            return pd.read_sql_query(f"SELECT {nomes} FROM {self.tabela} ORDER BY tem_medida DESC, rowid", conn)
+
+    def limpar(self):
+        with self._conectar() as conn:
+            conn.execute(f"DELETE FROM {self.tabela}")
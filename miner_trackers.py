@@ -0,0 +1,258 @@
+import codecs
+import hashlib
+import inspect
+import re
+import unicodedata
+
+from miner_extraction import regex_fim_sentenca
+
+# -------------------------------
+# Regras de detecção de achados por rastreador.
+# Cada detector recebe o texto completo do laudo e devolve uma lista de achados
+# (dicts com "Tamanho", "Sentenca" e os campos extras do rastreador).
+# Os rastreadores são registrados em RASTREADORES (ver Rastreador, no fim do arquivo);
+# um rastreador novo (ex.: fígado, adrenal) declara o gatilho, as regras e as colunas
+# extras em um módulo próprio e chama registrar().
+# -------------------------------
+regex_tamanho = re.compile(r"\b\d+[.,]?\d*\s?(?:mm|cm)\b", re.IGNORECASE)
+regex_sem = re.compile(r"\bsem\b", re.IGNORECASE)
+regex_negacao = re.compile(r"\b(não\s+há|não\s+apresenta|não\s+possui|nenhum)\b", re.IGNORECASE)
+
+# Pré-filtro: cada rastreador tem um "gatilho" que roda uma única vez sobre o texto
+# dobrado (minúsculas, sem acentos); só as sentenças com gatilho passam pelas regras.
+# A dobra é feita em bytes latin-1 (um byte por caractere; fora do latin-1 vira "?",
+# ou espaço se for um espaço Unicode), então as posições no texto dobrado valem para
+# o texto original. O \s de um gatilho em bytes só casa espaços ASCII: onde a regra
+# principal aceita \s, o gatilho usa _ESPACO_DOBRADO (inclui NBSP, \x85 e \x1c-\x1f).
+_DOBRA = bytes(
+    ord(unicodedata.normalize("NFD", chr(i))[0].lower()) if chr(i).isalpha() and i >= 0x41 else i
+    for i in range(256)
+)
+_ESPACOS = re.compile(r"\s+")
+_ESPACO_DOBRADO = rb"[\s\x1c-\x1f\x85\xa0]"
+codecs.register_error(
+    "dobra_espacos", lambda erro: (" " if erro.object[erro.start].isspace() else "?", erro.start + 1)
+)
+
+
+def assinatura_regras(detector):
+    """
+    SHA-256 das regras de um detector: o código dele e de cada função/regex do
+    módulo que ele usa (recursivamente). Muda quando qualquer regra muda, o que
+    invalida os achados em cache desse rastreador (e só dele).
+    """
+    partes = []
+    vistos = set()
+    pendentes = [detector]
+    while pendentes:
+        objeto = pendentes.pop()
+        if id(objeto) in vistos:
+            continue
+        vistos.add(id(objeto))
+        if isinstance(objeto, re.Pattern):
+            partes.append(f"{objeto.pattern}|{objeto.flags}")
+        elif inspect.isfunction(objeto):
+            partes.append(inspect.getsource(objeto))
+            pendentes.extend(
+                objeto.__globals__[nome] for nome in objeto.__code__.co_names
+                if nome in objeto.__globals__
+                and (isinstance(objeto.__globals__[nome], re.Pattern) or inspect.isfunction(objeto.__globals__[nome]))
+            )
+    return hashlib.sha256("\n".join(sorted(partes)).encode("utf-8")).hexdigest()
+
+
+def dobrar(texto):
+    return texto.encode("latin-1", "dobra_espacos").translate(_DOBRA)
+
+
+def _inicio_sentenca(texto_completo, posicao):
+    # Volta até o último [.!?] seguido de espaço: a sentença começa depois dos espaços
+    fim = posicao
+    while True:
+        ponto = max(texto_completo.rfind(c, 0, fim) for c in ".!?")
+        if ponto < 0:
+            return 0
+        espacos = _ESPACOS.match(texto_completo, ponto + 1)
+        if espacos:
+            return espacos.end()
+        fim = ponto
+
+
+def sentencas_candidatas(texto_completo, gatilho):
+    """
+    Sentenças de dividir_sentencas(texto_completo) que contêm o `gatilho`, na ordem e
+    sem repetição, sem dividir o texto inteiro. O `gatilho` deve casar, no texto
+    dobrado, tudo o que a regra principal do rastreador casa no original.
+    """
+    sentencas = []
+    fim = -1
+    for match in gatilho.finditer(dobrar(texto_completo)):
+        posicao = match.start()
+        if posicao < fim:
+            continue
+        proximo = regex_fim_sentenca.search(texto_completo, posicao)
+        fim = proximo.start() if proximo else len(texto_completo)
+        sentencas.append(texto_completo[_inicio_sentenca(texto_completo, posicao):fim])
+    return sentencas
+
+
+def extrair_tamanho(sentenca):
+    tamanho_match = regex_tamanho.search(sentenca)
+    return tamanho_match.group(0) if tamanho_match else "Não informado"
+
+
+def tamanho_mm(tamanho):
+    """
+    Converte uma medida como "1,2 cm" ou "8mm" em milímetros; None se não houver número.
+    """
+    numero = re.match(r"\s*(\d+(?:[.,]\d*)?)", tamanho or "")
+    if not numero:
+        return None
+    valor = float(numero.group(1).replace(",", ".").rstrip("."))
+    return valor * 10 if tamanho.strip().lower().endswith("cm") else valor
+
+
+def maior_tamanho_mm(sentenca):
+    """
+    Maior medida (em mm) citada na sentença, ou None.
+    """
+    return max((tamanho_mm(m.group(0)) for m in regex_tamanho.finditer(sentenca)), default=None)
+
+
+# -------------------------------
+# CÁLCULO RENAL (kidney.py)
+# -------------------------------
+regex_calculo = re.compile(r"c\s*[áa]\s*l\s*[cç]\s*[úu]\s*l\s*[oa]s?", re.IGNORECASE)
+regex_contexto_renal = re.compile(
+    r"\b(?:renal(?:es)?|caliciano(?:s)?|calicinal(?:s)?|ureter(?:es)?|ureteral(?:ais))\b", re.IGNORECASE
+)
+gatilho_calculo = re.compile((_ESPACO_DOBRADO + b"*").join([b"c", b"a", b"l", b"c", b"u", b"l", b"[oa]"]))
+
+
+def highlight_calculo(sentence):
+    """
+    Recebe uma frase e retorna a mesma frase com todas as ocorrências
+    do termo 'calculo' (considerando variações com acentuação e espaçamentos)
+    envolvidas em uma tag <span> com fundo verde.
+    """
+    return regex_calculo.sub(r"<span style='background-color: green;'>\g<0></span>", sentence)
+
+
+def detectar_calculos(texto_completo):
+    achados = []
+    for sentenca in sentencas_candidatas(texto_completo, gatilho_calculo):
+        sentenca = sentenca.replace('\n', ' ').replace('\r', ' ').strip()
+        # Verifica se a sentença contém o termo "calculo"
+        if not regex_calculo.search(sentenca):
+            continue
+        # Exclui se a sentença conter "sem" ou indicar negação (ex.: "não há", "não apresenta", etc.)
+        if regex_sem.search(sentenca) or regex_negacao.search(sentenca):
+            continue
+        # Verifica se a sentença contém alguma das palavras obrigatórias
+        if not regex_contexto_renal.search(sentenca):
+            continue
+        achados.append({
+            "Tamanho": extrair_tamanho(sentenca),
+            "Sentenca": highlight_calculo(sentenca),
+        })
+    return achados
+
+
+# -------------------------------
+# NÓDULO PULMONAR (lung.py)
+# -------------------------------
+regex_nodulo = re.compile(r"n[oó]dulo[s]?", re.IGNORECASE)
+gatilho_nodulo = re.compile(rb"nodulo")
+regex_context = re.compile(r"\b(pulmão|pulmões|lobo|lobos)\b", re.IGNORECASE)
+regex_contorno = re.compile(r"\bcontorno[s]?\b\s+(\w+)", re.IGNORECASE)
+regex_calc = re.compile(r"\b(c[áa]lcificad[o]s?|c[áa]lcic[óo]s?)\b", re.IGNORECASE)
+regex_calc_exceptions = re.compile(r"\b(sem calcifica[cç][ãa]o|não calcificado|parcialmente calcificado)\b", re.IGNORECASE)
+regex_exclude = re.compile(r"\b(tire[oó]ide|f[ií]gado|rins?|ba[çc]o)\b", re.IGNORECASE)
+regex_contorno_keywords = re.compile(r"\b(lobulad[oó]s?|bocelad[oó]s?|irregular[es]?)\b", re.IGNORECASE)
+# Expressões para extração de "Localização" e "Densidade"
+regex_localizacao = re.compile(r"\b(lobo superior|segmento superior)\b", re.IGNORECASE)
+regex_contorno_destaque = re.compile(r"(\bcontorno[s]?\b)\s+(\w+)", re.IGNORECASE)
+regex_densidade = re.compile(
+    r"\b(s[óo]lido[s]?|semi-?s[óo]lido[s]?|semisolido[s]?|vidro\s*fosco|subs[óo]lido[s]?|partes?\s*moles?)\b",
+    re.IGNORECASE
+)
+
+
+def highlight_nodulo(sentence):
+    return regex_nodulo.sub(r"<span style='background-color: green;'>\g<0></span>", sentence)
+
+
+def highlight_contorno(sentence):
+    def repl(match):
+        return f"{match.group(1)} <span style='background-color: green;'>{match.group(2)}</span>"
+    return regex_contorno_destaque.sub(repl, sentence)
+
+
+def detectar_nodulos(texto_completo):
+    achados = []
+    for sentenca in sentencas_candidatas(texto_completo, gatilho_nodulo):
+        # Seleciona sentenças que contenham "nódulo" e contexto obrigatório
+        if not (regex_nodulo.search(sentenca) and regex_context.search(sentenca)):
+            continue
+        if regex_sem.search(sentenca) or regex_negacao.search(sentenca):
+            continue
+        if regex_exclude.search(sentenca):
+            continue
+        if regex_calc.search(sentenca) and not regex_calc_exceptions.search(sentenca):
+            continue
+        # Extrai contornos: via "contorno(s)" ou pelas palavras-chave
+        contorno_match = regex_contorno.search(sentenca)
+        if contorno_match:
+            contorno_word = contorno_match.group(1)
+            sentenca = highlight_contorno(sentenca)
+        else:
+            keyword_match = regex_contorno_keywords.search(sentenca)
+            contorno_word = keyword_match.group(0) if keyword_match else "Não informado"
+        # Extrai localização e densidade, se houver
+        match_localizacao = regex_localizacao.search(sentenca)
+        localizacao = match_localizacao.group(0) if match_localizacao else "Não informado"
+        match_densidade = regex_densidade.search(sentenca)
+        densidade = match_densidade.group(0) if match_densidade else "Não informado"
+        achados.append({
+            "Tamanho": extrair_tamanho(sentenca),
+            "Sentenca": highlight_nodulo(sentenca),
+            "Contornos": contorno_word,
+            "Localização": localizacao,
+            "Densidade": densidade,
+            "Convenio": "",  # Inicialmente vazio
+        })
+    return achados
+
+
+# -------------------------------
+# REGISTRO DOS RASTREADORES
+# -------------------------------
+COLUNAS_CABECALHO = ["Paciente", "Idade", "Same", "Data do Exame"]
+
+
+class Rastreador:
+    """
+    `detector`: texto do laudo -> lista de achados (o nome da função identifica o
+    rastreador no cache); `colunas`: campos extras dos achados além de "Tamanho" e "Sentenca".
+    """
+
+    def __init__(self, nome, detector, colunas=()):
+        self.nome = nome
+        self.detector = detector
+        self.colunas = list(colunas)
+
+    def colunas_saida(self):
+        # Mesma ordem dos registros de miner_pool.processar_documentos
+        return [*COLUNAS_CABECALHO, "Tamanho", "Sentenca", "Arquivo", "pdf_hash", *self.colunas]
+
+
+RASTREADORES = {}
+
+
+def registrar(rastreador):
+    RASTREADORES[rastreador.nome] = rastreador
+    return rastreador
+
+
+registrar(Rastreador("kidney", detectar_calculos))
+registrar(Rastreador("lung", detectar_nodulos, ["Contornos", "Localização", "Densidade", "Convenio"]))
@@ -3,6 +3,7 @@ import pandas as pd
 import requests
 from PIL import Image
 from io import BytesIO
+from doctor_registry import DoctorRegistry
 
 # Função para carregar o logo via URL com cache
 @st.cache_data(show_spinner=False)
@@ -13,6 +14,11 @@ def load_logo(logo_url):
     else:
         return None
 
+# Registro canônico de médicos (um DOCTOR_ID por pessoa), compartilhado entre sessões
+@st.cache_resource
+def load_doctor_registry():
+    return DoctorRegistry()
+
 # Função para carregar o arquivo Excel via URL com cache
 @st.cache_data(show_spinner=False)
 def load_excel_data(xlsx_url):
@@ -73,6 +79,12 @@ def load_data():
 
 df = load_data()
 
+# Usa o nome canônico do registro para as grafias que ele já conhece (sem cadastrar nem
+# fundir nomes: o registro define os DOCTOR_IDs da folha do PRODMED); as demais ficam
+# com o nome normalizado
+doctor_registry = load_doctor_registry()
+df["MEDICO_SOLICITANTE"] = doctor_registry.display_names(df["MEDICO_SOLICITANTE"])
+
 # Filtrar somente os exames externos
 df = df[df["TIPO_ATENDIMENTO"] == "Externo"]
 
@@ -103,8 +115,9 @@ if df.empty:
 
 # Filtro de médico (após os filtros anteriores)
 excluir_medicos = ["HENRIQUE ARUME GUENKA", "MARCELO JACOBINA DE ABREU"]
-medicos = [m for m in df["MEDICO_SOLICITANTE"].dropna().unique() if m not in excluir_medicos]
-medico_selecionado = st.sidebar.selectbox("Selecione o médico:", medicos)
+excluir_nomes = doctor_registry.display_names(pd.Series(excluir_medicos)).tolist()
+medicos = df.loc[~df["MEDICO_SOLICITANTE"].isin(excluir_nomes), "MEDICO_SOLICITANTE"].dropna().unique()
+medico_selecionado = st.sidebar.selectbox("Selecione o médico:", medicos.tolist())
 
 # Dados filtrados
 df_medico = df[df["MEDICO_SOLICITANTE"] == medico_selecionado]
@@ -129,17 +142,14 @@ with tab1:
         procedimento_counts.columns = ["DESCRICAO_PROCEDIMENTO", "QUANTITATIVO"]
         st.dataframe(procedimento_counts)
 
-excluir_medicos = ["HENRIQUE ARUME GUENKA", "MARCELO JACOBINA DE ABREU"]
-
-
 with tab2:
     st.header("Top 10 Médicos Prescritores")
-    top_medicos = df["MEDICO_SOLICITANTE"].value_counts().drop(labels=excluir_medicos, errors='ignore').head(10)
+    top_medicos = df["MEDICO_SOLICITANTE"].value_counts().drop(labels=excluir_nomes, errors='ignore').head(10)
     st.bar_chart(top_medicos)
     
     st.header("Top 10 Médicos Prescritores de RM")
     df_rm = df[df["MODALIDADE"].str.contains("MR", case=False, na=False)]
-    top_medicos_rm = df_rm["MEDICO_SOLICITANTE"].value_counts().drop(labels=excluir_medicos, errors="ignore").head(10)
+    top_medicos_rm = df_rm["MEDICO_SOLICITANTE"].value_counts().drop(labels=excluir_nomes, errors="ignore").head(10)
     st.bar_chart(top_medicos_rm)
     
     # Converte a Series em DataFrame e define as colunas
@@ -161,7 +171,7 @@ with tab2:
 
     st.header("Top 10 Médicos Prescritores de TC")
     df_tc = df[df["MODALIDADE"].str.contains("CT", case=False, na=False)]
-    top_medicos_tc = df_tc["MEDICO_SOLICITANTE"].value_counts().drop(labels=excluir_medicos, errors="ignore").head(10)
+    top_medicos_tc = df_tc["MEDICO_SOLICITANTE"].value_counts().drop(labels=excluir_nomes, errors="ignore").head(10)
     st.bar_chart(top_medicos_tc)
 
     # Converte a Series em DataFrame e define as colunas
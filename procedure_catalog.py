@@ -0,0 +1,146 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process
+
+from local_store import data_path
+
+# -----------------------------
+# Procedure catalog (multipliers.csv) with integer PROCEDURE_IDs
+# -----------------------------
+MAPPING_PATH = data_path("procedure_mapping.csv")
+MAPPING_COLUMNS = ["DESCRICAO_PROCEDIMENTO", "CATALOG_DESCRICAO", "MATCH", "SCORE"]
+
+# Minimum token_sort_ratio for a description to be matched to a catalog entry
+FUZZY_THRESHOLD = 92
+
+# PROCEDURE_ID of descriptions without a catalog entry (worth 0 points)
+UNMATCHED_ID = -1
+
+
+def normalize_descriptions(descriptions: pd.Series) -> pd.Series:
+    """
+    Folds accents, case, punctuation and spacing so that equivalent spellings of a
+    procedure compare equal. Runs once per distinct value.
+    """
+    descriptions = descriptions.fillna("").astype(str)
+    uniques = pd.Series(descriptions.unique())
+    folded = (
+        uniques
+        .str.normalize("NFKD")
+        .str.encode("ascii", errors="ignore")
+        .str.decode("ascii")
+        .str.upper()
+        .str.replace(r"[^A-Z0-9 ]", " ", regex=True)
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+    )
+    return descriptions.map(dict(zip(uniques, folded)))
+
+
+class ProcedureCatalog:
+    """
+    multipliers.csv as an indexed catalog (PROCEDURE_ID = row position) plus a persisted,
+    reviewable mapping from every description seen in the exams base to a catalog entry.
+    New descriptions are matched once (exact after normalization, then fuzzy) and saved;
+    a reviewer can edit CATALOG_DESCRICAO in the mapping file or set MATCH to "rejected".
+    """
+
+    def __init__(self, csv_df, path=MAPPING_PATH, threshold=FUZZY_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self._lock = threading.Lock()
+
+        catalog = csv_df.drop_duplicates("DESCRICAO_PROCEDIMENTO").reset_index(drop=True)
+        self.descriptions = pd.Index(catalog["DESCRICAO_PROCEDIMENTO"])
+        self.multipliers = pd.to_numeric(catalog["MULTIPLIER"], errors="coerce").fillna(0).to_numpy(dtype=np.float64)
+        # Extra trailing 0 so that UNMATCHED_ID (-1) takes 0 points in np.take
+        self._points_lookup = np.append(self.multipliers, 0.0)
+
+        normalized = normalize_descriptions(catalog["DESCRICAO_PROCEDIMENTO"])
+        self._normalized_to_id = dict(zip(normalized[::-1], catalog.index[::-1]))
+        self._normalized_catalog = list(self._normalized_to_id)
+
+        if os.path.exists(path):
+            table = pd.read_csv(path, dtype={"DESCRICAO_PROCEDIMENTO": str, "CATALOG_DESCRICAO": str, "MATCH": str})
+        else:
+            table = pd.DataFrame(columns=MAPPING_COLUMNS)
+        self.mapping = {}
+        # Descriptions matched against this catalog instance; saved "unmatched" entries
+        # are retried once per instance, in case multipliers.csv gained the procedure
+        self._checked = set()
+        for description, catalog_description, match, score in table[MAPPING_COLUMNS].itertuples(index=False):
+            # Entries pointing at a procedure no longer in the catalog are matched again
+            if match == "rejected":
+                self.mapping[description] = (None, match, score)
+            elif catalog_description in self.descriptions:
+                self.mapping[description] = (catalog_description, match, score)
+
+    def _match(self, description):
+        normalized = normalize_descriptions(pd.Series([description])).iloc[0]
+        catalog_id = self._normalized_to_id.get(normalized)
+        if catalog_id is not None:
+            return self.descriptions[catalog_id], "exact", 100.0
+        match = process.extractOne(
+            normalized, self._normalized_catalog, scorer=fuzz.token_sort_ratio, score_cutoff=self.threshold
+        )
+        if match:
+            return self.descriptions[self._normalized_to_id[match[0]]], "fuzzy", round(match[1], 1)
+        return None, "unmatched", np.nan
+
+    def codes(self, descriptions: pd.Series) -> np.ndarray:
+        """
+        int32 PROCEDURE_ID for each description (UNMATCHED_ID when there is no catalog entry).
+        """
+        descriptions = descriptions.fillna("").astype(str)
+        uniques = descriptions.unique()
+        unseen = [
+            d for d in uniques
+            if d not in self.mapping or (self.mapping[d][1] == "unmatched" and d not in self._checked)
+        ]
+        if unseen:
+            with self._lock:
+                changed = False
+                for description in unseen:
+                    previous = self.mapping.get(description)
+                    self.mapping[description] = self._match(description)
+                    self._checked.add(description)
+                    changed = changed or previous != self.mapping[description]
+                if changed:
+                    self.save()
+        unique_ids = self.descriptions.get_indexer([self.mapping[d][0] for d in uniques])
+        return unique_ids.astype(np.int32)[pd.Index(uniques).get_indexer(descriptions)]
+
+    def points(self, codes: np.ndarray) -> np.ndarray:
+        """
+        Multiplier (points per exam) for each PROCEDURE_ID.
+        """
+        return np.take(self._points_lookup, codes)
+
+    def mapping_table(self):
+        """
+        The full description -> catalog mapping, for review.
+        """
+        return pd.DataFrame(
+            [(description, *entry) for description, entry in self.mapping.items()],
+            columns=MAPPING_COLUMNS
+        ).sort_values(["MATCH", "DESCRICAO_PROCEDIMENTO"])
+
+    def unmatched(self, exams_df):
+        """
+        Descriptions in `exams_df` (with PROCEDURE_ID) that have no catalog entry,
+        with their exam counts, most frequent first.
+        """
+        unmatched_df = exams_df[exams_df["PROCEDURE_ID"] == UNMATCHED_ID]
+        return (
+            unmatched_df.groupby("DESCRICAO_PROCEDIMENTO").size()
+            .reset_index(name="COUNT")
+            .sort_values("COUNT", ascending=False)
+        )
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        self.mapping_table().to_csv(tmp_path, index=False)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,122 @@
+import argparse
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import pandas as pd
+import requests
+
+from doctor_registry import DoctorRegistry
+from procedure_catalog import ProcedureCatalog
+from prodmed_data import (
+    CSV_URL, XLSX_URL, month_names,
+    month_doctor_reports, prepare_exams, prepare_multipliers
+)
+from prodmed_payments import PaymentStore
+from prodmed_report import build_doctor_report, report_file_name
+
+# -----------------------------------------------------------------------------
+# Month-end batch: every doctor's production PDF, rendered in a process pool
+# -----------------------------------------------------------------------------
+
+
+def _render_report(task):
+    report, month_label, selected_year = task
+    pdf_bytes = build_doctor_report(report, month_label, selected_year)
+    return report_file_name(report['doctor'], month_label, selected_year), pdf_bytes
+
+
+def build_reports_zip(reports, month_label, selected_year, max_workers=None, progress=None):
+    """
+    Renders one PDF per entry of `reports` (see prodmed_data.month_doctor_reports)
+    in parallel and returns a ZIP archive with all of them, built in memory.
+    `progress(done, total)` is called as reports complete; an exception raised
+    from it stops the batch.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    tasks = [(report, month_label, selected_year) for report in reports]
+    zip_buffer = BytesIO()
+    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            try:
+                for done, (file_name, pdf_bytes) in enumerate(pool.map(_render_report, tasks), start=1):
+                    zf.writestr(file_name, pdf_bytes)
+                    if progress:
+                        progress(done, len(tasks))
+            except BaseException:
+                # progress() may raise to abort (e.g. a cancelled job): drop the reports not started yet
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+    return zip_buffer.getvalue()
+
+
+def _parse_month(value):
+    if value.isdigit():
+        return int(value)
+    return month_names.index(value.upper()) + 1
+
+
+def load_month_reports(selected_month, selected_year):
+    """
+    Downloads the exams base, multipliers and payments and returns the month's
+    month_doctor_reports, the same data the dashboard shows for that month.
+    """
+    # Same SQLite registry as the dashboard and the other workers, so DOCTOR_IDs agree
+    doctor_registry = DoctorRegistry()
+    procedure_catalog = ProcedureCatalog(prepare_multipliers(pd.read_csv(BytesIO(requests.get(CSV_URL).content))))
+    excel_df = prepare_exams(pd.read_excel(BytesIO(requests.get(XLSX_URL).content)), doctor_registry, procedure_catalog)
+    payment_data = PaymentStore(doctor_registry).month(selected_month, selected_year)
+
+    filtered_df = excel_df[(excel_df['MONTH'] == selected_month) & (excel_df['YEAR'] == selected_year)]
+    return month_doctor_reports(filtered_df, payment_data, doctor_registry)
+
+
+def reports_zip_name(month_label, selected_year):
+    return f"Relatorios_Producao_{month_label}_{selected_year}.zip"
+
+
+def run_reports_job(params, job):
+    """
+    job_worker handler: params {"month": 1-12, "year": ...}. Writes the month's ZIP
+    to the job's result folder and returns (summary, path).
+    """
+    selected_month, selected_year = params["month"], params["year"]
+    month_label = month_names[selected_month - 1]
+    job.progress(0.0, "Loading exams and payments")
+    reports = load_month_reports(selected_month, selected_year)
+
+    def progress(done, total):
+        job.progress(done / total, f"{done}/{total} reports")
+
+    zip_bytes = build_reports_zip(reports, month_label, selected_year, job.cpus, progress)
+    output = job.result_path(reports_zip_name(month_label, selected_year))
+    with open(output, "wb") as f:
+        f.write(zip_bytes)
+    return {"reports": len(reports)}, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate every doctor's production PDF for one month as a ZIP.")
+    parser.add_argument("--month", required=True, help="Month number (1-12) or English name, e.g. MARCH")
+    parser.add_argument("--year", required=True, type=int)
+    parser.add_argument("--output", default=None, help="ZIP path (default: Relatorios_Producao_<MONTH>_<YEAR>.zip)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    args = parser.parse_args()
+
+    selected_month = _parse_month(args.month)
+    month_label = month_names[selected_month - 1]
+    output = args.output or reports_zip_name(month_label, args.year)
+    reports = load_month_reports(selected_month, args.year)
+
+    def progress(done, total):
+        print(f"\r{done}/{total} reports", end="", flush=True)
+
+    zip_bytes = build_reports_zip(reports, month_label, args.year, args.workers, progress)
+    with open(output, "wb") as f:
+        f.write(zip_bytes)
+    print(f"\nSaved {len(reports)} reports to {output}")
+
+
+if __name__ == "__main__":
+    main()
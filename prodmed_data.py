@@ -0,0 +1,250 @@
+import pandas as pd
+
+# -----------------------------
+# Month data shared by PRODMED.py and the batch report exporter.
+# Nothing here touches Streamlit, so it can run inside worker processes and the CLI.
+# -----------------------------
+XLSX_URL = 'https://raw.githubusercontent.com/haguenka/SLA/main/baseslaM.xlsx'
+CSV_URL = 'https://raw.githubusercontent.com/haguenka/SLA/main/multipliers.csv'
+PAYMENT_URL = 'https://raw.githubusercontent.com/haguenka/SLA/main/pagamento.xlsx'
+LOGO_URL = 'https://raw.githubusercontent.com/haguenka/SLA/main/logo.jpg'
+
+month_names = [
+    "JANUARY", "FEBRUARY", "MARCH", "APRIL", "MAY", "JUNE",
+    "JULY", "AUGUST", "SEPTEMBER", "OCTOBER", "NOVEMBER", "DECEMBER"
+]
+
+day_translations = {
+    'Monday': 'Segunda-feira',
+    'Tuesday': 'Terça-feira',
+    'Wednesday': 'Quarta-feira',
+    'Thursday': 'Quinta-feira',
+    'Friday': 'Sexta-feira',
+    'Saturday': 'Sábado',
+    'Sunday': 'Domingo'
+}
+
+hospital_name_mapping = {
+    "HSC": "Hospital Santa Catarina",
+    "CSSJ": "Casa de Saúde São José",
+    "HNSC": "Hospital Nossa Senhora da Conceição"
+}
+
+# Tomografia & Ressonância are the groups tracked by PERIOD/TARGET_FLAG
+valid_groups = ['GRUPO TOMOGRAFIA', 'GRUPO RESSONÂNCIA MAGNÉTICA']
+period_order = ['Manhã', 'Tarde', 'Noite', 'Madrugada']
+
+
+def assign_period(hour):
+    if 0 <= hour < 7:
+        return 'Madrugada'
+    elif 7 <= hour < 13:
+        return 'Manhã'
+    elif 13 <= hour < 20:
+        return 'Tarde'
+    else:
+        return 'Noite'
+
+
+def assign_target_flag(points):
+    # target range: 22 to 24
+    if points < 22:
+        return "OUT OF TARGET"
+    elif points <= 24:
+        return "ON TARGET"
+    else:
+        return "BONUS"
+
+
+def merge_hospital_names(df, column_name):
+    return df.replace({column_name: hospital_name_mapping})
+
+
+def prepare_exams(excel_df, doctor_registry, procedure_catalog):
+    """
+    One-time preprocessing of baseslaM.xlsx: hospital names, DOCTOR_ID,
+    uppercase procedure descriptions with their catalog PROCEDURE_ID and MULTIPLIER,
+    parsed timestamps and MONTH/YEAR.
+    """
+    excel_df = merge_hospital_names(excel_df, "UNIDADE")
+    excel_df['DOCTOR_ID'] = doctor_registry.resolve(excel_df['MEDICO_LAUDO_DEFINITIVO'])
+    excel_df['DESCRICAO_PROCEDIMENTO'] = excel_df['DESCRICAO_PROCEDIMENTO'].astype(str).str.upper()
+    excel_df['PROCEDURE_ID'] = procedure_catalog.codes(excel_df['DESCRICAO_PROCEDIMENTO'])
+    excel_df['MULTIPLIER'] = procedure_catalog.points(excel_df['PROCEDURE_ID'].to_numpy())
+    excel_df['STATUS_APROVADO'] = pd.to_datetime(excel_df['STATUS_APROVADO'], format='%d-%m-%Y %H:%M', errors='coerce')
+    excel_df['STATUS_PRELIMINAR'] = pd.to_datetime(excel_df['STATUS_PRELIMINAR'], format='%d-%m-%Y %H:%M', errors='coerce')
+    excel_df['MONTH'] = excel_df['STATUS_APROVADO'].dt.month
+    excel_df['YEAR'] = excel_df['STATUS_APROVADO'].dt.year
+    return excel_df
+
+
+def prepare_multipliers(csv_df):
+    # multipliers.csv header carries a BOM and a leading space (" MULTIPLIER")
+    csv_df.columns = csv_df.columns.str.replace('\ufeff', '').str.strip()
+    csv_df['DESCRICAO_PROCEDIMENTO'] = csv_df['DESCRICAO_PROCEDIMENTO'].astype(str).str.upper()
+    return csv_df
+
+
+def _days_grouped(events_df, status_column, doctor_column, count_name):
+    events_df['DAY_OF_WEEK'] = events_df[status_column].dt.day_name().map(day_translations)
+    events_df['DATE'] = events_df[status_column].dt.date.astype(str)
+    events_df['PERIOD'] = events_df[status_column].dt.hour.apply(assign_period)
+    return (
+        events_df
+        .groupby([doctor_column, 'DATE', 'DAY_OF_WEEK', 'PERIOD'], dropna=False)
+        .size()
+        .reset_index(name=count_name)
+        .rename(columns={doctor_column: 'MEDICO'})
+    )
+
+
+def doctor_days(doctor_df, selected_doctor):
+    """
+    LAUDO PRELIMINAR x LAUDO APROVADO per DATE/PERIOD (Tomografia & Ressonância),
+    with APROVADO_POINTS and TARGET_FLAG.
+    """
+    preliminar_filtered = doctor_df[
+        (doctor_df['GRUPO'].isin(valid_groups)) &
+        (doctor_df['STATUS_PRELIMINAR'].notna()) &
+        (doctor_df['MEDICO_LAUDOO_PRELIMINAR'] == selected_doctor)
+    ].copy()
+
+    aprovado_filtered = doctor_df[
+        (doctor_df['GRUPO'].isin(valid_groups)) &
+        (doctor_df['STATUS_APROVADO'].notna()) &
+        (doctor_df['MEDICO_LAUDO_DEFINITIVO'] == selected_doctor)
+    ].copy()
+
+    # --- PRELIMINAR grouping ---
+    if not preliminar_filtered.empty:
+        preliminar_days_grouped = _days_grouped(
+            preliminar_filtered, 'STATUS_PRELIMINAR', 'MEDICO_LAUDOO_PRELIMINAR', 'PRELIMINAR_COUNT'
+        )
+    else:
+        preliminar_days_grouped = pd.DataFrame(columns=['MEDICO', 'DATE', 'DAY_OF_WEEK', 'PERIOD', 'PRELIMINAR_COUNT'])
+
+    # --- APROVADO grouping (counts and points) ---
+    if not aprovado_filtered.empty:
+        aprovado_days_grouped = _days_grouped(
+            aprovado_filtered, 'STATUS_APROVADO', 'MEDICO_LAUDO_DEFINITIVO', 'APROVADO_COUNT'
+        )
+        aprovado_points_grouped = (
+            aprovado_filtered
+            .groupby(['MEDICO_LAUDO_DEFINITIVO', 'DATE', 'DAY_OF_WEEK', 'PERIOD'], dropna=False)['MULTIPLIER']
+            .sum()
+            .reset_index(name='APROVADO_POINTS')
+            .rename(columns={'MEDICO_LAUDO_DEFINITIVO': 'MEDICO'})
+        )
+    else:
+        aprovado_days_grouped = pd.DataFrame(columns=['MEDICO', 'DATE', 'DAY_OF_WEEK', 'PERIOD', 'APROVADO_COUNT'])
+        aprovado_points_grouped = pd.DataFrame(columns=['MEDICO', 'DATE', 'DAY_OF_WEEK', 'PERIOD', 'APROVADO_POINTS'])
+
+    days_merged = (
+        pd.merge(
+            preliminar_days_grouped,
+            aprovado_days_grouped,
+            on=['MEDICO', 'DATE', 'DAY_OF_WEEK', 'PERIOD'],
+            how='outer'
+        )
+        .merge(
+            aprovado_points_grouped,
+            on=['MEDICO', 'DATE', 'DAY_OF_WEEK', 'PERIOD'],
+            how='outer'
+        )
+        .fillna(0)
+    )
+
+    days_merged['PRELIMINAR_COUNT'] = days_merged['PRELIMINAR_COUNT'].astype(int)
+    days_merged['APROVADO_COUNT'] = days_merged['APROVADO_COUNT'].astype(int)
+    days_merged['APROVADO_POINTS'] = days_merged['APROVADO_POINTS'].astype(float)
+    days_merged['TARGET_FLAG'] = days_merged['APROVADO_POINTS'].apply(assign_target_flag)
+
+    days_merged['PERIOD'] = pd.Categorical(days_merged['PERIOD'], categories=period_order, ordered=True)
+    return days_merged.sort_values(['DATE', 'PERIOD'])
+
+
+def doctor_month_report(doctor_df, selected_doctor, total_payment):
+    """
+    Everything tab 1 and the PDF exporter need for one doctor in the selected month.
+    `doctor_df` holds the month's rows whose MEDICO_LAUDO_DEFINITIVO is the doctor.
+    """
+    preliminar_df = doctor_df[
+        (doctor_df['STATUS_PRELIMINAR'].notna()) &
+        (doctor_df['MEDICO_LAUDOO_PRELIMINAR'] == selected_doctor)
+    ]
+    aprovado_df = doctor_df[
+        (doctor_df['STATUS_APROVADO'].notna()) &
+        (doctor_df['MEDICO_LAUDO_DEFINITIVO'] == selected_doctor)
+    ]
+
+    # Points calculation for the doctor (ALL hospitals); MULTIPLIER comes from the procedure catalog
+    doctor_grouped = aprovado_df.groupby(['UNIDADE', 'GRUPO', 'DESCRICAO_PROCEDIMENTO']).agg({
+        'MULTIPLIER': 'first',
+        'STATUS_APROVADO': 'count'
+    }).rename(columns={'STATUS_APROVADO': 'COUNT'}).reset_index()
+
+    doctor_grouped['POINTS'] = doctor_grouped['COUNT'] * doctor_grouped['MULTIPLIER']
+    total_points_sum = doctor_grouped['POINTS'].sum()
+    unitary_point_value = total_payment / total_points_sum if total_points_sum > 0 else 0.0
+    doctor_grouped['POINT_VALUE'] = doctor_grouped['POINTS'] * unitary_point_value
+
+    return {
+        'doctor': selected_doctor,
+        'total_payment': total_payment,
+        'preliminar_df': preliminar_df,
+        'aprovado_df': aprovado_df,
+        'total_aprovado_events': len(aprovado_df),
+        'doctor_grouped': doctor_grouped,
+        'total_points_sum': total_points_sum,
+        'unitary_point_value': unitary_point_value,
+        'days_merged': doctor_days(doctor_df, selected_doctor),
+    }
+
+
+def doctor_month_summary(month_df, payment_data, doctor_registry):
+    """
+    One row per doctor with approved exams and payment in the month:
+    APPROVED_COUNT, TOTAL_POINTS, TOTAL_PAYMENT, VALUE_PER_UNIT and VALUE_PER_POINT.
+    `month_df` holds the month's rows with STATUS_APROVADO; joins are on DOCTOR_ID.
+    """
+    # Each approved exam is worth "MULTIPLIER" points
+    summary = month_df.groupby("DOCTOR_ID").agg(
+        APPROVED_COUNT=('MULTIPLIER', 'size'),
+        TOTAL_POINTS=('MULTIPLIER', 'sum'),
+    ).reset_index()
+    pay_sums = payment_data.groupby("DOCTOR_ID")["PAYMENT"].sum().reset_index(name="TOTAL_PAYMENT")
+    summary = pd.merge(summary, pay_sums, on="DOCTOR_ID", how="inner")
+    summary["NORMALIZED_MEDICO"] = doctor_registry.names(summary["DOCTOR_ID"])
+
+    # Only doctors with payment > 0 and approved exams > 0
+    summary = summary[(summary["TOTAL_PAYMENT"] > 0) & (summary["APPROVED_COUNT"] > 0)].copy()
+    summary["VALUE_PER_UNIT"] = summary["TOTAL_PAYMENT"] / summary["APPROVED_COUNT"]
+    summary["VALUE_PER_POINT"] = summary["TOTAL_PAYMENT"] / summary["TOTAL_POINTS"]
+    return summary
+
+
+# Fields the PDF needs; the raw exam rows stay in the parent process
+PDF_FIELDS = ['doctor', 'total_payment', 'total_aprovado_events', 'total_points_sum', 'doctor_grouped', 'days_merged']
+
+
+def month_doctor_reports(filtered_df, payment_data, doctor_registry):
+    """
+    Precomputes the PDF payload of every doctor with approved exams in the month.
+    One report per DOCTOR_ID, titled with the registry's canonical name: spellings
+    the registry merged share one PDF and the doctor's payment is counted once.
+    """
+    pay_sums = payment_data.groupby('DOCTOR_ID')['PAYMENT'].sum()
+    preliminar_ids = doctor_registry.lookup(filtered_df['MEDICO_LAUDOO_PRELIMINAR'])
+    reports = []
+    for doctor_id, doctor_df in filtered_df.groupby('DOCTOR_ID'):
+        doctor = doctor_registry.names(pd.Series([doctor_id])).iloc[0]
+        # doctor_month_report matches rows by name: every spelling of this doctor becomes the canonical one
+        is_preliminar = (preliminar_ids.loc[doctor_df.index] == doctor_id).fillna(False)
+        doctor_df = doctor_df.assign(
+            MEDICO_LAUDO_DEFINITIVO=doctor,
+            MEDICO_LAUDOO_PRELIMINAR=doctor_df['MEDICO_LAUDOO_PRELIMINAR'].mask(is_preliminar, doctor)
+        )
+        total_payment = float(pay_sums.get(doctor_id, 0.0))
+        report = doctor_month_report(doctor_df, doctor, total_payment)
+        reports.append({field: report[field] for field in PDF_FIELDS})
+    return reports
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import logging
+import os
+import re
+from io import BytesIO
+
+import pandas as pd
+import requests
+
+from doctor_registry import normalize_names
+from local_store import data_path
+from prodmed_data import PAYMENT_URL, month_names
+
+# -----------------------------
+# pagamento.xlsx as one long, typed payment table.
+# Every sheet is parsed once into sla_data/payments.parquet; the workbook is only
+# downloaded and parsed again when its ETag (or content hash) changes.
+# DOCTOR_ID is resolved on load, so the file does not depend on the registry's IDs.
+# -----------------------------
+PAYMENTS_PATH = data_path("payments.parquet")
+PAYMENTS_META_PATH = data_path("payments.json")
+PAYMENT_COLUMNS = ["YEAR", "MONTH", "DATE", "MEDICO", "NORMALIZED_MEDICO", "PAYMENT"]
+
+logger = logging.getLogger(__name__)
+
+_SHEET_MONTH = re.compile(r"(" + "|".join(month_names) + r")\s+(\d{4})", re.IGNORECASE)
+
+
+def sheet_month(sheet_name):
+    """
+    (year, month) named by a sheet such as "March 2024", or None.
+    """
+    match = _SHEET_MONTH.search(sheet_name)
+    if not match:
+        return None
+    return int(match.group(2)), month_names.index(match.group(1).upper()) + 1
+
+
+def parse_workbook(content):
+    """
+    Reads every month sheet of pagamento.xlsx into the long PAYMENT_COLUMNS table.
+    As before, the first sheet matching a month wins and only rows dated in that month are kept.
+    A sheet that cannot be read (e.g. missing MEDICO/DATE/PAYMENT) is skipped with a
+    warning, so one bad month does not fail the others.
+    Returns (payments, skipped) where skipped maps sheet name to the error.
+    """
+    workbook = pd.ExcelFile(BytesIO(content))
+    frames = {}
+    skipped = {}
+    for sheet_name in workbook.sheet_names:
+        year_month = sheet_month(sheet_name)
+        if year_month is None or year_month in frames:
+            continue
+        year, month = year_month
+        try:
+            sheet = pd.read_excel(workbook, sheet_name=sheet_name, usecols=["MEDICO", "DATE", "PAYMENT"])
+        except (ValueError, KeyError) as e:
+            logger.warning("Skipping payment sheet %r: %s", sheet_name, e)
+            skipped[sheet_name] = str(e)
+            continue
+        sheet["DATE"] = pd.to_datetime(sheet["DATE"], errors="coerce")
+        sheet = sheet[sheet["DATE"].dt.month == month]
+        frames[year_month] = sheet.assign(YEAR=year, MONTH=month)
+    if not frames:
+        return pd.DataFrame(columns=PAYMENT_COLUMNS), skipped
+
+    payments = pd.concat(frames.values(), ignore_index=True)
+    payments["MEDICO"] = payments["MEDICO"].astype(str)
+    payments["NORMALIZED_MEDICO"] = normalize_names(payments["MEDICO"])
+    payments["PAYMENT"] = pd.to_numeric(payments["PAYMENT"], errors="coerce").fillna(0.0)
+    payments = payments.astype({"YEAR": "int16", "MONTH": "int8"})
+    return payments[PAYMENT_COLUMNS], skipped
+
+
+def _remote_fingerprint(url):
+    """
+    ETag of the workbook, or None when the server does not send one.
+    """
+    try:
+        response = requests.head(url, allow_redirects=True, timeout=10)
+        response.raise_for_status()
+    except requests.RequestException:
+        return None
+    return response.headers.get("ETag")
+
+
+class PaymentStore:
+    """
+    All months of pagamento.xlsx, partitioned in memory by (YEAR, MONTH).
+    """
+
+    def __init__(self, doctor_registry, url=PAYMENT_URL, path=PAYMENTS_PATH, meta_path=PAYMENTS_META_PATH):
+        self.url = url
+        self.path = path
+        self.meta_path = meta_path
+        # Sheets of the current workbook that could not be read (name -> error)
+        self.skipped_sheets = {}
+        self.payments = self._load()
+        self.payments["DOCTOR_ID"] = doctor_registry.resolve(self.payments["NORMALIZED_MEDICO"])
+        self._partitions = {key: part for key, part in self.payments.groupby(["YEAR", "MONTH"])}
+
+    def _load(self):
+        meta = {}
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+        cached = os.path.exists(self.path) and meta.get("url") == self.url
+
+        etag = _remote_fingerprint(self.url)
+        if cached and etag and meta.get("etag") == etag:
+            self.skipped_sheets = meta.get("skipped_sheets", {})
+            return pd.read_parquet(self.path)
+
+        try:
+            response = requests.get(self.url, timeout=60)
+            response.raise_for_status()
+            content = response.content
+        except requests.RequestException:
+            if cached:
+                # Offline or an HTTP error page: the last ingested workbook is still valid
+                self.skipped_sheets = meta.get("skipped_sheets", {})
+                return pd.read_parquet(self.path)
+            raise
+        digest = hashlib.sha256(content).hexdigest()
+        if cached and meta.get("sha256") == digest:
+            payments = pd.read_parquet(self.path)
+            self.skipped_sheets = meta.get("skipped_sheets", {})
+        else:
+            payments, self.skipped_sheets = parse_workbook(content)
+            tmp_path = self.path + ".tmp"
+            payments.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, self.path)
+
+        with open(self.meta_path, "w") as f:
+            json.dump({"url": self.url, "etag": etag, "sha256": digest, "skipped_sheets": self.skipped_sheets}, f)
+        return payments
+
+    def months(self):
+        """
+        (year, month) of every month with payments, oldest first.
+        """
+        return sorted((int(year), int(month)) for year, month in self._partitions)
+
+    def month(self, selected_month, selected_year):
+        """
+        The month's payment rows (with DOCTOR_ID); replaces the per-month sheet read.
+        Empty (same columns) when pagamento.xlsx has no sheet for the month.
+        """
+        partition = self._partitions.get((selected_year, selected_month))
+        if partition is None:
+            return self.payments.iloc[0:0]
+        return partition
@@ -0,0 +1,220 @@
+import os
+from functools import lru_cache
+from io import BytesIO
+
+from fpdf import FPDF
+from fpdf.image_datastructures import RasterImageInfo
+from fpdf.image_parsing import get_img_info
+
+# -----------------------------------------------------------------------------
+# PRODMED production report (one doctor, one month), built fully in memory
+# -----------------------------------------------------------------------------
+LOGO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logo.jpg')
+
+# Core PDF font: built into every reader, so nothing is embedded or parsed per report
+FONT = 'Helvetica'
+ROW_HEIGHT = 8
+CELL_PADDING = 1.5
+
+# Reusable table templates: source column, heading, width (mm) and alignment.
+# The heading row is repeated at the top of every page the table spills over to.
+DAYS_TABLE = {
+    'columns': ['MEDICO', 'DATE', 'DAY_OF_WEEK', 'PERIOD', 'PRELIMINAR_COUNT', 'APROVADO_COUNT'],
+    'headings': ['MÉDICO', 'DATA', 'DIA DA SEMANA', 'PERÍODO', 'PRELIMINAR', 'APROVADO'],
+    'col_widths': (80, 30, 30, 30, 30, 30),
+    'text_align': ('L', 'C', 'C', 'C', 'C', 'C'),
+}
+
+PROCEDURES_TABLE = {
+    'columns': ['DESCRICAO_PROCEDIMENTO', 'COUNT', 'MULTIPLIER', 'POINTS'],
+    'headings': ['Procedure', 'Count', 'Multiplier', 'Points'],
+    'col_widths': (80, 30, 30, 30),
+    'text_align': ('L', 'C', 'C', 'C'),
+}
+
+
+@lru_cache(maxsize=1)
+def load_logo_bytes():
+    """
+    The logo ships with the repository; it is read from disk once per process.
+    """
+    with open(LOGO_PATH, 'rb') as f:
+        return f.read()
+
+
+@lru_cache(maxsize=1)
+def load_logo_info():
+    """
+    The logo as parsed by fpdf2, also once per process (per pool worker in a batch).
+    """
+    return get_img_info(LOGO_PATH, BytesIO(load_logo_bytes()))
+
+
+def _add_logo(pdf, **position):
+    # Seeds the report's image cache with the parsed logo, so pdf.image finds it there
+    # instead of hashing and parsing the 276 KB JPEG again for every report
+    info = load_logo_info()
+    if LOGO_PATH not in pdf.image_cache.images and info['iccp'] is None:
+        pdf.image_cache.images[LOGO_PATH] = RasterImageInfo(
+            info, i=len(pdf.image_cache.images) + 1, usages=0, iccp_i=None
+        )
+    pdf.image(LOGO_PATH, **position)
+
+
+def _truncate(series, width=30):
+    series = series.astype(str)
+    return series.where(series.str.len() <= width, series.str.slice(0, width) + '...')
+
+
+def _draw_row(pdf, template, x_positions, y, values):
+    baseline = y + ROW_HEIGHT / 2 + pdf.font_size * 0.35
+    for x, width, align, text in zip(x_positions, template['col_widths'], template['text_align'], values):
+        if align == 'C':
+            x += (width - pdf.get_string_width(text)) / 2
+        else:
+            x += CELL_PADDING
+        pdf.text(x, baseline, text)
+    pdf.line(x_positions[0], y + ROW_HEIGHT, x_positions[-1], y + ROW_HEIGHT)
+
+
+def _draw_grid(pdf, x_positions, top, bottom):
+    pdf.line(x_positions[0], top, x_positions[-1], top)
+    for x in x_positions:
+        pdf.line(x, top, x, bottom)
+
+
+def _render_table(pdf, template, rows_df):
+    """
+    Draws `rows_df` (already formatted as strings, in template column order)
+    as fixed-height single-line rows. Each row costs one text op per cell plus
+    one rule; vertical rules are drawn once per page.
+    """
+    x_positions = [pdf.l_margin]
+    for width in template['col_widths']:
+        x_positions.append(x_positions[-1] + width)
+    page_bottom = pdf.h - pdf.b_margin
+
+    def start_block(y):
+        pdf.set_font(FONT, 'B', 10)
+        _draw_row(pdf, template, x_positions, y, template['headings'])
+        pdf.set_font(FONT, '', 10)
+        return y + ROW_HEIGHT
+
+    top = pdf.get_y()
+    # pdf.text does not trigger auto page breaks: keep the heading with at least one row
+    if top + 2 * ROW_HEIGHT > page_bottom:
+        pdf.add_page()
+        top = pdf.get_y()
+    y = start_block(top)
+    for values in rows_df.itertuples(index=False):
+        if y + ROW_HEIGHT > page_bottom:
+            _draw_grid(pdf, x_positions, top, y)
+            pdf.add_page()
+            top = pdf.get_y()
+            y = start_block(top)
+        _draw_row(pdf, template, x_positions, y, values)
+        y += ROW_HEIGHT
+    _draw_grid(pdf, x_positions, top, y)
+    pdf.set_y(y)
+
+
+def build_doctor_report(report, month_label, selected_year):
+    """
+    Renders the combined report for one doctor and returns the PDF bytes.
+    `report` is a dict from prodmed_data.doctor_month_report (PDF_FIELDS are enough).
+    """
+    selected_doctor = report['doctor']
+    total_payment = report['total_payment']
+    total_aprovado_events = report['total_aprovado_events']
+    total_points_sum = report['total_points_sum']
+    doctor_grouped = report['doctor_grouped']
+    days_merged = report['days_merged']
+
+    pdf = FPDF(orientation='L', unit='mm', format='A4')
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.set_margins(left=5, top=5, right=5)
+
+    # Create title sheet
+    pdf.add_page()
+    _add_logo(pdf, x=80, y=30, w=120)
+    pdf.set_font(FONT, 'B', 24)
+    pdf.ln(100)
+    pdf.cell(0, 10, 'Relatório de produção', new_x='LMARGIN', new_y='NEXT', align='C')
+    pdf.ln(10)
+    pdf.set_font(FONT, '', 18)
+    pdf.cell(0, 10, f'Mês de {month_label} {selected_year}', new_x='LMARGIN', new_y='NEXT', align='C')
+    pdf.ln(20)
+    # Add doctor's name in uppercase, big and blue
+    pdf.set_font(FONT, 'B', 24)
+    pdf.set_text_color(0, 0, 255)
+    pdf.cell(0, 10, selected_doctor.upper(), new_x='LMARGIN', new_y='NEXT', align='C')
+    pdf.set_text_color(0, 0, 0)
+
+    # Add summary sheet
+    pdf.add_page()
+    pdf.set_font(FONT, 'B', 16)
+    pdf.cell(0, 10, 'RELATÓRIO DE PRODUÇÃO MÉDICA', new_x='LMARGIN', new_y='NEXT', align='C')
+    pdf.ln(10)
+    pdf.set_font(FONT, '', 16)
+    unitary_value_pdf = total_payment / total_aprovado_events if total_aprovado_events > 0 else 0.0
+    pdf.multi_cell(
+        0, 10,
+        f'Total de Pontos por Exames Aprovados: {total_points_sum:.1f}\n'
+        f'Total de Exames Aprovados: {total_aprovado_events}\n'
+        f'Pagamento Recebido: R$ {total_payment:,.2f}\n'
+        f'Valor Unitário por Evento: R$ {unitary_value_pdf:,.2f}',
+        new_x='LMARGIN', new_y='NEXT'
+    )
+
+    # -----------------------------------------------------------------------------
+    # "Days Each Doctor Has Events" (days_merged)
+    # -----------------------------------------------------------------------------
+    pdf.add_page()
+    pdf.set_font(FONT, 'B', 16)
+    pdf.cell(0, 10, 'PERÍODOS/PLANTÃO COM EVENTOS REALIZADOS', new_x='LMARGIN', new_y='NEXT', align='C')
+    pdf.ln(10)
+
+    if not days_merged.empty:
+        _render_table(pdf, DAYS_TABLE, days_merged[DAYS_TABLE['columns']].astype(str))
+    else:
+        pdf.set_font(FONT, 'I', 12)
+        pdf.cell(0, 10, 'No events found in the selected date range/modality.', new_x='LMARGIN', new_y='NEXT', align='C')
+
+    # -----------------------------------------------------------------------------
+    # One page per hospital, one procedures table per modality
+    # -----------------------------------------------------------------------------
+    for hospital, hospital_df in doctor_grouped.groupby('UNIDADE', sort=False):
+        pdf.add_page()
+        pdf.set_font(FONT, 'B', 24)
+        pdf.set_text_color(0, 0, 255)
+        pdf.cell(0, 10, f'Hospital: {hospital}', new_x='LMARGIN', new_y='NEXT', align='C')
+        pdf.set_text_color(0, 0, 0)
+        pdf.ln(10)
+        for grupo, grupo_df in hospital_df.groupby('GRUPO', sort=False):
+            pdf.set_font(FONT, 'B', 12)
+            pdf.cell(0, 10, f'Modality: {grupo}', new_x='LMARGIN', new_y='NEXT')
+            pdf.ln(5)
+            points = grupo_df['COUNT'] * grupo_df['MULTIPLIER']
+            rows_df = grupo_df.assign(
+                DESCRICAO_PROCEDIMENTO=_truncate(grupo_df['DESCRICAO_PROCEDIMENTO']),
+                COUNT=grupo_df['COUNT'].astype(str),
+                MULTIPLIER=grupo_df['MULTIPLIER'].map('{:.1f}'.format),
+                POINTS=points.map('{:.1f}'.format),
+            )[PROCEDURES_TABLE['columns']]
+            _render_table(pdf, PROCEDURES_TABLE, rows_df)
+
+            # Summary for the modality
+            pdf.ln(5)
+            pdf.set_font(FONT, 'B', 10)
+            pdf.cell(0, 10, f'Total Points for {grupo}: {points.sum()}', new_x='LMARGIN', new_y='NEXT')
+            pdf.cell(0, 10, f'Total Number of Exams for {grupo}: {grupo_df["COUNT"].sum()}', new_x='LMARGIN', new_y='NEXT')
+            pdf.ln(10)
+
+    buffer = BytesIO()
+    pdf.output(buffer)
+    return buffer.getvalue()
+
+
+def report_file_name(doctor, month_label, selected_year):
+    safe_doctor = "".join(c if c.isalnum() else "_" for c in doctor.upper()).strip("_")
+    return f"Relatorio_Producao_{safe_doctor}_{month_label}_{selected_year}.pdf"
@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from procedure_catalog import UNMATCHED_ID
+
+# -----------------------------
+# Multiplier what-if simulator.
+# Approved exams are counted once into a sparse (month, doctor) x procedure matrix;
+# any set of multipliers is then a single sparse matrix-vector product.
+# -----------------------------
+ROW_KEYS = ["YEAR", "MONTH", "DOCTOR_ID"]
+
+
+def build_count_matrix(approved_df, col_codes, n_columns):
+    """
+    Sparse count matrix of approved exams. Rows are the (YEAR, MONTH, DOCTOR_ID)
+    combinations found in `approved_df`; `col_codes` gives each exam's column.
+    """
+    row_codes, row_uniques = pd.MultiIndex.from_frame(approved_df[ROW_KEYS]).factorize()
+    matrix = sparse.csr_matrix(
+        (np.ones(len(row_codes), dtype=np.float64), (row_codes, col_codes)),
+        shape=(len(row_uniques), n_columns)
+    )
+    matrix.sum_duplicates()
+    rows = row_uniques.to_frame(index=False, name=ROW_KEYS)
+    rows["APPROVED_COUNT"] = np.asarray(matrix.sum(axis=1)).ravel().astype(int)
+    return matrix, rows
+
+
+class MultiplierSimulator:
+    """
+    Holds the count matrix for one or more months plus each row's payment,
+    and recomputes points/VALUE_PER_POINT for edited multipliers.
+    """
+
+    def __init__(self, approved_df, procedure_catalog, payment_df, doctor_registry):
+        approved_df = approved_df.dropna(subset=["DOCTOR_ID"])
+        # Columns are the catalog PROCEDURE_IDs, then one column (multiplier 0) per
+        # description without a catalog entry, so those can be priced here too
+        procedure_ids = approved_df["PROCEDURE_ID"].to_numpy()
+        unmatched = approved_df.loc[procedure_ids == UNMATCHED_ID, "DESCRICAO_PROCEDIMENTO"]
+        unmatched_index = pd.Index(unmatched.unique())
+        n_catalog = len(procedure_catalog.descriptions)
+        col_codes = procedure_ids.copy()
+        col_codes[procedure_ids == UNMATCHED_ID] = n_catalog + unmatched_index.get_indexer(unmatched)
+
+        self.procedures = procedure_catalog.descriptions.append(unmatched_index)
+        self.base_multipliers = np.append(procedure_catalog.multipliers, np.zeros(len(unmatched_index)))
+
+        self.matrix, self.rows = build_count_matrix(approved_df, col_codes, len(self.procedures))
+        self.procedure_counts = np.asarray(self.matrix.sum(axis=0)).ravel().astype(int)
+
+        pay_sums = payment_df.groupby(ROW_KEYS)["PAYMENT"].sum()
+        row_keys = pd.MultiIndex.from_frame(self.rows[ROW_KEYS])
+        self.rows["TOTAL_PAYMENT"] = pay_sums.reindex(row_keys).fillna(0).to_numpy()
+        self.rows["NORMALIZED_MEDICO"] = doctor_registry.names(self.rows["DOCTOR_ID"])
+        self.base_points = self.matrix @ self.base_multipliers
+
+    def multipliers_table(self):
+        """
+        Editable grid source: every procedure with exams in the period, most frequent first.
+        """
+        table = pd.DataFrame({
+            "DESCRICAO_PROCEDIMENTO": self.procedures,
+            "COUNT": self.procedure_counts,
+            "MULTIPLIER": self.base_multipliers,
+        })
+        return table[table["COUNT"] > 0].sort_values("COUNT", ascending=False).reset_index(drop=True)
+
+    def edited_multipliers(self, edited_table):
+        """
+        Full multiplier vector with the MULTIPLIER column of `edited_table` applied;
+        procedures not in the table keep their current value.
+        """
+        multipliers = self.base_multipliers.copy()
+        positions = self.procedures.get_indexer(edited_table["DESCRICAO_PROCEDIMENTO"])
+        known = positions >= 0
+        multipliers[positions[known]] = pd.to_numeric(
+            edited_table["MULTIPLIER"], errors="coerce"
+        ).fillna(0).to_numpy()[known]
+        return multipliers
+
+    def multipliers_csv(self, edited_table):
+        """
+        multipliers.csv contents (every procedure) with the edits applied.
+        """
+        return pd.DataFrame({
+            "DESCRICAO_PROCEDIMENTO": self.procedures,
+            "MULTIPLIER": self.edited_multipliers(edited_table),
+        }).to_csv(index=False).encode("utf-8")
+
+    def simulate(self, edited_table):
+        """
+        Before/after points and VALUE_PER_POINT per (month, doctor) row
+        for the multipliers in `edited_table`.
+        """
+        multipliers = self.edited_multipliers(edited_table)
+        new_points = self.matrix @ multipliers
+        result = self.rows.copy()
+        result["POINTS_BEFORE"] = self.base_points
+        result["POINTS_AFTER"] = new_points
+        result["POINTS_DELTA"] = new_points - self.base_points
+        with np.errstate(divide="ignore", invalid="ignore"):
+            result["VALUE_PER_POINT_BEFORE"] = np.where(self.base_points > 0, result["TOTAL_PAYMENT"] / self.base_points, np.nan)
+            result["VALUE_PER_POINT_AFTER"] = np.where(new_points > 0, result["TOTAL_PAYMENT"] / new_points, np.nan)
+        result["VALUE_PER_POINT_DELTA"] = result["VALUE_PER_POINT_AFTER"] - result["VALUE_PER_POINT_BEFORE"]
+        return result
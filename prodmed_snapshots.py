@@ -0,0 +1,99 @@
+import glob
+import hashlib
+import os
+from datetime import date
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from local_store import data_dir
+
+# -----------------------------
+# Frozen monthly snapshots of the per-doctor production summary.
+# One Parquet file per closed month, so the history view reads a few KB per month
+# instead of raw exam rows. Each file carries a fingerprint of the summary it was
+# built from; it is rewritten only when a later pagamento.xlsx/baseslaM.xlsx changes
+# that month (e.g. its payment sheet was still partial when the month closed).
+# -----------------------------
+SNAPSHOT_DIR = data_dir("snapshots")
+SNAPSHOT_COLUMNS = [
+    "YEAR", "MONTH", "DOCTOR_ID", "NORMALIZED_MEDICO",
+    "APPROVED_COUNT", "TOTAL_POINTS", "TOTAL_PAYMENT",
+    "VALUE_PER_UNIT", "VALUE_PER_POINT",
+]
+FINGERPRINT_KEY = b"source_fingerprint"
+
+
+def snapshot_path(year, month):
+    return os.path.join(SNAPSHOT_DIR, f"{year:04d}-{month:02d}.parquet")
+
+
+def is_closed_month(year, month, today=None):
+    today = today or date.today()
+    return (year, month) < (today.year, today.month)
+
+
+def has_snapshot(year, month):
+    return os.path.exists(snapshot_path(year, month))
+
+
+def snapshot_fingerprint(year, month):
+    """
+    Fingerprint stored with the month's snapshot (None if it was written before
+    fingerprints existed, so it is rebuilt).
+    """
+    metadata = pq.read_schema(snapshot_path(year, month)).metadata or {}
+    fingerprint = metadata.get(FINGERPRINT_KEY)
+    return fingerprint.decode() if fingerprint else None
+
+
+def freeze_month(summary, year, month, payment_data):
+    """
+    Writes the month's doctor_month_summary as its snapshot.
+    Returns False (and writes nothing) if the month is still open, has no payment
+    rows yet, or is already frozen with the same data.
+    """
+    if payment_data.empty or not is_closed_month(year, month):
+        return False
+    snapshot = summary.assign(YEAR=year, MONTH=month)[SNAPSHOT_COLUMNS].sort_values("DOCTOR_ID")
+    snapshot = snapshot.astype({"YEAR": "int16", "MONTH": "int8", "DOCTOR_ID": "int32", "APPROVED_COUNT": "int32"})
+    fingerprint = hashlib.sha256(pd.util.hash_pandas_object(snapshot, index=False).to_numpy().tobytes()).hexdigest()
+    if has_snapshot(year, month) and snapshot_fingerprint(year, month) == fingerprint:
+        return False
+    table = pa.Table.from_pandas(snapshot, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), FINGERPRINT_KEY: fingerprint.encode()})
+    path = snapshot_path(year, month)
+    tmp_path = path + ".tmp"
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+    return True
+
+
+def list_snapshots():
+    """
+    (year, month) of every frozen month, oldest first.
+    """
+    months = []
+    for path in glob.glob(os.path.join(SNAPSHOT_DIR, "*.parquet")):
+        year, month = os.path.basename(path)[:-len(".parquet")].split("-")
+        months.append((int(year), int(month)))
+    return sorted(months)
+
+
+def load_history(months=None, doctor_ids=None, columns=None):
+    """
+    Concatenates the requested snapshots (all by default), optionally
+    restricted to some DOCTOR_IDs and columns. Adds a PERIOD (month start) column.
+    The files are read and concatenated as Arrow tables and converted to pandas once.
+    """
+    months = months if months is not None else list_snapshots()
+    if columns is not None:
+        columns = ["YEAR", "MONTH", "DOCTOR_ID"] + [c for c in columns if c not in ("YEAR", "MONTH", "DOCTOR_ID")]
+    filters = [("DOCTOR_ID", "in", list(doctor_ids))] if doctor_ids is not None else None
+    tables = [pq.read_table(snapshot_path(year, month), columns=columns, filters=filters) for year, month in months]
+    if not tables:
+        return pd.DataFrame(columns=SNAPSHOT_COLUMNS + ["PERIOD"])
+    history = pa.concat_tables(tables).to_pandas()
+    history["PERIOD"] = pd.to_datetime(dict(year=history["YEAR"], month=history["MONTH"], day=1))
+    return history
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+# -----------------------------
+# Declarative conditional styling for large Styler tables.
+# Each rule is evaluated once per column with NumPy (not once per row in Python),
+# so the cost grows with the number of rules/values, not rows x Python calls.
+# -----------------------------
+
+
+def value_rule(column, css_by_value, target='row', default=''):
+    """
+    Colors `target` cells by the value found in `column`.
+    `target` is 'row' (every column) or a list of column names.
+    """
+    return {'column': column, 'css_by_value': css_by_value, 'target': target, 'default': default}
+
+
+def flag_rule(column, css, target='row'):
+    """
+    Colors `target` cells wherever `column` is not null.
+    """
+    return {'column': column, 'flag_css': css, 'target': target}
+
+
+def _rule_css(df, rule):
+    values = df[rule['column']].to_numpy(dtype=object)
+    if 'flag_css' in rule:
+        return np.where(pd.notna(values), rule['flag_css'], '')
+    css_by_value = rule['css_by_value']
+    conditions = [values == value for value in css_by_value]
+    return np.select(conditions, list(css_by_value.values()), default=rule['default'])
+
+
+def css_matrix(df, rules):
+    """
+    Returns a DataFrame (same shape/labels as `df`) of CSS strings.
+    Later rules override earlier ones on the cells they target.
+    """
+    matrix = np.full(df.shape, '', dtype=object)
+    for rule in rules:
+        css = _rule_css(df, rule).astype(object)
+        if rule['target'] == 'row':
+            col_idx = np.arange(df.shape[1])
+        else:
+            col_idx = [df.columns.get_loc(col) for col in rule['target'] if col in df.columns]
+        for idx in col_idx:
+            matrix[:, idx] = np.where(css != '', css, matrix[:, idx])
+    return pd.DataFrame(matrix, index=df.index, columns=df.columns)
+
+
+def style_rules(df, rules):
+    """
+    Styler for `df` with every rule applied in a single table-wide pass.
+    """
+    return df.style.apply(lambda data: css_matrix(data, rules), axis=None)
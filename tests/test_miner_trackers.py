@@ -0,0 +1,48 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from miner_extraction import dividir_sentencas  # noqa: E402
+from miner_trackers import (  # noqa: E402
+    detectar_calculos, dobrar, gatilho_calculo, gatilho_nodulo, regex_calculo, regex_nodulo, sentencas_candidatas
+)
+
+# Variações de cada letra dos termos e todo tipo de espaço que o \s de str casa
+_LETRAS = {"c": "cC", "a": "aAáÁàâã", "l": "lL", "ç": "cCçÇ", "u": "uUúÚ", "o": "oOóÓ", "d": "dD", "n": "nN"}
+_ESPACOS = [" ", "\n", "\t", "\xa0", "\x85", "\x1c", "\u2009", "\u3000", "\u2028"]
+_TERMOS = ["calçulo", "calçula", "nodulo"]
+
+
+def _textos(quantidade=3000, semente=40):
+    aleatorio = random.Random(semente)
+    for _ in range(quantidade):
+        termo = aleatorio.choice(_TERMOS)
+        partes = []
+        for letra in termo:
+            partes.append(aleatorio.choice(_LETRAS.get(letra, letra)))
+            if aleatorio.random() < 0.3:
+                partes.append("".join(aleatorio.choices(_ESPACOS, k=aleatorio.randint(1, 2))))
+        ruido = "".join(aleatorio.choices(["x", ". ", "中", *_ESPACOS], k=6))
+        yield ruido[:3] + "".join(partes) + ruido[3:]
+
+
+def test_gatilho_nao_descarta_sentenca_da_regra_principal():
+    for regra, gatilho in ((regex_calculo, gatilho_calculo), (regex_nodulo, gatilho_nodulo)):
+        for texto in _textos():
+            esperadas = [sentenca for sentenca in dividir_sentencas(texto) if regra.search(sentenca)]
+            candidatas = sentencas_candidatas(texto, gatilho)
+            assert all(sentenca in candidatas for sentenca in esperadas), repr(texto)
+
+
+def test_dobrar_mantem_um_byte_por_caractere():
+    texto = "Cálculo\xa0renal 中　ok"
+    dobrado = dobrar(texto)
+    assert len(dobrado) == len(texto)
+    assert dobrado == b"calculo\xa0renal ? ok"
+
+
+def test_calculo_com_espaco_nao_separavel():
+    achados = detectar_calculos("Há c\xa0álculo no rim renal de 5 mm.")
+    assert [achado["Tamanho"] for achado in achados] == ["5 mm"]